@@ -1,20 +1,36 @@
 """
 Admin routes
 """
-from typing import List, Optional
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response, Body, Request
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
 
 from models import (
     QuestionCreate, QuestionResponse, QuestionUpdate,
-    ReadingTextCreate, ReadingTextResponse, BulkQuestionImport,
+    ReadingTextCreate, ReadingTextResponse,
     SimulatorCreate, SimulatorResponse, RoleUpdateRequest
 )
 from utils.database import db
+from utils.user_cache import user_cache
 from utils.config import UNAM_EXAM_CONFIG, TOTAL_QUESTIONS, EXAM_DURATION_MINUTES, FREE_SIMULATORS_PER_AREA
 from utils.security import sanitize_string
+from utils.datetimes import to_datetime
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, after_cursor
 from utils.config import MAX_TOPIC_LENGTH, MAX_NAME_LENGTH
 from services.auth_service import AuthService
+from services.question_service import QuestionService
+from services.catalog import simulator_catalog, subject_catalog
+from services.subject_counter_service import SubjectCounterService
+from services.stats_service import StatsService, admin_stats, admin_stats_detailed
+from services.entitlement_service import EntitlementService
+from services.question_import_service import (
+    QuestionImportService, QuestionImporter, iter_ndjson_rows, iter_csv_rows
+)
 from routes.auth import get_admin_user
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -22,54 +38,14 @@ router = APIRouter(prefix="/admin", tags=["Admin"])
 
 @router.get("/stats")
 async def get_admin_stats(user: dict = Depends(get_admin_user)):
-    """Get admin dashboard statistics"""
-    total_users = await db.users.count_documents({})
-    total_questions = await db.questions.count_documents({})
-    total_attempts = await db.attempts.count_documents({})
-    completed_attempts = await db.attempts.count_documents({"status": "completed"})
-    pending_reports = await db.question_reports.count_documents({"status": "pending"})
-    
-    # Count premium users with active subscriptions
-    # Compare ISO format strings (MongoDB stores as string)
-    now_str = datetime.now(timezone.utc).isoformat()
-    premium_users = await db.subscriptions.count_documents({
-        "status": "active",
-        "expires_at": {"$gt": now_str}
-    })
-    
-    recent_attempts = await db.attempts.find(
-        {"status": "completed"},
-        {"_id": 0, "attempt_id": 1, "user_id": 1, "score": 1, "started_at": 1}
-    ).sort("started_at", -1).limit(5).to_list(5)
-    
-    return {
-        "total_users": total_users,
-        "premium_users": premium_users,
-        "total_questions": total_questions,
-        "total_attempts": total_attempts,
-        "completed_attempts": completed_attempts,
-        "pending_reports": pending_reports,
-        "recent_attempts": recent_attempts
-    }
+    """Get admin dashboard statistics (cached snapshot, see StatsService)"""
+    return await admin_stats.get()
 
 
 @router.get("/stats/detailed")
 async def get_admin_stats_detailed(user: dict = Depends(get_admin_user)):
     """Get detailed admin stats including questions per subject"""
-    subjects_stats = []
-    subjects = await db.subjects.find({}, {"_id": 0}).to_list(100)
-    for s in subjects:
-        count = await db.questions.count_documents({"subject_id": s["subject_id"]})
-        subjects_stats.append({"subject": s["name"], "count": count})
-    
-    return {
-        "total_users": await db.users.count_documents({}),
-        "total_questions": await db.questions.count_documents({}),
-        "total_simulators": await db.simulators.count_documents({}),
-        "total_attempts": await db.attempts.count_documents({"status": "completed"}),
-        "total_admins": await db.users.count_documents({"role": "admin"}),
-        "questions_per_subject": subjects_stats
-    }
+    return await admin_stats_detailed.get()
 
 
 # Reading Texts CRUD
@@ -141,6 +117,7 @@ async def delete_reading_text(reading_text_id: str, user: dict = Depends(get_adm
         {"reading_text_id": reading_text_id},
         {"$unset": {"reading_text_id": ""}}
     )
+    await QuestionService.invalidate_questions()
     return {"message": "Reading text deleted"}
 
 
@@ -148,7 +125,7 @@ async def delete_reading_text(reading_text_id: str, user: dict = Depends(get_adm
 @router.post("/questions", response_model=QuestionResponse)
 async def create_question(data: QuestionCreate, user: dict = Depends(get_admin_user)):
     """Create a question"""
-    subject = await db.subjects.find_one({"subject_id": data.subject_id}, {"_id": 0})
+    subject = await subject_catalog.get(data.subject_id)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
@@ -170,6 +147,7 @@ async def create_question(data: QuestionCreate, user: dict = Depends(get_admin_u
         "explanation": data.explanation,
         "image_url": data.image_url,
         "option_images": data.option_images or [None]*4,
+        "text_hash": QuestionService.text_hash(data.subject_id, data.text),
         "created_at": datetime.now(timezone.utc).isoformat(),
         "created_by": user["user_id"]
     }
@@ -177,6 +155,8 @@ async def create_question(data: QuestionCreate, user: dict = Depends(get_admin_u
         question_doc["reading_text_id"] = data.reading_text_id
     
     await db.questions.insert_one(question_doc)
+    await SubjectCounterService.question_added(question_doc)
+    await QuestionService.invalidate_questions([question_id])
     
     return QuestionResponse(
         question_id=question_id,
@@ -195,72 +175,94 @@ async def create_question(data: QuestionCreate, user: dict = Depends(get_admin_u
 
 
 @router.post("/questions/bulk")
-async def bulk_import_questions(data: BulkQuestionImport, user: dict = Depends(get_admin_user)):
-    """Import multiple questions at once"""
-    imported_questions = 0
-    imported_texts = 0
-    errors = []
-    reading_text_map = {}
-    
-    # First, import reading texts if provided
-    if data.reading_texts:
-        for i, rt in enumerate(data.reading_texts):
-            try:
-                reading_text_id = AuthService.generate_id("rt_")
-                await db.reading_texts.insert_one({
-                    "reading_text_id": reading_text_id,
-                    "title": rt.title,
-                    "content": rt.content,
-                    "subject_id": rt.subject_id,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "created_by": user["user_id"]
-                })
-                reading_text_map[rt.title] = reading_text_id
-                imported_texts += 1
-            except Exception as e:
-                errors.append(f"Reading text {i+1}: {str(e)}")
+async def bulk_import_questions(payload: Dict[str, Any] = Body(...), user: dict = Depends(get_admin_user)):
+    """
+    Import multiple questions at once.
+    Body: {"questions": [...], "reading_texts": [...]} (same fields as BulkQuestionImport).
+    Rows are validated individually, so invalid rows are reported in `errors`
+    instead of rejecting the whole request.
+    """
+    questions = payload.get("questions")
+    reading_texts = payload.get("reading_texts") or []
+    if not isinstance(questions, list) or not isinstance(reading_texts, list):
+        raise HTTPException(status_code=422, detail="'questions' and 'reading_texts' must be lists")
     
-    # Then import questions
-    for i, q in enumerate(data.questions):
+    result = await QuestionImportService.import_bank(questions, reading_texts, user["user_id"])
+    # `imported` is what the admin import dialog reads
+    return {**result, "imported": result["imported_questions"]}
+
+
+class _UploadProgressResponse(StreamingResponse):
+    """
+    StreamingResponse that does not listen for client disconnects.
+    The upload body is read from inside the generator, and Starlette's
+    disconnect listener would otherwise consume those body messages.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@router.post("/questions/upload")
+async def upload_questions(request: Request, format: Optional[str] = None, user: dict = Depends(get_admin_user)):
+    """
+    Stream a question bank as NDJSON (one question object per line) or CSV
+    (same columns as the admin CSV template). `format` defaults from Content-Type.
+    
+    The body is parsed incrementally and written in batches; questions whose
+    text already exists for the same subject are skipped as duplicates.
+    The response is NDJSON: a "progress" line after every batch (with that
+    batch's errors), then a "done" line, or an "error" line if the upload
+    is malformed or a write fails (questions from earlier batches stay imported).
+    """
+    upload_format = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if upload_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    parse_rows = iter_csv_rows if upload_format == "csv" else iter_ndjson_rows
+    importer = await QuestionImporter.create(user["user_id"], skip_duplicates=True)
+    
+    def event(kind: str, **data) -> str:
+        return json.dumps({"type": kind, **data}, ensure_ascii=False) + "\n"
+    
+    def progress(kind: str) -> str:
+        return event(
+            kind,
+            rows=importer.rows,
+            imported=importer.imported,
+            duplicates=importer.duplicates,
+            error_count=importer.error_count,
+            errors=importer.drain_errors()
+        )
+    
+    async def run_upload():
+        reported_batches = 0
+        finished = False
         try:
-            subject = await db.subjects.find_one({"subject_id": q.subject_id}, {"_id": 0})
-            if not subject:
-                errors.append(f"Question {i+1}: Subject not found")
-                continue
-            
-            question_id = AuthService.generate_id("q_")
-            question_doc = {
-                "question_id": question_id,
-                "subject_id": q.subject_id,
-                "topic": q.topic,
-                "text": q.text,
-                "options": q.options,
-                "correct_answer": q.correct_answer,
-                "explanation": q.explanation,
-                "image_url": q.image_url,
-                "option_images": q.option_images or [None]*4,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "created_by": user["user_id"]
-            }
-            
-            if q.reading_text_id:
-                if q.reading_text_id in reading_text_map:
-                    question_doc["reading_text_id"] = reading_text_map[q.reading_text_id]
-                else:
-                    question_doc["reading_text_id"] = q.reading_text_id
-            
-            await db.questions.insert_one(question_doc)
-            imported_questions += 1
-        except Exception as e:
-            errors.append(f"Question {i+1}: {str(e)}")
-    
-    return {
-        "imported_questions": imported_questions,
-        "imported_reading_texts": imported_texts,
-        "errors": errors,
-        "total_questions": len(data.questions),
-        "total_reading_texts": len(data.reading_texts) if data.reading_texts else 0
-    }
+            try:
+                async for row, error in parse_rows(request.stream()):
+                    if error:
+                        importer.reject(error)
+                    else:
+                        await importer.add(row)
+                    if importer.batches != reported_batches:
+                        reported_batches = importer.batches
+                        yield progress("progress")
+            except ValueError as e:
+                yield event("error", detail=str(e))
+            await importer.finish()
+            finished = True
+            yield progress("done")
+        except ClientDisconnect:
+            pass
+        except Exception:
+            logging.exception("Question upload failed")
+            yield event("error", detail="Upload failed; questions from earlier batches stay imported")
+        finally:
+            # Also on disconnects, failed writes and response teardown: batches
+            # already written must reach the question caches
+            if not finished:
+                await importer.finish()
+    
+    return _UploadProgressResponse(run_upload(), media_type="application/x-ndjson")
 
 
 @router.put("/questions/{question_id}")
@@ -271,13 +273,24 @@ async def update_question(question_id: str, data: QuestionUpdate, user: dict = D
         raise HTTPException(status_code=404, detail="Question not found")
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
+    if "text" in update_data or "subject_id" in update_data:
+        update_data["text_hash"] = QuestionService.text_hash(
+            update_data.get("subject_id", question["subject_id"]),
+            update_data.get("text", question["text"])
+        )
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     update_data["updated_by"] = user["user_id"]
     
     await db.questions.update_one({"question_id": question_id}, {"$set": update_data})
+    await QuestionService.invalidate_questions([question_id])
     
     updated = await db.questions.find_one({"question_id": question_id}, {"_id": 0})
-    subject = await db.subjects.find_one({"subject_id": updated["subject_id"]}, {"_id": 0})
+    if (updated["subject_id"], updated.get("topic")) != (question["subject_id"], question.get("topic")):
+        await SubjectCounterService.apply_changes([
+            (question["subject_id"], question.get("topic"), -1),
+            (updated["subject_id"], updated.get("topic"), 1)
+        ])
+    subject = await subject_catalog.get(updated["subject_id"])
     
     return {
         "question_id": updated["question_id"],
@@ -296,9 +309,14 @@ async def update_question(question_id: str, data: QuestionUpdate, user: dict = D
 @router.delete("/questions/{question_id}")
 async def delete_question(question_id: str, user: dict = Depends(get_admin_user)):
     """Delete a question"""
-    result = await db.questions.delete_one({"question_id": question_id})
-    if result.deleted_count == 0:
+    deleted = await db.questions.find_one_and_delete(
+        {"question_id": question_id},
+        {"_id": 0, "subject_id": 1, "topic": 1}
+    )
+    await QuestionService.invalidate_questions([question_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Question not found")
+    await SubjectCounterService.question_removed(deleted)
     return {"message": "Question deleted"}
 
 
@@ -317,6 +335,7 @@ async def create_simulator(data: SimulatorCreate, user: dict = Depends(get_admin
         "description": data.description,
         "created_at": now
     })
+    await simulator_catalog.bump_version()
     
     return SimulatorResponse(
         simulator_id=simulator_id,
@@ -337,28 +356,70 @@ async def delete_simulator(simulator_id: str, user: dict = Depends(get_admin_use
     result = await db.simulators.delete_one({"simulator_id": simulator_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Simulator not found")
+    await simulator_catalog.bump_version()
     return {"message": "Simulator deleted"}
 
 
 # Users Admin
 @router.get("/users")
-async def get_all_users(user: dict = Depends(get_admin_user)):
-    """Get all users"""
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    result = []
-    for u in users:
-        attempts_count = await db.attempts.count_documents({"user_id": u["user_id"]})
-        result.append({
-            "user_id": u["user_id"],
-            "email": u["email"],
-            "name": u["name"],
-            "role": u["role"],
-            "picture": u.get("picture"),
-            "created_at": u["created_at"],
-            "attempts_count": attempts_count
-        })
-    result.sort(key=lambda x: x["created_at"], reverse=True)
-    return result
+async def get_all_users(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    role: Optional[str] = None,
+    search: Optional[str] = None,
+    user: dict = Depends(get_admin_user)
+):
+    """
+    Get users, newest first, one page at a time.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
+    `search` matches name or email (case-insensitive).
+    Totals for all users are served by /admin/users/summary.
+    """
+    limit = max(1, min(limit, 500))
+    query = {}
+    if role:
+        query["role"] = role
+    if search:
+        pattern = {"$regex": re.escape(search.strip()), "$options": "i"}
+        query["$and"] = [{"$or": [{"name": pattern}, {"email": pattern}]}]
+    if cursor:
+        values = decode_cursor(cursor)
+        if not values or len(values) != 2:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query.setdefault("$and", []).append(after_cursor("created_at", "user_id", values))
+    
+    users = await db.users.find(
+        query,
+        {"_id": 0, "user_id": 1, "email": 1, "name": 1, "role": 1, "picture": 1, "created_at": 1}
+    ).sort([("created_at", -1), ("user_id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([users[-1]["created_at"], users[-1]["user_id"]])
+    
+    # Attempt counts for the whole page in one aggregation
+    counts = await db.attempts.aggregate([
+        {"$match": {"user_id": {"$in": [u["user_id"] for u in users]}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    attempts_count = {c["_id"]: c["count"] for c in counts}
+    
+    return [{
+        "user_id": u["user_id"],
+        "email": u["email"],
+        "name": u["name"],
+        "role": u["role"],
+        "picture": u.get("picture"),
+        "created_at": u["created_at"],
+        "attempts_count": attempts_count.get(u["user_id"], 0)
+    } for u in users]
+
+
+@router.get("/users/summary")
+async def get_users_summary(user: dict = Depends(get_admin_user)):
+    """Get user totals (all users, admins, students, premium)"""
+    return await StatsService.count_users()
 
 
 @router.put("/users/{user_id}/role")
@@ -372,6 +433,7 @@ async def update_user_role(user_id: str, data: RoleUpdateRequest, admin: dict =
         raise HTTPException(status_code=404, detail="User not found")
     
     await db.users.update_one({"user_id": user_id}, {"$set": {"role": data.role}})
+    await user_cache.invalidate_user(user_id)
     return {"message": f"Role updated to {data.role}"}
 
 
@@ -388,8 +450,13 @@ async def delete_user(user_id: str, admin: dict = Depends(get_admin_user)):
     await db.attempts.delete_many({"user_id": user_id})
     await db.user_sessions.delete_many({"user_id": user_id})
     await db.practice_sessions.delete_many({"user_id": user_id})
+    await db.practice_usage.delete_many({"user_id": user_id})
     await db.subscriptions.delete_many({"user_id": user_id})
+    await db.user_performance.delete_one({"user_id": user_id})
+    await db.user_entitlements.delete_one({"user_id": user_id})
     await db.users.delete_one({"user_id": user_id})
+    await user_cache.invalidate_user(user_id)
+    await EntitlementService.invalidate_premium(user_id)
     
     return {"message": "User deleted"}
 
@@ -405,22 +472,15 @@ async def upgrade_to_premium(user_id: str, admin: dict = Depends(get_admin_user)
     now = datetime.now(timezone.utc)
     now_str = now.isoformat()
     
-    # Find active subscription (compare as strings since that's how they're stored)
-    existing = await db.subscriptions.find_one({
-        "user_id": user_id,
-        "status": "active"
-    })
+    # Find active subscription
+    existing = await db.subscriptions.find_one(
+        {"user_id": user_id, "status": "active"},
+        sort=[("expires_at", -1)]
+    )
     
     # Check if subscription is still valid
     if existing:
-        expires_at_str = existing["expires_at"]
-        # Parse expiry date
-        if isinstance(expires_at_str, str):
-            if expires_at_str.endswith('Z'):
-                expires_at_str = expires_at_str[:-1] + '+00:00'
-            expires_at = datetime.fromisoformat(expires_at_str)
-        else:
-            expires_at = expires_at_str
+        expires_at = to_datetime(existing["expires_at"])
         
         # If still valid, extend it
         if expires_at > now:
@@ -428,16 +488,23 @@ async def upgrade_to_premium(user_id: str, admin: dict = Depends(get_admin_user)
             await db.subscriptions.update_one(
                 {"_id": existing["_id"]},
                 {"$set": {
-                    "expires_at": new_expires.isoformat(),
+                    "expires_at": new_expires,
                     "updated_at": now_str
                 }}
             )
+            await EntitlementService.invalidate_premium(user_id)
             return {
                 "message": "Premium extended by 1 year",
                 "expires_at": new_expires.isoformat(),
                 "extended": True
             }
     
+    # Lapsed subscriptions the expiry sweep has not reached yet are replaced
+    await db.subscriptions.update_many(
+        {"user_id": user_id, "status": "active"},
+        {"$set": {"status": "replaced", "updated_at": now_str}}
+    )
+    
     # Create new subscription (1 year from now)
     expires_at = now.replace(year=now.year + 1)
     subscription = {
@@ -448,12 +515,13 @@ async def upgrade_to_premium(user_id: str, admin: dict = Depends(get_admin_user)
         "amount": 0,
         "currency": "MXN",
         "created_at": now_str,
-        "expires_at": expires_at.isoformat(),
+        "expires_at": expires_at,
         "stripe_subscription_id": None,
         "stripe_customer_id": None
     }
     
     await db.subscriptions.insert_one(subscription)
+    await EntitlementService.invalidate_premium(user_id)
     
     return {
         "message": "User upgraded to premium",
@@ -473,6 +541,7 @@ async def remove_premium(user_id: str, admin: dict = Depends(get_admin_user)):
         {"user_id": user_id, "status": "active"},
         {"$set": {"status": "cancelled", "cancelled_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await EntitlementService.invalidate_premium(user_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="No active subscription found")
@@ -495,15 +564,53 @@ async def get_user_subscription(user_id: str, admin: dict = Depends(get_admin_us
 
 # Reports Admin
 @router.get("/reports")
-async def get_reports(status: Optional[str] = None, user: dict = Depends(get_admin_user)):
-    """Get all question reports"""
-    query = {"status": status} if status else {}
-    reports = await db.question_reports.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_reports(
+    response: Response,
+    status: Optional[str] = None,
+    question_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_admin_user)
+):
+    """
+    Get question reports, newest first, one page at a time.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
+    """
+    limit = max(1, min(limit, 500))
+    query = {}
+    if status:
+        query["status"] = status
+    if question_id:
+        query["question_id"] = question_id
+    if cursor:
+        values = decode_cursor(cursor)
+        if not values or len(values) != 2:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query.update(after_cursor("created_at", "report_id", values))
+    
+    reports = await db.question_reports.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("report_id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(reports) > limit:
+        reports = reports[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([reports[-1]["created_at"], reports[-1]["report_id"]])
+    
+    # Enrich the page with one lookup per collection
+    questions = await QuestionService.get_questions_by_ids(r["question_id"] for r in reports)
+    user_ids = list({r["user_id"] for r in reports})
+    reporters = {
+        u["user_id"]: u
+        for u in await db.users.find(
+            {"user_id": {"$in": user_ids}},
+            {"_id": 0, "user_id": 1, "name": 1, "email": 1}
+        ).to_list(len(user_ids))
+    }
     
     result = []
     for r in reports:
-        question = await db.questions.find_one({"question_id": r["question_id"]}, {"_id": 0, "text": 1, "subject_id": 1})
-        reporter = await db.users.find_one({"user_id": r["user_id"]}, {"_id": 0, "name": 1, "email": 1})
+        question = questions.get(r["question_id"])
+        reporter = reporters.get(r["user_id"])
         result.append({
             **r,
             "question_text": question["text"][:100] + "..." if question else "Pregunta eliminada",
@@ -531,12 +638,26 @@ async def update_report_status(report_id: str, status: str, user: dict = Depends
     return {"message": "Reporte actualizado"}
 
 
+# Cache Admin
+@router.get("/cache/stats")
+async def get_cache_stats(user: dict = Depends(get_admin_user)):
+    """Get hit/miss counters for in-process caches"""
+    from services.question_service import question_cache
+    return {"questions": question_cache.stats(), "users": user_cache.stats()}
+
+
+@router.post("/subject-counters/reconcile")
+async def reconcile_subject_counters(user: dict = Depends(get_admin_user)):
+    """Recount questions per subject/topic and fix drifted counters"""
+    return await SubjectCounterService.reconcile()
+
+
 # Rate Limiter Admin
 @router.post("/rate-limit/cleanup")
 async def cleanup_rate_limits(user: dict = Depends(get_admin_user)):
-    """Cleanup old rate limit entries"""
+    """Cleanup expired rate limit entries (also runs periodically in the background)"""
     from utils.rate_limiter import rate_limiter
-    removed = rate_limiter.cleanup_memory(max_age_seconds=3600)
+    removed = rate_limiter.cleanup_memory()
     return {"message": f"Cleaned up {removed} expired entries", "removed_keys": removed}
 
 
@@ -571,14 +692,15 @@ async def generate_fill_questions(area: str, count: int = 50, user: dict = Depen
     
     subjects = area_subjects[area]
     generated = []
+    counts = await SubjectCounterService.get_counts()
     
     for subject_slug in subjects:
-        subject = await db.subjects.find_one({"slug": subject_slug}, {"_id": 0})
+        subject = await subject_catalog.get_by_slug(subject_slug)
         if not subject:
             continue
         
         # Get existing count
-        existing_count = await db.questions.count_documents({"subject_id": subject["subject_id"]})
+        existing_count = counts.get(subject["subject_id"], {}).get("question_count", 0)
         
         # Generate questions to reach desired count per subject
         questions_per_subject = count // len(subjects)
@@ -651,6 +773,7 @@ async def generate_fill_questions(area: str, count: int = 50, user: dict = Depen
             continue
         
         created = 0
+        counter_changes = []
         for i in range(to_generate):
             sample = samples[i % len(samples)]
             topic, text, options, correct, explanation = sample
@@ -665,16 +788,21 @@ async def generate_fill_questions(area: str, count: int = 50, user: dict = Depen
                 "options": options,
                 "correct_answer": correct,
                 "explanation": explanation,
+                "text_hash": QuestionService.text_hash(subject["subject_id"], f"{text} [{i+1}]"),
                 "created_at": datetime.now(timezone.utc).isoformat(),
                 "created_by": user["user_id"]
             }
             
             try:
                 await db.questions.insert_one(question_doc)
+                counter_changes.append((subject["subject_id"], topic, 1))
                 created += 1
             except Exception as e:
                 print(f"Error creating question: {e}")
         
+        await SubjectCounterService.apply_changes(counter_changes)
+        await QuestionService.invalidate_questions()
+        
         generated.append({
             "subject": subject["name"],
             "slug": subject_slug,
@@ -8,9 +8,14 @@ from fastapi import APIRouter, HTTPException, Depends
 from models import AttemptCreate, AttemptResponse, AttemptSubmit, SaveProgressRequest, PracticeAttemptCreate
 from utils.database import db
 from utils.config import UNAM_EXAM_CONFIG, EXAM_DURATION_MINUTES
+from utils.datetimes import to_datetime, to_iso
 from services.attempt_service import AttemptService
-from services.subscription_service import SubscriptionService
-from routes.auth import get_current_user
+from services.question_service import QuestionService
+from services.grading_service import GradingService, ABANDON_ANSWER_FIELDS
+from services.entitlement_service import EntitlementService
+from services.analytics_service import AnalyticsService
+from services.catalog import simulator_catalog
+from routes.auth import get_current_user, get_current_claims
 
 router = APIRouter(prefix="/attempts", tags=["Attempts"])
 
@@ -18,47 +23,57 @@ router = APIRouter(prefix="/attempts", tags=["Attempts"])
 @router.post("", response_model=AttemptResponse)
 async def create_attempt(data: AttemptCreate, user: Dict = Depends(get_current_user)):
     """Create a new attempt"""
-    simulator = await db.simulators.find_one({"simulator_id": data.simulator_id}, {"_id": 0})
+    simulator = await simulator_catalog.get(data.simulator_id)
     if not simulator:
         raise HTTPException(status_code=404, detail="Simulator not found")
     
-    # Check access
-    has_access = await SubscriptionService.check_simulator_access(user, simulator["area"])
-    if not has_access:
-        from utils.config import FREE_SIMULATORS_PER_AREA
-        raise HTTPException(
-            status_code=403,
-            detail=f"Has alcanzado el límite de {FREE_SIMULATORS_PER_AREA} simulacros gratuitos para esta área. Suscríbete para acceso ilimitado."
-        )
-    
-    # Create attempt
-    attempt = await AttemptService.create_attempt(user["user_id"], data.simulator_id, data.question_count)
+    # Reserve quota (in-progress attempts count toward the free limits)
+    reserved = await EntitlementService.reserve_simulator(user, simulator["area"])
+    if not reserved:
+        # At the limit, the user can still resume an attempt already in progress
+        attempt = await AttemptService.get_in_progress_attempt(user["user_id"], data.simulator_id)
+        if not attempt:
+            from utils.config import FREE_SIMULATORS_PER_AREA
+            raise HTTPException(
+                status_code=403,
+                detail=f"Has alcanzado el límite de {FREE_SIMULATORS_PER_AREA} simulacros gratuitos para esta área. Suscríbete para acceso ilimitado."
+            )
+    else:
+        # Create attempt; the reservation is released if no new attempt was created
+        try:
+            attempt, created = await AttemptService.create_attempt(user["user_id"], data.simulator_id, data.question_count)
+        except Exception:
+            await EntitlementService.release_simulator(user["user_id"], simulator["area"])
+            raise
+        if not created:
+            await EntitlementService.release_simulator(user["user_id"], simulator["area"])
     
     return AttemptResponse(
         attempt_id=attempt["attempt_id"],
         simulator_id=data.simulator_id,
         simulator_name=simulator["name"],
         user_id=user["user_id"],
-        started_at=attempt["started_at"],
+        started_at=to_iso(attempt["started_at"]),
         total_questions=attempt["total_questions"],
         status="in_progress"
     )
 
 
 @router.get("")
-async def get_user_attempts(user: Dict = Depends(get_current_user)):
+async def get_user_attempts(user: Dict = Depends(get_current_claims)):
     """Get user's attempts"""
     attempts = await db.attempts.find({"user_id": user["user_id"]}, {"_id": 0}).sort("started_at", -1).to_list(100)
+    simulators = await simulator_catalog.get_many(a["simulator_id"] for a in attempts)
     result = []
     for a in attempts:
-        simulator = await db.simulators.find_one({"simulator_id": a["simulator_id"]}, {"_id": 0})
+        simulator = simulators.get(a["simulator_id"])
         result.append({
             "attempt_id": a["attempt_id"],
             "simulator_id": a["simulator_id"],
             "simulator_name": simulator["name"] if simulator else "Unknown",
             "user_id": a["user_id"],
-            "started_at": a["started_at"],
-            "finished_at": a.get("finished_at"),
+            "started_at": to_iso(a["started_at"]),
+            "finished_at": to_iso(a.get("finished_at")),
             "score": a.get("score"),
             "total_questions": a.get("total_questions", 120),
             "status": a["status"],
@@ -68,20 +83,20 @@ async def get_user_attempts(user: Dict = Depends(get_current_user)):
 
 
 @router.get("/{attempt_id}")
-async def get_attempt_detail(attempt_id: str, user: Dict = Depends(get_current_user)):
+async def get_attempt_detail(attempt_id: str, user: Dict = Depends(get_current_claims)):
     """Get attempt details"""
     attempt = await db.attempts.find_one({"attempt_id": attempt_id, "user_id": user["user_id"]}, {"_id": 0})
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
-    simulator = await db.simulators.find_one({"simulator_id": attempt["simulator_id"]}, {"_id": 0})
+    simulator = await simulator_catalog.get(attempt["simulator_id"])
     
     return {
         "attempt_id": attempt["attempt_id"],
         "simulator_id": attempt["simulator_id"],
         "simulator_name": simulator["name"] if simulator else "Unknown",
         "status": attempt["status"],
-        "started_at": attempt["started_at"],
+        "started_at": to_iso(attempt["started_at"]),
         "total_questions": attempt.get("total_questions", 120),
         "duration_minutes": attempt.get("duration_minutes", EXAM_DURATION_MINUTES),
         "saved_progress": attempt.get("saved_progress"),
@@ -91,13 +106,13 @@ async def get_attempt_detail(attempt_id: str, user: Dict = Depends(get_current_u
 
 
 @router.get("/{attempt_id}/questions")
-async def get_attempt_questions(attempt_id: str, user: Dict = Depends(get_current_user)):
+async def get_attempt_questions(attempt_id: str, user: Dict = Depends(get_current_claims)):
     """Get questions for an attempt (for resuming)"""
     attempt = await db.attempts.find_one({"attempt_id": attempt_id, "user_id": user["user_id"]}, {"_id": 0})
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
-    simulator = await db.simulators.find_one({"simulator_id": attempt["simulator_id"]}, {"_id": 0})
+    simulator = await simulator_catalog.get(attempt["simulator_id"])
     if not simulator:
         raise HTTPException(status_code=404, detail="Simulator not found")
     
@@ -107,36 +122,8 @@ async def get_attempt_questions(attempt_id: str, user: Dict = Depends(get_curren
     if not question_ids:
         raise HTTPException(status_code=400, detail="No questions found for this attempt")
     
-    # Fetch questions in order
-    questions = []
-    reading_texts_cache = {}
-    
-    for qid in question_ids:
-        q = await db.questions.find_one({"question_id": qid}, {"_id": 0})
-        if not q:
-            continue
-        
-        subject = await db.subjects.find_one({"subject_id": q["subject_id"]}, {"_id": 0})
-        
-        # Fetch reading text
-        reading_text_content = None
-        if q.get("reading_text_id"):
-            if q["reading_text_id"] not in reading_texts_cache:
-                rt = await db.reading_texts.find_one({"reading_text_id": q["reading_text_id"]}, {"_id": 0})
-                reading_texts_cache[q["reading_text_id"]] = rt["content"] if rt else None
-            reading_text_content = reading_texts_cache.get(q["reading_text_id"])
-        
-        questions.append({
-            "question_id": q["question_id"],
-            "subject_id": q["subject_id"],
-            "subject_name": subject["name"] if subject else "Unknown",
-            "topic": q["topic"],
-            "text": q["text"],
-            "options": q["options"],
-            "image_url": q.get("image_url"),
-            "option_images": q.get("option_images"),
-            "reading_text": reading_text_content
-        })
+    # Fetch questions in order (batched: one query per collection)
+    questions = await QuestionService.hydrate_questions(question_ids)
     
     return {
         "simulator": {
@@ -153,7 +140,7 @@ async def get_attempt_questions(attempt_id: str, user: Dict = Depends(get_curren
 
 
 @router.post("/{attempt_id}/save-progress")
-async def save_attempt_progress(attempt_id: str, data: SaveProgressRequest, user: Dict = Depends(get_current_user)):
+async def save_attempt_progress(attempt_id: str, data: SaveProgressRequest, user: Dict = Depends(get_current_claims)):
     """Save attempt progress"""
     attempt = await db.attempts.find_one({"attempt_id": attempt_id, "user_id": user["user_id"]}, {"_id": 0})
     if not attempt:
@@ -178,18 +165,21 @@ async def save_attempt_progress(attempt_id: str, data: SaveProgressRequest, user
 
 
 @router.post("/{attempt_id}/submit")
-async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depends(get_current_user)):
+async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depends(get_current_claims)):
     """Submit an attempt"""
     attempt = await db.attempts.find_one({"attempt_id": attempt_id, "user_id": user["user_id"]}, {"_id": 0})
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     if attempt["status"] == "completed":
         raise HTTPException(status_code=400, detail="Already completed")
+    if attempt["status"] != "in_progress":
+        # Abandoned attempts gave their simulator back to the quota
+        raise HTTPException(status_code=400, detail="Attempt is not in progress")
     
     if len(data.answers) == 0:
         raise HTTPException(status_code=400, detail="No answers provided")
     
-    simulator = await db.simulators.find_one({"simulator_id": attempt["simulator_id"]}, {"_id": 0})
+    simulator = await simulator_catalog.get(attempt["simulator_id"])
     area_config = UNAM_EXAM_CONFIG.get(simulator["area"], {})
     
     now = datetime.now(timezone.utc)
@@ -209,47 +199,19 @@ async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depe
     if time_taken > duration_minutes:
         time_taken = duration_minutes
     
-    total_score = 0
-    subject_scores = {}
-    answers_data = []
-    
-    for answer in data.answers:
-        question = await db.questions.find_one({"question_id": answer.question_id}, {"_id": 0})
-        if not question:
-            continue
-        
-        # Handle case where selected_option might be None/invalid
-        if answer.selected_option is None or answer.selected_option < 0 or answer.selected_option > 3:
-            is_correct = False
-        else:
-            is_correct = question["correct_answer"] == answer.selected_option
-        if is_correct:
-            total_score += 1
-        
-        subject = await db.subjects.find_one({"subject_id": question["subject_id"]}, {"_id": 0})
-        subject_name = subject["name"] if subject else "Unknown"
-        
-        if subject_name not in subject_scores:
-            subject_scores[subject_name] = {"correct": 0, "total": 0}
-        subject_scores[subject_name]["total"] += 1
-        if is_correct:
-            subject_scores[subject_name]["correct"] += 1
-        
-        answers_data.append({
-            "question_id": answer.question_id,
-            "selected_option": answer.selected_option,
-            "correct_answer": question["correct_answer"],
-            "is_correct": is_correct,
-            "subject_name": subject_name,
-            "explanation": question["explanation"],
-            "question_text": question["text"],
-            "options": question["options"]
-        })
+    grading = await GradingService.grade_answers(
+        [a.model_dump() for a in data.answers],
+        question_ids=attempt.get("question_ids") or None
+    )
+    total_score = grading["score"]
+    subject_scores = grading["subject_scores"]
+    answers_data = grading["answers"]
     
-    await db.attempts.update_one(
-        {"attempt_id": attempt_id},
+    # Conditional on status so a concurrent submit or abandon cannot complete it twice
+    result = await db.attempts.update_one(
+        {"attempt_id": attempt_id, "status": "in_progress"},
         {"$set": {
-            "finished_at": now.isoformat(),
+            "finished_at": now,
             "score": total_score,
             "status": "completed",
             "answers": answers_data,
@@ -257,7 +219,12 @@ async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depe
             "time_taken_minutes": int(time_taken)
         }}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Attempt is not in progress")
     
+    await AnalyticsService.record_attempt(
+        user["user_id"], {**attempt, "score": total_score}, subject_scores, len(answers_data)
+    )
     return {
         "attempt_id": attempt_id,
         "simulator_id": attempt["simulator_id"],
@@ -265,7 +232,7 @@ async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depe
         "area": simulator["area"],
         "area_name": area_config.get("name", "Unknown"),
         "user_id": user["user_id"],
-        "started_at": attempt["started_at"],
+        "started_at": to_iso(attempt["started_at"]),
         "finished_at": now.isoformat(),
         "score": total_score,
         "total_questions": len(data.answers),
@@ -276,7 +243,7 @@ async def submit_attempt(attempt_id: str, data: AttemptSubmit, user: Dict = Depe
 
 
 @router.get("/{attempt_id}/results")
-async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_user)):
+async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_claims)):
     """Get attempt results"""
     attempt = await db.attempts.find_one({
         "attempt_id": attempt_id,
@@ -287,7 +254,7 @@ async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_
     if not attempt:
         raise HTTPException(status_code=404, detail="Completed attempt not found")
     
-    simulator = await db.simulators.find_one({"simulator_id": attempt["simulator_id"]}, {"_id": 0})
+    simulator = await simulator_catalog.get(attempt["simulator_id"])
     area_config = UNAM_EXAM_CONFIG.get(simulator["area"], {})
     
     # Calculate actual time taken based on saved value or compute it
@@ -303,23 +270,19 @@ async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_
         if time_taken_minutes < 0:
             time_taken_minutes = 0
     
-    # Enrich answers with reading texts
+    # Enrich answers with reading texts (batched, questions served from cache)
+    answers = attempt.get("answers", [])
+    questions_by_id = await QuestionService.get_questions_by_ids(a["question_id"] for a in answers)
+    reading_texts = await QuestionService.get_reading_texts(
+        q.get("reading_text_id") for q in questions_by_id.values()
+    )
+    
     enriched_answers = []
-    reading_texts_cache = {}
-    
-    for answer in attempt.get("answers", []):
-        question = await db.questions.find_one({"question_id": answer["question_id"]}, {"_id": 0})
-        reading_text = None
-        
-        if question and question.get("reading_text_id"):
-            if question["reading_text_id"] not in reading_texts_cache:
-                rt = await db.reading_texts.find_one({"reading_text_id": question["reading_text_id"]}, {"_id": 0})
-                reading_texts_cache[question["reading_text_id"]] = rt["content"] if rt else None
-            reading_text = reading_texts_cache.get(question["reading_text_id"])
-        
+    for answer in answers:
+        question = questions_by_id.get(answer["question_id"])
         enriched_answers.append({
             **answer,
-            "reading_text": reading_text,
+            "reading_text": reading_texts.get(question.get("reading_text_id")) if question else None,
             "topic": question.get("topic") if question else None,
             "image_url": question.get("image_url") if question else None
         })
@@ -331,8 +294,8 @@ async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_
         "area": simulator["area"],
         "area_name": area_config.get("name", "Unknown"),
         "user_id": user["user_id"],
-        "started_at": attempt["started_at"],
-        "finished_at": attempt["finished_at"],
+        "started_at": to_iso(attempt["started_at"]),
+        "finished_at": to_iso(attempt["finished_at"]),
         "score": attempt["score"],
         "total_questions": len(attempt.get("answers", [])),
         "percentage": round((attempt["score"] / len(attempt.get("answers", []))) * 100, 2) if attempt.get("answers") else 0,
@@ -343,7 +306,7 @@ async def get_attempt_results(attempt_id: str, user: Dict = Depends(get_current_
 
 
 @router.post("/{attempt_id}/abandon")
-async def abandon_attempt(attempt_id: str, user: Dict = Depends(get_current_user)):
+async def abandon_attempt(attempt_id: str, user: Dict = Depends(get_current_claims)):
     """Abandon an in-progress attempt and mark it as completed with partial answers"""
     attempt = await db.attempts.find_one({"attempt_id": attempt_id, "user_id": user["user_id"]})
     if not attempt:
@@ -357,9 +320,9 @@ async def abandon_attempt(attempt_id: str, user: Dict = Depends(get_current_user
     saved_answers = saved_progress.get("answers", [])
     
     if not saved_answers:
-        # If no answers, just mark as abandoned
-        await db.attempts.update_one(
-            {"attempt_id": attempt_id},
+        # If no answers, just mark as abandoned and give the simulator back to the quota
+        result = await db.attempts.update_one(
+            {"attempt_id": attempt_id, "status": "in_progress"},
             {
                 "$set": {
                     "status": "abandoned",
@@ -367,55 +330,31 @@ async def abandon_attempt(attempt_id: str, user: Dict = Depends(get_current_user
                 }
             }
         )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Attempt is not in progress")
+        simulator = await simulator_catalog.get(attempt["simulator_id"])
+        if simulator:
+            await EntitlementService.release_simulator(user["user_id"], simulator["area"])
         return {"message": "Attempt abandoned - no answers to save"}
     
     # Calculate score with the answers the user already gave
-    total_score = 0
-    subject_scores = {}
-    answers_data = []
-    
-    for answer in saved_answers:
-        question = await db.questions.find_one({"question_id": answer["question_id"]}, {"_id": 0})
-        if not question:
-            continue
-        
-        # Check if answer is correct
-        selected_option = answer.get("selected_option")
-        if selected_option is not None and selected_option >= 0 and selected_option <= 3:
-            is_correct = question["correct_answer"] == selected_option
-        else:
-            is_correct = False
-            
-        if is_correct:
-            total_score += 1
-            
-        # Track subject scores
-        subject = await db.subjects.find_one({"subject_id": question["subject_id"]}, {"_id": 0})
-        if subject:
-            subject_name = subject["name"]
-            if subject_name not in subject_scores:
-                subject_scores[subject_name] = {"correct": 0, "total": 0}
-            subject_scores[subject_name]["total"] += 1
-            if is_correct:
-                subject_scores[subject_name]["correct"] += 1
-        
-        answers_data.append({
-            "question_id": answer["question_id"],
-            "selected_option": selected_option,
-            "is_correct": is_correct,
-            "correct_answer": question["correct_answer"]
-        })
+    grading = await GradingService.grade_answers(
+        saved_answers,
+        question_ids=attempt.get("question_ids") or None,
+        answer_fields=ABANDON_ANSWER_FIELDS
+    )
+    total_score = grading["score"]
+    subject_scores = grading["subject_scores"]
+    answers_data = grading["answers"]
     
     # Calculate time taken
     now = datetime.now(timezone.utc)
-    started_at = attempt.get("started_at")
-    if isinstance(started_at, str):
-        started_at = datetime.fromisoformat(started_at.replace("Z", "+00:00"))
+    started_at = to_datetime(attempt.get("started_at"))
     time_taken_minutes = (now - started_at).total_seconds() / 60 if started_at else 0
     
-    # Mark as completed with partial results
-    await db.attempts.update_one(
-        {"attempt_id": attempt_id},
+    # Mark as completed with partial results (only if still in progress)
+    result = await db.attempts.update_one(
+        {"attempt_id": attempt_id, "status": "in_progress"},
         {
             "$set": {
                 "status": "completed",
@@ -429,7 +368,12 @@ async def abandon_attempt(attempt_id: str, user: Dict = Depends(get_current_user
             }
         }
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Attempt is not in progress")
     
+    await AnalyticsService.record_attempt(
+        user["user_id"], {**attempt, "score": total_score}, subject_scores, len(answers_data)
+    )
     return {
         "message": "Attempt marked as completed with partial answers",
         "score": total_score,
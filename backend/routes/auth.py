@@ -9,6 +9,9 @@ from datetime import datetime, timezone, timedelta
 
 from models import UserCreate, UserLogin, TokenResponse, UserResponse
 from utils.database import db
+from utils.user_cache import user_cache
+# Auth dependencies live in utils.auth; re-exported here for existing imports
+from utils.auth import get_current_user, get_current_claims, get_admin_user  # noqa: F401
 from utils.config import MAX_NAME_LENGTH, GOOGLE_REDIRECT_URI
 from utils.security import sanitize_string
 from utils.oauth import (
@@ -22,56 +25,9 @@ from services.auth_service import AuthService
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
-async def get_current_user(request: Request) -> Dict:
-    """Get current user from session or JWT token"""
-    from fastapi.security import HTTPBearer
-    security = HTTPBearer(auto_error=False)
-    
-    # Check cookie first
-    session_token = request.cookies.get("session_token")
-    if session_token:
-        session = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
-        if session:
-            expires_at = session.get("expires_at")
-            if isinstance(expires_at, str):
-                expires_at = datetime.fromisoformat(expires_at)
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=timezone.utc)
-            if expires_at > datetime.now(timezone.utc):
-                user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0, "password": 0})
-                if user:
-                    return user
-    
-    # Check Authorization header
-    credentials = await security(request)
-    if credentials:
-        token = credentials.credentials
-        payload = AuthService.decode_token(token)
-        if payload:
-            user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "password": 0})
-            if user:
-                return user
-    
-    raise HTTPException(status_code=401, detail="Authentication required")
-
-
-async def get_admin_user(user: Dict = Depends(get_current_user)) -> Dict:
-    """Verify user is admin"""
-    if user.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return user
-
-
 @router.post("/register", response_model=TokenResponse)
-async def register(user_data: UserCreate, request: Request):
-    """Register a new user with email/password"""
-    from utils.rate_limiter import rate_limiter
-    from utils.config import RATE_LIMIT_MAX_REQUESTS
-    
-    client_ip = request.client.host if request.client else "unknown"
-    if not await rate_limiter.check_rate_limit(f"register_{client_ip}", RATE_LIMIT_MAX_REQUESTS):
-        raise HTTPException(status_code=429, detail="Too many requests")
-    
+async def register(user_data: UserCreate):
+    """Register a new user with email/password (rate limited by RateLimitMiddleware)"""
     email_lower = user_data.email.lower()
     existing = await db.users.find_one({"email": email_lower}, {"_id": 0})
     if existing:
@@ -100,15 +56,8 @@ async def register(user_data: UserCreate, request: Request):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: UserLogin, request: Request):
-    """Login with email and password"""
-    from utils.rate_limiter import rate_limiter
-    from utils.config import RATE_LIMIT_MAX_LOGIN
-    
-    client_ip = request.client.host if request.client else "unknown"
-    if not await rate_limiter.check_rate_limit(f"login_{client_ip}", RATE_LIMIT_MAX_LOGIN):
-        raise HTTPException(status_code=429, detail="Too many login attempts")
-    
+async def login(credentials: UserLogin):
+    """Login with email and password (rate limited by RateLimitMiddleware)"""
     email_lower = credentials.email.lower()
     user = await db.users.find_one({"email": email_lower}, {"_id": 0})
     
@@ -246,6 +195,7 @@ async def google_oauth_callback_get(
                     "last_login": now.isoformat()
                 }}
             )
+            await user_cache.invalidate_user(user["user_id"])
             user_id = user["user_id"]
             role = user["role"]
             created_at = user["created_at"]
@@ -276,7 +226,7 @@ async def google_oauth_callback_get(
             {"user_id": user_id},
             {"$set": {
                 "session_token": session_token,
-                "expires_at": expires_at.isoformat(),
+                "expires_at": expires_at,
                 "created_at": now.isoformat()
             }},
             upsert=True
@@ -348,6 +298,7 @@ async def google_oauth_callback(request: Request, response: Response):
                     "last_login": now.isoformat()
                 }}
             )
+            await user_cache.invalidate_user(user["user_id"])
             user_id = user["user_id"]
             role = user["role"]
             created_at = user["created_at"]
@@ -378,7 +329,7 @@ async def google_oauth_callback(request: Request, response: Response):
             {"user_id": user_id},
             {"$set": {
                 "session_token": session_token,
-                "expires_at": expires_at.isoformat(),
+                "expires_at": expires_at,
                 "created_at": now.isoformat()
             }},
             upsert=True
@@ -433,6 +384,7 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        await user_cache.invalidate_session(session_token)
     secure_cookie = os.environ.get("ENV", "development") == "production"
     response.delete_cookie(key="session_token", path="/", secure=secure_cookie, samesite="lax")
     return {"message": "Logged out"}
@@ -472,6 +424,7 @@ async def link_google_account(request: Request, user: Dict = Depends(get_current
                 "auth_provider": "hybrid"  # Can use both email and Google
             }}
         )
+        await user_cache.invalidate_user(user["user_id"])
         
         return {"message": "Google account linked successfully"}
         
@@ -8,7 +8,7 @@ from models import CheckoutRequest, SubscriptionResponse
 from utils.database import db
 from utils.config import SUBSCRIPTION_PLANS, FREE_SIMULATORS_PER_AREA, STRIPE_API_KEY, STRIPE_WEBHOOK_SECRET
 from services.auth_service import AuthService
-from services.subscription_service import SubscriptionService
+from services.entitlement_service import EntitlementService
 from routes.auth import get_current_user
 
 # Initialize Stripe only if key is available
@@ -24,8 +24,8 @@ router = APIRouter(prefix="/payments", tags=["Payments"])
 @router.get("/subscription")
 async def get_subscription_status(user: dict = Depends(get_current_user)):
     """Get user's subscription status"""
-    subscription = await SubscriptionService.get_user_subscription(user["user_id"])
-    usage = await SubscriptionService.get_user_simulator_usage(user["user_id"])
+    subscription = await EntitlementService.get_premium(user["user_id"])
+    usage = (await EntitlementService.get_entitlements(user["user_id"]))["simulators"]["by_area"]
     
     return SubscriptionResponse(
         is_premium=subscription["is_premium"],
@@ -169,8 +169,9 @@ async def get_checkout_status(session_id: str, user: dict = Depends(get_current_
                     "transaction_id": transaction["transaction_id"],
                     "status": "active",
                     "created_at": datetime.now(timezone.utc).isoformat(),
-                    "expires_at": expires_at.isoformat()
+                    "expires_at": expires_at
                 })
+                await EntitlementService.invalidate_premium(user["user_id"])
         
         return {
             "status": session.status,
@@ -236,7 +237,8 @@ async def stripe_webhook(request: Request):
                     "transaction_id": transaction["transaction_id"],
                     "status": "active",
                     "created_at": datetime.now(timezone.utc).isoformat(),
-                    "expires_at": expires_at.isoformat()
+                    "expires_at": expires_at
                 })
+                await EntitlementService.invalidate_premium(transaction["user_id"])
     
     return {"status": "success"}
@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Depends
 
 from models import QuestionResponse
 from utils.database import db
+from services.catalog import subject_catalog
 from routes.auth import get_current_user, get_admin_user
 
 router = APIRouter(prefix="/questions", tags=["Questions"])
@@ -18,12 +19,11 @@ async def get_questions(subject_id: Optional[str] = None, limit: int = 100, user
     limit = min(limit, 500)
     
     questions = await db.questions.find(query, {"_id": 0}).to_list(limit)
+    subject_names = await subject_catalog.get_names(q["subject_id"] for q in questions)
     result = []
     reading_texts_cache = {}
     
     for q in questions:
-        subject = await db.subjects.find_one({"subject_id": q["subject_id"]}, {"_id": 0})
-        
         # Fetch reading text if exists
         reading_text_content = None
         if q.get("reading_text_id"):
@@ -38,7 +38,7 @@ async def get_questions(subject_id: Optional[str] = None, limit: int = 100, user
         result.append(QuestionResponse(
             question_id=q["question_id"],
             subject_id=q["subject_id"],
-            subject_name=subject["name"] if subject else "Unknown",
+            subject_name=subject_names.get(q["subject_id"], "Unknown"),
             topic=q["topic"],
             text=q["text"],
             options=q["options"],
@@ -6,7 +6,7 @@ from typing import List, Dict
 from fastapi import APIRouter, HTTPException, Depends
 
 from models import SimulatorResponse
-from utils.database import db
+from services.catalog import simulator_catalog
 from utils.config import UNAM_EXAM_CONFIG, TOTAL_QUESTIONS, EXAM_DURATION_MINUTES
 from routes.auth import get_current_user
 
@@ -16,7 +16,7 @@ router = APIRouter(prefix="/simulators", tags=["Simulators"])
 @router.get("", response_model=List[SimulatorResponse])
 async def get_simulators():
     """Get all simulators"""
-    simulators = await db.simulators.find({}, {"_id": 0}).to_list(100)
+    simulators = await simulator_catalog.all()
     return [SimulatorResponse(
         simulator_id=s["simulator_id"],
         name=s["name"],
@@ -39,7 +39,7 @@ async def get_simulator_questions(
     """Generate questions for a simulator"""
     from services.attempt_service import AttemptService
     
-    simulator = await db.simulators.find_one({"simulator_id": simulator_id}, {"_id": 0})
+    simulator = await simulator_catalog.get(simulator_id)
     if not simulator:
         raise HTTPException(status_code=404, detail="Simulator not found")
     
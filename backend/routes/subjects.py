@@ -6,6 +6,8 @@ from fastapi import APIRouter, HTTPException, Depends
 
 from models import SubjectResponse
 from utils.database import db
+from services.catalog import subject_catalog
+from services.subject_counter_service import SubjectCounterService
 from routes.auth import get_current_user
 
 router = APIRouter(prefix="/subjects", tags=["Subjects"])
@@ -14,23 +16,20 @@ router = APIRouter(prefix="/subjects", tags=["Subjects"])
 @router.get("", response_model=List[SubjectResponse])
 async def get_subjects(user: Dict = Depends(get_current_user)):
     """Get all subjects with question counts"""
-    subjects = await db.subjects.find({}, {"_id": 0}).to_list(100)
-    result = []
-    for s in subjects:
-        count = await db.questions.count_documents({"subject_id": s["subject_id"]})
-        result.append(SubjectResponse(
-            subject_id=s["subject_id"],
-            name=s["name"],
-            slug=s["slug"],
-            question_count=count
-        ))
-    return result
+    subjects = await subject_catalog.all()
+    counts = await SubjectCounterService.get_counts()
+    return [SubjectResponse(
+        subject_id=s["subject_id"],
+        name=s["name"],
+        slug=s["slug"],
+        question_count=counts.get(s["subject_id"], {}).get("question_count", 0)
+    ) for s in subjects]
 
 
 @router.get("/{subject_id}")
 async def get_subject_detail(subject_id: str):
     """Get subject details including topics"""
-    subject = await db.subjects.find_one({"subject_id": subject_id}, {"_id": 0})
+    subject = await subject_catalog.get(subject_id)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     return subject
@@ -39,7 +38,7 @@ async def get_subject_detail(subject_id: str):
 @router.get("/{subject_id}/questions")
 async def get_subject_questions(subject_id: str, limit: int = 20, user: Dict = Depends(get_current_user)):
     """Get random questions for a subject"""
-    subject = await db.subjects.find_one({"subject_id": subject_id}, {"_id": 0})
+    subject = await subject_catalog.get(subject_id)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
@@ -89,6 +89,15 @@ async def seed_database():
             {"simulator_id": generate_id("sim_"), "name": "Simulacro Area 4 - Humanidades", "area": "area_4", "description": "Humanidades y Artes", "created_at": datetime.now(timezone.utc).isoformat()},
         ]
         await db.simulators.insert_many(simulators)
+        # Rebuild question counters and text hashes for the new data
+        from services.subject_counter_service import SubjectCounterService
+        from services.question_service import QuestionService
+        await SubjectCounterService.reconcile()
+        await QuestionService.backfill_text_hashes()
+        
+        # Running servers reload their subject and simulator catalogs
+        for collection in ("subjects", "simulators"):
+            await db.catalog_versions.update_one({"_id": collection}, {"$inc": {"version": 1}}, upsert=True)
         
         # Create admin user
         print("Creando usuario admin...")
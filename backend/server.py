@@ -16,6 +16,7 @@ from dotenv import load_dotenv
 
 from routes import create_api_router
 from utils.config import CORS_ORIGINS
+from utils.rate_limit_middleware import RateLimitMiddleware
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -57,6 +58,9 @@ def create_app() -> FastAPI:
         openapi_url="/api/openapi.json" if enable_docs else None,
     )
     
+    # Rate limiting (innermost, so 429 responses still get security and CORS headers)
+    app.add_middleware(RateLimitMiddleware)
+    
     # Add security middleware
     app.add_middleware(SecurityHeadersMiddleware)
     
@@ -67,6 +71,7 @@ def create_app() -> FastAPI:
         allow_origins=CORS_ORIGINS,
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         allow_headers=["Authorization", "Content-Type", "X-Session-ID"],
+        expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After", "X-Next-Cursor"],
     )
     
     # Include API router
@@ -85,11 +90,14 @@ def create_app() -> FastAPI:
 def _register_additional_routes(app: FastAPI):
     """Register additional routes not in main router"""
     from datetime import datetime, timezone
-    from fastapi import HTTPException, Request
+    from fastapi import HTTPException, Request, Depends
     from utils.config import UNAM_EXAM_CONFIG, TOTAL_QUESTIONS, EXAM_DURATION_MINUTES, SUBJECT_ORDER, SUBJECT_NAMES
     from utils.database import db
     from utils.security import sanitize_string
+    from utils.datetimes import to_iso
     from services.auth_service import AuthService
+    from services.catalog import subject_catalog
+    from utils.auth import get_current_user, get_current_claims
     
     @app.get("/api/health")
     async def health_check():
@@ -112,12 +120,10 @@ def _register_additional_routes(app: FastAPI):
         }
     
     @app.post("/api/practice/start")
-    async def start_practice(request: Request):
+    async def start_practice(request: Request, user: dict = Depends(get_current_user)):
         """Start a practice session"""
-        from routes.auth import get_current_user
-        from services.subscription_service import SubscriptionService
+        from services.entitlement_service import EntitlementService, PRACTICE_SESSIONS_LIMIT_REASON
         
-        user = await get_current_user(request)
         data = await request.json()
         
         subject_id = data.get("subject_id")
@@ -131,7 +137,7 @@ def _register_additional_routes(app: FastAPI):
             )
         
         # Check if user has access to this subject (premium feature)
-        subject_access = await SubscriptionService.check_subject_access(user, subject_id)
+        subject_access = await EntitlementService.check_subject_access(user, subject_id)
         if not subject_access:
             raise HTTPException(
                 status_code=403,
@@ -139,7 +145,7 @@ def _register_additional_routes(app: FastAPI):
             )
         
         # Check practice access limits for free users
-        access_check = await SubscriptionService.check_practice_access(user, requested_count)
+        access_check = await EntitlementService.check_practice_access(user, requested_count)
         
         if not access_check["can_access"]:
             raise HTTPException(
@@ -150,36 +156,45 @@ def _register_additional_routes(app: FastAPI):
         # Use the allowed question count (may be limited for free users)
         question_count = min(requested_count, access_check["max_questions"])
         
-        subject = await db.subjects.find_one({"subject_id": subject_id}, {"_id": 0})
+        subject = await subject_catalog.get(subject_id)
         if not subject:
             raise HTTPException(status_code=404, detail="Subject not found")
         
-        questions = await db.questions.aggregate([
-            {"$match": {"subject_id": subject_id}},
-            {"$sample": {"size": question_count}},
-            {"$project": {"_id": 0}}
-        ]).to_list(question_count)
-        
-        # Get reading texts for questions that have them
-        reading_texts_cache = {}
-        for q in questions:
-            if q.get("reading_text_id") and q["reading_text_id"] not in reading_texts_cache:
-                rt = await db.reading_texts.find_one({"reading_text_id": q["reading_text_id"]}, {"_id": 0})
-                reading_texts_cache[q["reading_text_id"]] = rt["content"] if rt else None
-        
-        practice_id = AuthService.generate_id("practice_")
-        now = datetime.now(timezone.utc).isoformat()
-        
-        await db.practice_sessions.insert_one({
-            "practice_id": practice_id,
-            "user_id": user["user_id"],
-            "subject_id": subject_id,
-            "subject_name": subject["name"],
-            "question_ids": [q["question_id"] for q in questions],
-            "answers": [],
-            "started_at": now,
-            "status": "in_progress"
-        })
+        # Take the session from today's quota atomically; the read above can race
+        reserved_day = await EntitlementService.reserve_practice_session(user, access_check["is_premium"])
+        if not reserved_day:
+            raise HTTPException(status_code=403, detail=PRACTICE_SESSIONS_LIMIT_REASON)
+        
+        try:
+            questions = await db.questions.aggregate([
+                {"$match": {"subject_id": subject_id}},
+                {"$sample": {"size": question_count}},
+                {"$project": {"_id": 0}}
+            ]).to_list(question_count)
+            
+            # Get reading texts for questions that have them
+            reading_texts_cache = {}
+            for q in questions:
+                if q.get("reading_text_id") and q["reading_text_id"] not in reading_texts_cache:
+                    rt = await db.reading_texts.find_one({"reading_text_id": q["reading_text_id"]}, {"_id": 0})
+                    reading_texts_cache[q["reading_text_id"]] = rt["content"] if rt else None
+            
+            practice_id = AuthService.generate_id("practice_")
+            now = datetime.now(timezone.utc).isoformat()
+            
+            await db.practice_sessions.insert_one({
+                "practice_id": practice_id,
+                "user_id": user["user_id"],
+                "subject_id": subject_id,
+                "subject_name": subject["name"],
+                "question_ids": [q["question_id"] for q in questions],
+                "answers": [],
+                "started_at": now,
+                "status": "in_progress"
+            })
+        except Exception:
+            await EntitlementService.release_practice_session(user["user_id"], reserved_day)
+            raise
         
         response = {
             "practice_id": practice_id,
@@ -208,11 +223,11 @@ def _register_additional_routes(app: FastAPI):
         return response
     
     @app.post("/api/practice/{practice_id}/submit")
-    async def submit_practice(practice_id: str, request: Request):
+    async def submit_practice(practice_id: str, request: Request, user: dict = Depends(get_current_claims)):
         """Submit practice session"""
-        from routes.auth import get_current_user
+        from services.grading_service import GradingService, PRACTICE_ANSWER_FIELDS
+        from services.entitlement_service import EntitlementService
         
-        user = await get_current_user(request)
         data = await request.json()
         
         practice = await db.practice_sessions.find_one({
@@ -225,40 +240,23 @@ def _register_additional_routes(app: FastAPI):
         if practice["status"] == "completed":
             raise HTTPException(status_code=400, detail="Practice already completed")
         
-        answers = data.get("answers", [])
-        results = []
-        score = 0
-        
-        for answer in answers:
-            question = await db.questions.find_one({"question_id": answer.get("question_id")}, {"_id": 0})
-            if not question:
-                continue
-            
-            is_correct = question["correct_answer"] == answer.get("selected_option")
-            if is_correct:
-                score += 1
-            
-            subject = await db.subjects.find_one({"subject_id": question["subject_id"]}, {"_id": 0})
-            
-            results.append({
-                "question_id": answer.get("question_id"),
-                "question_text": question["text"],
-                "topic": question["topic"],
-                "subject_name": subject["name"] if subject else "Unknown",
-                "options": question["options"],
-                "selected_option": answer.get("selected_option"),
-                "correct_answer": question["correct_answer"],
-                "is_correct": is_correct,
-                "explanation": question["explanation"],
-                "image_url": question.get("image_url"),
-                "option_images": question.get("option_images")
-            })
+        grading = await GradingService.grade_answers(
+            data.get("answers", []),
+            question_ids=practice.get("question_ids") or None,
+            answer_fields=PRACTICE_ANSWER_FIELDS
+        )
+        results = grading["answers"]
+        score = grading["score"]
         
-        now = datetime.now(timezone.utc).isoformat()
-        await db.practice_sessions.update_one(
-            {"practice_id": practice_id},
+        now = datetime.now(timezone.utc)
+        # Conditional on status so a concurrent submit cannot complete it twice
+        result = await db.practice_sessions.update_one(
+            {"practice_id": practice_id, "status": {"$ne": "completed"}},
             {"$set": {"answers": results, "score": score, "finished_at": now, "status": "completed"}}
         )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Practice already completed")
+        await EntitlementService.record_practice_answers(user["user_id"], len(results), practice["started_at"])
         
         return {
             "practice_id": practice_id,
@@ -270,12 +268,8 @@ def _register_additional_routes(app: FastAPI):
         }
     
     @app.get("/api/practice/{practice_id}/review")
-    async def get_practice_review(practice_id: str, request: Request):
+    async def get_practice_review(practice_id: str, user: dict = Depends(get_current_claims)):
         """Get practice review"""
-        from routes.auth import get_current_user
-        
-        user = await get_current_user(request)
-        
         practice = await db.practice_sessions.find_one({
             "practice_id": practice_id,
             "user_id": user["user_id"],
@@ -292,24 +286,24 @@ def _register_additional_routes(app: FastAPI):
             "total": len(practice.get("answers", [])),
             "results": practice.get("answers", []),
             "started_at": practice["started_at"],
-            "finished_at": practice.get("finished_at")
+            "finished_at": to_iso(practice.get("finished_at"))
         }
     
     @app.get("/api/user/limits")
-    async def get_user_limits(request: Request):
+    async def get_user_limits(user: dict = Depends(get_current_claims)):
         """Get user's remaining limits (simulators and practice)"""
-        from routes.auth import get_current_user
-        from services.subscription_service import SubscriptionService
+        from services.entitlement_service import EntitlementService
         
-        user = await get_current_user(request)
-        limits = await SubscriptionService.get_remaining_limits(user["user_id"])
+        limits = await EntitlementService.get_remaining_limits(user["user_id"])
         
         return limits
     
     @app.post("/api/seed")
     async def seed_database(request: Request):
         """Seed database with initial data (protected)"""
-        from routes.auth import get_current_user, get_admin_user
+        from services.question_service import QuestionService
+        from services.catalog import simulator_catalog
+        from services.subject_counter_service import SubjectCounterService
         
         client_ip = request.client.host if request.client else "unknown"
         
@@ -347,6 +341,7 @@ def _register_additional_routes(app: FastAPI):
             {"subject_id": "subj_filosofia", "name": "Filosofia", "slug": "filosofia"},
         ]
         await db.subjects.insert_many(subjects_data)
+        await subject_catalog.bump_version()
         
         # Sample questions
         templates = {
@@ -378,6 +373,9 @@ def _register_additional_routes(app: FastAPI):
                     "created_at": datetime.now(timezone.utc).isoformat()
                 })
         await db.questions.insert_many(questions)
+        await QuestionService.backfill_text_hashes()
+        await SubjectCounterService.reconcile()
+        await QuestionService.invalidate_questions()
         
         # Create simulators
         simulators = [
@@ -387,6 +385,7 @@ def _register_additional_routes(app: FastAPI):
             {"simulator_id": AuthService.generate_id("sim_"), "name": "Simulacro Area 4 - Humanidades", "area": "area_4", "description": "Humanidades y Artes", "created_at": datetime.now(timezone.utc).isoformat()},
         ]
         await db.simulators.insert_many(simulators)
+        await simulator_catalog.bump_version()
         
         # Create admin user if not exists
         if not await db.users.find_one({"email": "admin@ingresounam.com"}):
@@ -425,9 +424,29 @@ def setup_logging():
 async def shutdown_handler():
     """Cleanup on application shutdown"""
     from utils.database import client
+    from utils.background import stop_background_tasks
+    await stop_background_tasks()
     client.close()
 
 
+async def _reconcile_subject_counters():
+    """Periodic subject counter check; logs subjects whose counters had drifted"""
+    from services.subject_counter_service import SubjectCounterService
+    result = await SubjectCounterService.reconcile()
+    if result["corrected"]:
+        logging.warning(f"Subject counters corrected for: {result['corrected']}")
+    if result["skipped"]:
+        logging.info(f"Subject counters changed during reconcile, left for next run: {result['skipped']}")
+
+
+async def _expire_subscriptions():
+    """Periodic subscription expiry sweep"""
+    from services.subscription_service import SubscriptionService
+    result = await SubscriptionService.expire_subscriptions()
+    if result["expired"]:
+        logging.info(f"Subscription sweep expired {result['expired']} subscriptions")
+
+
 def _serve_frontend(app: FastAPI):
     """Serve React frontend static files"""
     frontend_build_dir = ROOT_DIR.parent / "frontend" / "build"
@@ -470,9 +489,32 @@ app = create_app()
 @app.on_event("startup")
 async def on_startup():
     """Initialize database indexes on startup"""
-    from utils.database import setup_database_indexes
+    from utils.database import db, setup_database_indexes
+    from services.question_pool import question_pool
+    from services.catalog import simulator_catalog, subject_catalog
+    from services.subject_counter_service import SubjectCounterService
     await setup_database_indexes()
     print("[OK] Database indexes initialized")
+    await question_pool.refresh()
+    print("[OK] Question pools loaded")
+    await simulator_catalog.refresh()
+    print("[OK] Simulator catalog loaded")
+    await subject_catalog.refresh()
+    print("[OK] Subject catalog loaded")
+    if await db.subject_counters.estimated_document_count() == 0:
+        await SubjectCounterService.reconcile()
+        print("[OK] Subject counters built")
+    from services.question_service import QuestionService
+    hashed = await QuestionService.backfill_text_hashes()
+    if hashed:
+        print(f"[OK] Text hashes set on {hashed} questions")
+    
+    from utils.background import start_periodic_task
+    from utils.rate_limiter import rate_limiter
+    from utils.config import RATE_LIMIT_SWEEP_INTERVAL, SUBJECT_COUNTER_RECONCILE_INTERVAL, SUBSCRIPTION_SWEEP_INTERVAL
+    start_periodic_task("rate-limit-sweep", RATE_LIMIT_SWEEP_INTERVAL, rate_limiter.cleanup_memory)
+    start_periodic_task("subject-counter-reconcile", SUBJECT_COUNTER_RECONCILE_INTERVAL, _reconcile_subject_counters)
+    start_periodic_task("subscription-expiry-sweep", SUBSCRIPTION_SWEEP_INTERVAL, _expire_subscriptions)
 
 # Register shutdown event
 @app.on_event("shutdown")
@@ -4,5 +4,12 @@ Business logic services
 from .auth_service import AuthService
 from .subscription_service import SubscriptionService
 from .attempt_service import AttemptService
+from .question_service import QuestionService
+from .grading_service import GradingService
+from .analytics_service import AnalyticsService
+from .subject_counter_service import SubjectCounterService
+from .stats_service import StatsService
+from .question_import_service import QuestionImportService
+from .entitlement_service import EntitlementService
 
-__all__ = ["AuthService", "SubscriptionService", "AttemptService"]
+__all__ = ["AuthService", "SubscriptionService", "AttemptService", "QuestionService", "GradingService", "AnalyticsService", "SubjectCounterService", "StatsService", "QuestionImportService", "EntitlementService"]
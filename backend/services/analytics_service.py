@@ -0,0 +1,327 @@
+"""
+Student analytics service backed by per-user performance rollups
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Any
+from pymongo.errors import DuplicateKeyError
+from utils.database import db
+from utils.config import UNAM_EXAM_CONFIG
+from utils.security import safe_field_name
+from utils.datetimes import to_iso
+from services.catalog import simulator_catalog
+
+# Bump when the rollup layout changes; older documents are rebuilt on read
+ROLLUP_VERSION = 2
+
+# Number of attempts kept in the progress trend
+TREND_LENGTH = 10
+
+
+def _subject_scores(attempt: Dict) -> Dict:
+    """Per-subject correct/total of a completed attempt"""
+    subject_scores = attempt.get("subject_scores")
+    if subject_scores is None:
+        # Attempts graded before subject_scores were stored
+        subject_scores = {}
+        for answer in attempt.get("answers", []):
+            name = answer.get("subject_name") or "Unknown"
+            stats = subject_scores.setdefault(name, {"correct": 0, "total": 0})
+            stats["total"] += 1
+            if answer.get("is_correct"):
+                stats["correct"] += 1
+    return subject_scores
+
+
+async def _completed_attempts(user_id: str, exclude: List[str] = None) -> List[Dict]:
+    query: Dict[str, Any] = {"user_id": user_id, "status": "completed"}
+    if exclude:
+        query["attempt_id"] = {"$nin": exclude}
+    return await db.attempts.find(
+        query,
+        {"_id": 0, "attempt_id": 1, "started_at": 1, "score": 1, "subject_scores": 1,
+         "answers.subject_name": 1, "answers.is_correct": 1}
+    ).sort("started_at", 1).to_list(None)
+
+
+def _trend_point(attempt: Dict, total_answers: int) -> Dict:
+    score = attempt.get("score", 0)
+    return {
+        "attempt_id": attempt.get("attempt_id"),
+        "date": to_iso(attempt["started_at"]),
+        "score": score,
+        "total": total_answers,
+        "percentage": round((score / total_answers) * 100, 1)
+    }
+
+
+class AnalyticsService:
+    """
+    Maintains one `user_performance` document per user with per-subject
+    correct/total counts and the last TREND_LENGTH results.
+    Updated incrementally when an attempt completes; rebuilt from the attempts
+    collection when missing (users from before rollups existed).
+    The ids of the attempts already counted are kept in `attempt_ids`, so folding
+    an attempt in twice is a no-op.
+    """
+    
+    @staticmethod
+    async def record_attempt(user_id: str, attempt: Dict, subject_scores: Dict, total_answers: int):
+        """
+        Fold a newly completed attempt into the user's rollup.
+        Must be called after the attempt was atomically moved to 'completed'.
+        Users without a rollup are skipped; it is built on next read.
+        """
+        inc: Dict[str, int] = {"total_attempts": 1}
+        set_fields: Dict[str, Any] = {"updated_at": datetime.now(timezone.utc).isoformat()}
+        for subject_name, stats in subject_scores.items():
+            if subject_name == "Unknown":
+                continue
+            key = safe_field_name(subject_name)
+            inc[f"subjects.{key}.correct"] = stats.get("correct", 0)
+            inc[f"subjects.{key}.total"] = stats.get("total", 0)
+            set_fields[f"subjects.{key}.name"] = subject_name
+        
+        push: Dict[str, Any] = {"attempt_ids": attempt["attempt_id"]}
+        if total_answers > 0:
+            push["trend"] = {
+                "$each": [_trend_point(attempt, total_answers)],
+                "$sort": {"date": 1},
+                "$slice": -TREND_LENGTH
+            }
+        
+        await db.user_performance.update_one(
+            {"user_id": user_id, "version": ROLLUP_VERSION, "attempt_ids": {"$ne": attempt["attempt_id"]}},
+            {"$inc": inc, "$set": set_fields, "$push": push}
+        )
+    
+    @staticmethod
+    async def rebuild_rollup(user_id: str) -> Dict:
+        """
+        Build a user's rollup from their completed attempts and store it.
+        Only a missing or older-version document is written: a current one may already
+        hold attempts recorded since. Attempts that completed while this ran (their
+        record_attempt found no current rollup) are folded in afterwards.
+        """
+        attempts = await _completed_attempts(user_id)
+        
+        subjects: Dict[str, Dict] = {}
+        trend: List[Dict] = []
+        for attempt in attempts:
+            answers = attempt.get("answers", [])
+            for subject_name, stats in _subject_scores(attempt).items():
+                if subject_name == "Unknown":
+                    continue
+                entry = subjects.setdefault(safe_field_name(subject_name), {"name": subject_name, "correct": 0, "total": 0})
+                entry["correct"] += stats.get("correct", 0)
+                entry["total"] += stats.get("total", 0)
+            
+            if answers:
+                trend.append(_trend_point(attempt, len(answers)))
+        
+        rollup = {
+            "user_id": user_id,
+            "version": ROLLUP_VERSION,
+            "total_attempts": len(attempts),
+            "subjects": subjects,
+            "trend": trend[-TREND_LENGTH:],
+            "attempt_ids": [a["attempt_id"] for a in attempts],
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            await db.user_performance.update_one(
+                {"user_id": user_id, "version": {"$ne": ROLLUP_VERSION}},
+                {"$set": rollup},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent request built it first; keep what it has recorded
+            pass
+        
+        stored = await db.user_performance.find_one({"user_id": user_id}, {"_id": 0, "attempt_ids": 1})
+        for attempt in await _completed_attempts(user_id, exclude=stored["attempt_ids"]):
+            await AnalyticsService.record_attempt(
+                user_id, attempt, _subject_scores(attempt), len(attempt.get("answers", []))
+            )
+        return await db.user_performance.find_one({"user_id": user_id}, {"_id": 0, "attempt_ids": 0})
+    
+    @staticmethod
+    async def get_rollup(user_id: str) -> Dict:
+        """Get a user's rollup, building it on first access"""
+        rollup = await db.user_performance.find_one({"user_id": user_id}, {"_id": 0, "attempt_ids": 0})
+        if not rollup or rollup.get("version") != ROLLUP_VERSION:
+            rollup = await AnalyticsService.rebuild_rollup(user_id)
+        return rollup
+    
+    @staticmethod
+    async def get_student_performance(user_id: str) -> Dict:
+        """Build the student performance report from the rollup"""
+        rollup = await AnalyticsService.get_rollup(user_id)
+        
+        if not rollup["total_attempts"]:
+            return {
+                "total_attempts": 0,
+                "total_questions_answered": 0,
+                "overall_accuracy": 0,
+                "subject_performance": {},
+                "progress_trend": [],
+                "weak_subjects": [],
+                "strong_subjects": [],
+                "recommendations": ["Comienza tu primer simulacro para ver tus estadísticas"]
+            }
+        
+        subject_performance = {}
+        weak_subjects = []
+        strong_subjects = []
+        total_correct = 0
+        total_answered = 0
+        
+        for stats in rollup["subjects"].values():
+            total_correct += stats["correct"]
+            total_answered += stats["total"]
+            if stats["total"] > 0:
+                subject = stats["name"]
+                pct = round((stats["correct"] / stats["total"]) * 100, 1)
+                subject_performance[subject] = {
+                    "correct": stats["correct"],
+                    "total": stats["total"],
+                    "percentage": pct
+                }
+                if pct < 60:
+                    weak_subjects.append({"subject": subject, "percentage": pct})
+                elif pct >= 80:
+                    strong_subjects.append({"subject": subject, "percentage": pct})
+        
+        weak_subjects.sort(key=lambda x: x["percentage"])
+        strong_subjects.sort(key=lambda x: x["percentage"], reverse=True)
+        
+        progress_data = [
+            {field: point[field] for field in ("date", "score", "total", "percentage")}
+            for point in rollup["trend"]
+        ]
+        
+        # Generate recommendations
+        recommendations = []
+        if weak_subjects:
+            recommendations.append(f"Enfócate en mejorar {weak_subjects[0]['subject']} ({weak_subjects[0]['percentage']}%)")
+        if rollup["total_attempts"] < 3:
+            recommendations.append("Realiza más simulacros para obtener estadísticas más precisas")
+        if len(progress_data) >= 2:
+            recent = progress_data[-1]["percentage"]
+            previous = progress_data[-2]["percentage"]
+            if recent > previous:
+                recommendations.append(f"¡Excelente! Mejoraste {round(recent - previous, 1)}% en tu último intento")
+            elif recent < previous:
+                recommendations.append("Tu último resultado bajó. Revisa las materias donde fallaste")
+        
+        return {
+            "total_attempts": rollup["total_attempts"],
+            "total_questions_answered": total_answered,
+            "overall_accuracy": round((total_correct / total_answered) * 100, 1) if total_answered > 0 else 0,
+            "subject_performance": subject_performance,
+            "progress_trend": progress_data,
+            "weak_subjects": weak_subjects[:3],
+            "strong_subjects": strong_subjects[:3],
+            "recommendations": recommendations[:5]
+        }
+    
+    @staticmethod
+    async def get_progress(user_id: str) -> Dict:
+        """
+        Summarise a user's completed attempts with one aggregation.
+        Only score, answer count and simulator fields leave the server, so the
+        response size does not grow with the user's history. Simulator names and
+        areas come from the in-memory simulator catalog.
+        """
+        pipeline = [
+            {"$match": {"user_id": user_id, "status": "completed"}},
+            {"$project": {
+                "_id": 0,
+                "attempt_id": 1,
+                "simulator_id": 1,
+                "started_at": 1,
+                "score": {"$ifNull": ["$score", 0]},
+                "total": {"$size": {"$ifNull": ["$answers", []]}}
+            }},
+            {"$facet": {
+                "totals": [
+                    {"$group": {
+                        "_id": None,
+                        "total_attempts": {"$sum": 1},
+                        "total_score": {"$sum": "$score"},
+                        "best_score": {"$max": "$score"},
+                        "total_questions": {"$sum": "$total"}
+                    }}
+                ],
+                "by_simulator": [
+                    {"$group": {
+                        "_id": "$simulator_id",
+                        "attempts": {"$sum": 1},
+                        "total_score": {"$sum": "$score"},
+                        "best_score": {"$max": "$score"}
+                    }}
+                ],
+                "recent": [
+                    {"$sort": {"started_at": -1}},
+                    {"$limit": 5}
+                ]
+            }}
+        ]
+        
+        result = (await db.attempts.aggregate(pipeline).to_list(1))[0]
+        totals = result["totals"][0] if result["totals"] else None
+        if not totals or not totals["total_attempts"]:
+            return {
+                "total_attempts": 0,
+                "average_score": 0,
+                "best_score": 0,
+                "total_questions_answered": 0,
+                "area_stats": {},
+                "recent_attempts": []
+            }
+        
+        simulators = await simulator_catalog.get_many(
+            [row["_id"] for row in result["by_simulator"]] + [a["simulator_id"] for a in result["recent"]]
+        )
+        
+        by_area: Dict[str, Dict] = {}
+        for row in result["by_simulator"]:
+            simulator = simulators.get(row["_id"])
+            if not simulator:
+                continue
+            stats = by_area.setdefault(simulator["area"], {"attempts": 0, "total_score": 0, "best_score": 0})
+            stats["attempts"] += row["attempts"]
+            stats["total_score"] += row["total_score"]
+            stats["best_score"] = max(stats["best_score"], row["best_score"])
+        
+        area_stats = {}
+        for area in sorted(by_area):
+            stats = by_area[area]
+            area_config = UNAM_EXAM_CONFIG.get(area, {})
+            area_stats[area] = {
+                "name": area_config.get("name", "Unknown"),
+                "color": area_config.get("color", "#666"),
+                "attempts": stats["attempts"],
+                "average_score": round(stats["total_score"] / stats["attempts"], 1),
+                "best_score": stats["best_score"],
+                "total_score": stats["total_score"]
+            }
+        
+        recent_attempts = []
+        for a in result["recent"]:
+            simulator = simulators.get(a["simulator_id"])
+            recent_attempts.append({
+                "attempt_id": a["attempt_id"],
+                "simulator_name": simulator["name"] if simulator else "Unknown",
+                "score": a["score"],
+                "total": a["total"],
+                "date": to_iso(a["started_at"])
+            })
+        
+        return {
+            "total_attempts": totals["total_attempts"],
+            "average_score": round(totals["total_score"] / totals["total_attempts"], 1),
+            "best_score": totals["best_score"],
+            "total_questions_answered": totals["total_questions"],
+            "area_stats": area_stats,
+            "recent_attempts": recent_attempts
+        }
@@ -1,21 +1,28 @@
 """
 Exam attempt service
 """
-import random
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from pymongo.errors import DuplicateKeyError
 from utils.database import db
-from utils.config import UNAM_EXAM_CONFIG, SUBJECT_ORDER, EXAM_DURATION_MINUTES, TOTAL_QUESTIONS
+from utils.config import UNAM_EXAM_CONFIG, SUBJECT_ORDER
 from services.auth_service import AuthService
+from services.question_service import QuestionService
+from services.question_pool import question_pool
+from services.catalog import simulator_catalog, subject_catalog
 
 
 class AttemptService:
     """Service for exam attempt operations"""
     
     @staticmethod
-    async def generate_attempt_questions(area: str, question_count: int = 120) -> List[Dict]:
-        """Generate questions for an attempt based on area configuration"""
+    @lru_cache(maxsize=64)
+    def plan_exam_blueprint(area: str, question_count: int = 120) -> Tuple[Tuple[str, int], ...]:
+        """
+        Compute per-subject question quotas for an area, in SUBJECT_ORDER.
+        UNAM_EXAM_CONFIG is static, so plans are memoised per (area, question_count).
+        """
         area_config = UNAM_EXAM_CONFIG.get(area)
         if not area_config:
             raise ValueError(f"Invalid area: {area}")
@@ -62,212 +69,88 @@ class AttemptService:
                 if new_count >= 1:
                     ordered_subjects[idx] = (slug, new_count)
         
-        # Now select questions based on adjusted counts
-        questions = []
-        used_question_ids = set()
+        return tuple(ordered_subjects)
+    
+    @staticmethod
+    async def select_question_ids(area: str, question_count: int = 120) -> List[str]:
+        """Pick random question ids for an exam following the area blueprint"""
+        blueprint = AttemptService.plan_exam_blueprint(area, question_count)
         
-        for subject_slug, count in ordered_subjects:
-            subject = await db.subjects.find_one({"slug": subject_slug}, {"_id": 0})
-            if not subject:
-                continue
-            
-            # Get all available questions for this subject
-            all_subject_questions = await db.questions.find(
-                {"subject_id": subject["subject_id"]},
-                {"_id": 0}
-            ).to_list(1000)
-            
-            # Filter out already used questions
-            available = [q for q in all_subject_questions if q["question_id"] not in used_question_ids]
-            
-            # Randomly select (handle empty available list)
-            if not available:
+        # Resolve all subject slugs from the catalog
+        subjects = await subject_catalog.get_many_by_slug(slug for slug, _ in blueprint)
+        subject_ids = {slug: s["subject_id"] for slug, s in subjects.items()}
+        
+        # Select question ids based on the quotas
+        question_ids = []
+        used_ids = set()
+        
+        for subject_slug, count in blueprint:
+            if subject_slug not in subject_ids:
                 continue
-            
-            # Don't select more than available
-            select_count = min(count, len(available))
-            selected = random.sample(available, select_count)
-            
-            for q in selected:
-                used_question_ids.add(q["question_id"])
-                questions.append({
-                    "question_id": q["question_id"],
-                    "subject_id": q["subject_id"],
-                    "subject_name": subject["name"],
-                    "topic": q["topic"],
-                    "text": q["text"],
-                    "options": q["options"],
-                    "image_url": q.get("image_url"),
-                    "option_images": q.get("option_images"),
-                    "reading_text": None  # Will be populated if needed
-                })
+            selected = await question_pool.sample(subject_ids[subject_slug], count, used_ids)
+            used_ids.update(selected)
+            question_ids.extend(selected)
         
         # If we still don't have enough questions due to database limitations,
         # try to fill from other subjects in the same area
-        current_count = len(questions)
-        if current_count < question_count:
-            for subject_slug, _ in ordered_subjects:
-                if len(questions) >= question_count:
-                    break
-                    
-                subject = await db.subjects.find_one({"slug": subject_slug}, {"_id": 0})
-                if not subject:
-                    continue
-                
-                all_subject_questions = await db.questions.find(
-                    {"subject_id": subject["subject_id"]},
-                    {"_id": 0}
-                ).to_list(1000)
-                
-                available = [q for q in all_subject_questions if q["question_id"] not in used_question_ids]
-                needed = question_count - len(questions)
-                
-                if available and needed > 0:
-                    extra = random.sample(available, min(needed, len(available)))
-                    for q in extra:
-                        used_question_ids.add(q["question_id"])
-                        questions.append({
-                            "question_id": q["question_id"],
-                            "subject_id": q["subject_id"],
-                            "subject_name": subject["name"],
-                            "topic": q["topic"],
-                            "text": q["text"],
-                            "options": q["options"],
-                            "image_url": q.get("image_url"),
-                            "option_images": q.get("option_images"),
-                            "reading_text": None
-                        })
+        for subject_slug, _ in blueprint:
+            needed = question_count - len(question_ids)
+            if needed <= 0:
+                break
+            if subject_slug not in subject_ids:
+                continue
+            extra = await question_pool.sample(subject_ids[subject_slug], needed, used_ids)
+            used_ids.update(extra)
+            question_ids.extend(extra)
+        
+        return question_ids
+    
+    @staticmethod
+    async def generate_attempt_questions(area: str, question_count: int = 120) -> List[Dict]:
+        """Generate questions for an attempt based on area configuration"""
+        question_ids = await AttemptService.select_question_ids(area, question_count)
         
-        return questions
+        # Load only the selected questions, in selection order
+        return await QuestionService.hydrate_questions(question_ids)
     
     @staticmethod
     async def get_reading_texts_for_questions(questions: List[Dict]) -> Dict[str, str]:
         """Fetch reading texts for questions that have them"""
-        reading_texts_cache = {}
-        
-        # Get unique reading_text_ids
-        reading_text_ids = set()
-        for q in questions:
-            if q.get("reading_text_id"):
-                reading_text_ids.add(q["reading_text_id"])
-        
-        # Fetch all reading texts
-        for rt_id in reading_text_ids:
-            rt = await db.reading_texts.find_one({"reading_text_id": rt_id}, {"_id": 0})
-            if rt:
-                reading_texts_cache[rt_id] = rt["content"]
-        
-        return reading_texts_cache
+        return await QuestionService.get_reading_texts(q.get("reading_text_id") for q in questions)
     
     @staticmethod
-    async def create_attempt(user_id: str, simulator_id: str, question_count: int = 120) -> Dict[str, Any]:
-        """Create a new attempt for a user"""
-        simulator = await db.simulators.find_one({"simulator_id": simulator_id}, {"_id": 0})
-        if not simulator:
-            raise ValueError("Simulator not found")
-        
-        # Check for existing in-progress attempt
-        existing = await db.attempts.find_one({
+    async def get_in_progress_attempt(user_id: str, simulator_id: str) -> Optional[Dict[str, Any]]:
+        """Get the user's in-progress attempt for a simulator, if any"""
+        return await db.attempts.find_one({
             "user_id": user_id,
             "simulator_id": simulator_id,
             "status": "in_progress"
         }, {"_id": 0})
+    
+    @staticmethod
+    async def create_attempt(user_id: str, simulator_id: str, question_count: int = 120) -> Tuple[Dict[str, Any], bool]:
+        """
+        Create a new attempt for a user.
+        
+        Returns:
+            (attempt, created) - created is False when an in-progress attempt
+            for the simulator already existed and was returned instead
+        """
+        simulator = await simulator_catalog.get(simulator_id)
+        if not simulator:
+            raise ValueError("Simulator not found")
         
+        # Check for existing in-progress attempt
+        existing = await AttemptService.get_in_progress_attempt(user_id, simulator_id)
         if existing:
-            return existing
+            return existing, False
         
         # Generate questions
-        area_config = UNAM_EXAM_CONFIG.get(simulator["area"])
-        if not area_config:
-            raise ValueError("Invalid area")
-        
-        subjects_config = area_config["subjects"]
-        proportion = question_count / 120
-        
-        # Calculate target counts with proper rounding (same logic as generate_attempt_questions)
-        ordered_subjects = []
-        total_target = 0
-        
-        for slug in SUBJECT_ORDER:
-            if slug in subjects_config:
-                scaled_count = max(1, round(subjects_config[slug] * proportion))
-                ordered_subjects.append((slug, scaled_count))
-                total_target += scaled_count
-        
-        # Adjust to match exact question_count
-        diff = question_count - total_target
-        
-        if diff != 0:
-            adjustment_indices = list(range(len(ordered_subjects)))
-            if diff > 0:
-                adjustment_indices.sort(
-                    key=lambda i: subjects_config[ordered_subjects[i][0]], 
-                    reverse=True
-                )
-            else:
-                adjustment_indices.sort(
-                    key=lambda i: subjects_config[ordered_subjects[i][0]]
-                )
-            
-            for i in range(abs(diff)):
-                idx = adjustment_indices[i % len(adjustment_indices)]
-                slug, current_count = ordered_subjects[idx]
-                new_count = current_count + (1 if diff > 0 else -1)
-                if new_count >= 1:
-                    ordered_subjects[idx] = (slug, new_count)
-        
-        # Select questions
-        question_ids = []
-        used_ids = set()
-        
-        for subject_slug, count in ordered_subjects:
-            subject = await db.subjects.find_one({"slug": subject_slug}, {"_id": 0})
-            if not subject:
-                continue
-            
-            all_questions = await db.questions.find(
-                {"subject_id": subject["subject_id"]},
-                {"_id": 0, "question_id": 1}
-            ).to_list(1000)
-            
-            available = [q for q in all_questions if q["question_id"] not in used_ids]
-            if not available:
-                continue
-            
-            select_count = min(count, len(available))
-            selected = random.sample(available, select_count)
-            
-            for q in selected:
-                used_ids.add(q["question_id"])
-                question_ids.append(q["question_id"])
-        
-        # Fill if needed
-        if len(question_ids) < question_count:
-            for subject_slug, _ in ordered_subjects:
-                if len(question_ids) >= question_count:
-                    break
-                    
-                subject = await db.subjects.find_one({"slug": subject_slug}, {"_id": 0})
-                if not subject:
-                    continue
-                
-                all_questions = await db.questions.find(
-                    {"subject_id": subject["subject_id"]},
-                    {"_id": 0, "question_id": 1}
-                ).to_list(1000)
-                
-                available = [q for q in all_questions if q["question_id"] not in used_ids]
-                needed = question_count - len(question_ids)
-                
-                if available and needed > 0:
-                    extra = random.sample(available, min(needed, len(available)))
-                    for q in extra:
-                        used_ids.add(q["question_id"])
-                        question_ids.append(q["question_id"])
+        question_ids = await AttemptService.select_question_ids(simulator["area"], question_count)
         
         duration_minutes = int(len(question_ids) * 1.5)
         attempt_id = AuthService.generate_id("attempt_")
-        now = datetime.now(timezone.utc).isoformat()
+        now = datetime.now(timezone.utc)
         
         attempt_doc = {
             "attempt_id": attempt_id,
@@ -290,17 +173,13 @@ class AttemptService:
         
         try:
             await db.attempts.insert_one(attempt_doc)
-            return attempt_doc
+            return attempt_doc, True
         except DuplicateKeyError:
             # Race condition: another request created the attempt
             # Return the existing attempt
-            existing = await db.attempts.find_one({
-                "user_id": user_id,
-                "simulator_id": simulator_id,
-                "status": "in_progress"
-            }, {"_id": 0})
+            existing = await AttemptService.get_in_progress_attempt(user_id, simulator_id)
             if existing:
-                return existing
+                return existing, False
             raise
     
     @staticmethod
@@ -0,0 +1,125 @@
+"""
+In-memory catalogs of small reference collections
+"""
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+from utils.database import db
+from utils.config import CATALOG_CHECK_INTERVAL_SECONDS
+
+
+class Catalog:
+    """
+    Full in-memory copy of a small, rarely changing collection, keyed by one field.
+    
+    Each collection has a version counter in `catalog_versions`. Writers call
+    bump_version() after changing the collection; every process compares its
+    loaded version with the stored one at most every check_interval seconds
+    and reloads when it changed. Lookups never hit MongoDB otherwise.
+    Returned documents are shared and must not be mutated.
+    """
+    
+    def __init__(self, collection: str, key: str, check_interval: float = CATALOG_CHECK_INTERVAL_SECONDS):
+        self._collection = collection
+        self._key = key
+        self._check_interval = check_interval
+        self._docs: List[Dict] = []
+        self._by_key: Dict[str, Dict] = {}
+        self._version: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def version(self) -> Optional[int]:
+        """Version of the loaded data (None until loaded)"""
+        return self._version
+    
+    async def _stored_version(self) -> int:
+        doc = await db.catalog_versions.find_one({"_id": self._collection})
+        return doc["version"] if doc else 0
+    
+    def _index(self, docs: List[Dict]):
+        """Build lookup tables; subclasses add their own indexes"""
+        self._docs = docs
+        self._by_key = {d[self._key]: d for d in docs}
+    
+    async def refresh(self):
+        """Reload the whole collection"""
+        version = await self._stored_version()
+        docs = await db[self._collection].find({}, {"_id": 0}).to_list(None)
+        self._index(docs)
+        self._version = version
+        self._checked_at = time.monotonic()
+    
+    async def _ensure_fresh(self):
+        if self._version is not None and time.monotonic() - self._checked_at < self._check_interval:
+            return
+        
+        if self._version is not None and self._lock.locked():
+            # A check is already running; serve the loaded data meanwhile
+            return
+        
+        async with self._lock:
+            if self._version is None:
+                await self.refresh()
+            elif time.monotonic() - self._checked_at >= self._check_interval:
+                if await self._stored_version() != self._version:
+                    await self.refresh()
+                else:
+                    self._checked_at = time.monotonic()
+    
+    async def bump_version(self):
+        """Record a change to the collection and reload this process's copy"""
+        await db.catalog_versions.update_one(
+            {"_id": self._collection},
+            {"$inc": {"version": 1}},
+            upsert=True
+        )
+        await self.refresh()
+    
+    async def get(self, key: str) -> Optional[Dict]:
+        """Get one document by key"""
+        await self._ensure_fresh()
+        return self._by_key.get(key)
+    
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Get documents for several keys, skipping unknown ones"""
+        await self._ensure_fresh()
+        return {k: self._by_key[k] for k in keys if k in self._by_key}
+    
+    async def all(self) -> List[Dict]:
+        """Get all documents in collection order"""
+        await self._ensure_fresh()
+        return self._docs
+
+
+class SubjectCatalog(Catalog):
+    """Subjects indexed by subject_id and by slug"""
+    
+    def __init__(self):
+        super().__init__("subjects", "subject_id")
+        self._by_slug: Dict[str, Dict] = {}
+    
+    def _index(self, docs: List[Dict]):
+        super()._index(docs)
+        self._by_slug = {d["slug"]: d for d in docs if d.get("slug")}
+    
+    async def get_by_slug(self, slug: str) -> Optional[Dict]:
+        """Get one subject by slug"""
+        await self._ensure_fresh()
+        return self._by_slug.get(slug)
+    
+    async def get_many_by_slug(self, slugs: Iterable[str]) -> Dict[str, Dict]:
+        """Get subjects for several slugs, skipping unknown ones"""
+        await self._ensure_fresh()
+        return {s: self._by_slug[s] for s in slugs if s in self._by_slug}
+    
+    async def get_names(self, subject_ids: Iterable[str]) -> Dict[str, str]:
+        """Get subject names keyed by subject_id"""
+        subjects = await self.get_many(subject_ids)
+        return {sid: s["name"] for sid, s in subjects.items()}
+
+
+# Global catalog instances
+simulator_catalog = Catalog("simulators", "simulator_id")
+subject_catalog = SubjectCatalog()
@@ -0,0 +1,279 @@
+"""
+Free-plan entitlements: cached premium status and per-user usage counters
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from pymongo.errors import DuplicateKeyError
+from utils.database import db
+from utils.user_cache import user_cache
+from utils.datetimes import to_datetime, utc_day
+from utils.config import (
+    FREE_SIMULATORS_PER_AREA,
+    FREE_PRACTICE_QUESTIONS_PER_DAY,
+    FREE_PRACTICE_ATTEMPTS_PER_DAY,
+    FREE_TOTAL_SIMULATORS_LIMIT,
+    PREMIUM_CACHE_FREE_TTL_SECONDS
+)
+from services.subscription_service import SubscriptionService
+
+# Bump when the entitlements layout changes; older documents are rebuilt on read
+ENTITLEMENTS_VERSION = 3
+
+# Attempt statuses that hold a simulator from the free quota
+SIMULATOR_QUOTA_STATUSES = ("completed", "in_progress")
+
+PRACTICE_SESSIONS_LIMIT_REASON = (
+    f"Has alcanzado el límite de {FREE_PRACTICE_ATTEMPTS_PER_DAY} prácticas por día. "
+    "Suscríbete para práctica ilimitada."
+)
+
+PREMIUM_ACCESS = {
+    "can_access": True,
+    "is_premium": True,
+    "max_questions": 30,
+    "limit_reason": None
+}
+
+
+def _below(field: str, limit: int) -> Dict:
+    """Filter for a counter under limit (a counter that was never incremented is missing)"""
+    return {"$or": [{field: {"$lt": limit}}, {field: {"$exists": False}}]}
+
+
+class EntitlementService:
+    """
+    Free-tier quotas backed by one `user_entitlements` document per user
+    ({user_id, simulators: {total, by_area: {area: n}}}) and one
+    `practice_usage` document per user and day ({user_id, day, sessions, questions}).
+    
+    Quota is reserved before an attempt or practice is created, with a single
+    conditional update that only matches while the counter is under its limit, so
+    concurrent requests cannot overshoot. Simulator counters include in-progress
+    attempts: a reservation is kept when the attempt completes and released if it
+    is abandoned without answers or was never created. The entitlements document
+    is rebuilt from attempts when missing.
+    Premium status comes from the user cache, kept until the subscription expires.
+    """
+    
+    @staticmethod
+    async def get_premium(user_id: str) -> Dict:
+        """Get the user's subscription status (SubscriptionService.get_user_subscription), cached"""
+        status = await user_cache.get_premium(user_id)
+        if status is not None:
+            return status
+        
+        status = await SubscriptionService.get_user_subscription(user_id)
+        ttl = PREMIUM_CACHE_FREE_TTL_SECONDS
+        if status["is_premium"] and not status.get("grace_period"):
+            expires_at = to_datetime(status["expires_at"])
+            ttl = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        await user_cache.set_premium(user_id, status, ttl)
+        return status
+    
+    @staticmethod
+    async def invalidate_premium(user_id: str):
+        """Forget the cached premium status after subscriptions change"""
+        await user_cache.invalidate_premium(user_id)
+    
+    @staticmethod
+    async def rebuild_entitlements(user_id: str) -> Dict:
+        """
+        Build a user's simulator counters from their completed and in-progress attempts.
+        Only a missing or older-version document is written: a current one may already
+        hold reservations made since, so it is returned as is.
+        """
+        by_area = await SubscriptionService.get_user_simulator_usage(user_id, SIMULATOR_QUOTA_STATUSES)
+        total = await SubscriptionService.get_total_simulator_usage(user_id, SIMULATOR_QUOTA_STATUSES)
+        
+        entitlements = {
+            "user_id": user_id,
+            "version": ENTITLEMENTS_VERSION,
+            "simulators": {"total": total, "by_area": by_area},
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            await db.user_entitlements.update_one(
+                {"user_id": user_id, "version": {"$ne": ENTITLEMENTS_VERSION}},
+                {"$set": entitlements},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent request built it first; keep its counters
+            pass
+        return await db.user_entitlements.find_one({"user_id": user_id}, {"_id": 0})
+    
+    @staticmethod
+    async def get_entitlements(user_id: str) -> Dict:
+        """Get a user's counters, building them on first access"""
+        entitlements = await db.user_entitlements.find_one({"user_id": user_id}, {"_id": 0})
+        if not entitlements or entitlements.get("version") != ENTITLEMENTS_VERSION:
+            entitlements = await EntitlementService.rebuild_entitlements(user_id)
+        return entitlements
+    
+    @staticmethod
+    async def reserve_simulator(user: dict, area: str) -> bool:
+        """
+        Take one simulator of `area` from the user's quota.
+        For free users this is one findOneAndUpdate guarded by $lt on the per-area
+        and total counters; False means a limit is reached. Admin and premium
+        attempts are counted too (no guard) so the counters stay exact.
+        """
+        user_id = user["user_id"]
+        unlimited = user.get("role") == "admin" or (await EntitlementService.get_premium(user_id))["is_premium"]
+        
+        query: Dict[str, Any] = {"user_id": user_id, "version": ENTITLEMENTS_VERSION}
+        if not unlimited:
+            query["$and"] = [
+                _below("simulators.total", FREE_TOTAL_SIMULATORS_LIMIT),
+                _below(f"simulators.by_area.{area}", FREE_SIMULATORS_PER_AREA)
+            ]
+        update = {
+            "$inc": {"simulators.total": 1, f"simulators.by_area.{area}": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+        
+        if await db.user_entitlements.find_one_and_update(query, update, projection={"_id": 1}):
+            return True
+        # No match: either the limit is reached or the counters do not exist yet
+        if await db.user_entitlements.count_documents({"user_id": user_id, "version": ENTITLEMENTS_VERSION}, limit=1):
+            return False
+        await EntitlementService.rebuild_entitlements(user_id)
+        return bool(await db.user_entitlements.find_one_and_update(query, update, projection={"_id": 1}))
+    
+    @staticmethod
+    async def release_simulator(user_id: str, area: str):
+        """Give back a simulator reserved for an attempt that was not created or was abandoned unanswered"""
+        await db.user_entitlements.update_one(
+            {"user_id": user_id, "version": ENTITLEMENTS_VERSION, "simulators.total": {"$gt": 0}},
+            {
+                "$inc": {"simulators.total": -1, f"simulators.by_area.{area}": -1},
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+            }
+        )
+    
+    @staticmethod
+    async def reserve_practice_session(user: dict, is_premium: bool) -> Optional[str]:
+        """
+        Take one of today's practice sessions from the user's quota.
+        One guarded upsert on the day's practice_usage document. Returns the UTC day
+        the session was taken from (pass it to release_practice_session), or None if
+        the daily limit is reached. Premium and admin sessions are counted without a limit.
+        """
+        unlimited = is_premium or user.get("role") == "admin"
+        day = utc_day()
+        reserved = await SubscriptionService.record_practice_usage(
+            user["user_id"], day, sessions=1,
+            max_sessions=None if unlimited else FREE_PRACTICE_ATTEMPTS_PER_DAY
+        )
+        return day if reserved else None
+    
+    @staticmethod
+    async def release_practice_session(user_id: str, day: str):
+        """Give back a practice session reserved on `day` for a practice that was not created"""
+        await SubscriptionService.release_practice_session(user_id, day)
+    
+    @staticmethod
+    async def record_practice_answers(user_id: str, questions: int, started_at: Any = None):
+        """Count questions answered in a submitted practice session, on the day it started"""
+        if questions > 0:
+            await SubscriptionService.record_practice_usage(user_id, utc_day(started_at), questions=questions)
+    
+    @staticmethod
+    async def check_subject_access(user: dict, subject_id: str) -> bool:
+        """
+        Check if user can access a specific subject for practice
+        All subjects are available for practice, limits are on question count
+        (enforced via check_practice_access)
+        """
+        return True
+    
+    @staticmethod
+    async def check_practice_access(user: dict, requested_questions: int = 10) -> Dict[str, Any]:
+        """
+        Check if user can access practice mode
+        Returns dict with can_access (bool) and limit info.
+        The daily session limit is enforced atomically by reserve_practice_session;
+        this read gives the question allowance and an early answer.
+        """
+        # Admin users always have access
+        if user.get("role") == "admin":
+            return dict(PREMIUM_ACCESS)
+        
+        subscription = await EntitlementService.get_premium(user["user_id"])
+        if subscription["is_premium"]:
+            return dict(PREMIUM_ACCESS)
+        
+        # Check free user limits
+        usage = await SubscriptionService.get_practice_usage_today(user["user_id"])
+        
+        # Check daily practice attempts limit
+        if usage["practice_count"] >= FREE_PRACTICE_ATTEMPTS_PER_DAY:
+            return {
+                "can_access": False,
+                "is_premium": False,
+                "max_questions": 0,
+                "limit_reason": PRACTICE_SESSIONS_LIMIT_REASON
+            }
+        
+        # Check daily questions limit
+        questions_remaining = FREE_PRACTICE_QUESTIONS_PER_DAY - usage["total_questions"]
+        if questions_remaining <= 0:
+            return {
+                "can_access": False,
+                "is_premium": False,
+                "max_questions": 0,
+                "limit_reason": f"Has alcanzado el límite de {FREE_PRACTICE_QUESTIONS_PER_DAY} preguntas de práctica por día. Suscríbete para práctica ilimitada."
+            }
+        
+        # Allow but limit questions
+        allowed_questions = min(requested_questions, questions_remaining)
+        
+        return {
+            "can_access": True,
+            "is_premium": False,
+            "max_questions": allowed_questions,
+            "questions_remaining": questions_remaining,
+            "limit_reason": None
+        }
+    
+    @staticmethod
+    async def get_remaining_limits(user_id: str) -> Dict[str, Any]:
+        """Get remaining limits for a free user"""
+        subscription = await EntitlementService.get_premium(user_id)
+        
+        if subscription["is_premium"]:
+            return {
+                "is_premium": True,
+                "simulators": {"used": 0, "limit": "unlimited", "remaining": "unlimited"},
+                "practice": {"used_today": 0, "limit": "unlimited", "remaining": "unlimited"}
+            }
+        
+        entitlements = await EntitlementService.get_entitlements(user_id)
+        area_usage = entitlements["simulators"]["by_area"]
+        total_simulators = sum(area_usage.values())
+        practice_usage = await SubscriptionService.get_practice_usage_today(user_id)
+        
+        return {
+            "is_premium": False,
+            "simulators": {
+                "per_area": {
+                    "used_by_area": area_usage,
+                    "limit_per_area": FREE_SIMULATORS_PER_AREA,
+                    "total_used": total_simulators,
+                    "total_limit": FREE_TOTAL_SIMULATORS_LIMIT
+                },
+                "remaining_per_area": {
+                    area: max(0, FREE_SIMULATORS_PER_AREA - count)
+                    for area, count in area_usage.items()
+                },
+                "total_remaining": max(0, FREE_TOTAL_SIMULATORS_LIMIT - total_simulators)
+            },
+            "practice": {
+                "attempts_today": practice_usage["practice_count"],
+                "attempts_limit": FREE_PRACTICE_ATTEMPTS_PER_DAY,
+                "attempts_remaining": max(0, FREE_PRACTICE_ATTEMPTS_PER_DAY - practice_usage["practice_count"]),
+                "questions_today": practice_usage["total_questions"],
+                "questions_limit": FREE_PRACTICE_QUESTIONS_PER_DAY,
+                "questions_remaining": max(0, FREE_PRACTICE_QUESTIONS_PER_DAY - practice_usage["total_questions"])
+            }
+        }
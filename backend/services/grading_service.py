@@ -0,0 +1,100 @@
+"""
+Grading service for attempts and practice sessions
+"""
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from services.question_service import QuestionService
+
+# Fields stored per answer on a submitted attempt
+SUBMIT_ANSWER_FIELDS = (
+    "question_id", "selected_option", "correct_answer", "is_correct",
+    "subject_name", "explanation", "question_text", "options"
+)
+
+# Fields stored per answer when an attempt is abandoned
+ABANDON_ANSWER_FIELDS = ("question_id", "selected_option", "is_correct", "correct_answer")
+
+# Fields returned per answer for practice sessions
+PRACTICE_ANSWER_FIELDS = (
+    "question_id", "question_text", "topic", "subject_name", "options",
+    "selected_option", "correct_answer", "is_correct", "explanation",
+    "image_url", "option_images"
+)
+
+
+class GradingService:
+    """Service for scoring answers against the answer key"""
+    
+    @staticmethod
+    async def load_answer_key(question_ids: Iterable[str]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+        """Bulk-load questions and subject names for grading"""
+        answer_key = await QuestionService.get_questions_by_ids(question_ids)
+        subject_names = await QuestionService.get_subject_names(q["subject_id"] for q in answer_key.values())
+        return answer_key, subject_names
+    
+    @staticmethod
+    async def grade_answers(
+        answers: List[Dict],
+        question_ids: Optional[List[str]] = None,
+        answer_fields: Tuple[str, ...] = SUBMIT_ANSWER_FIELDS
+    ) -> Dict[str, Any]:
+        """
+        Grade answers in a single pass.
+        
+        Args:
+            answers: List of dicts with question_id and selected_option
+            question_ids: Questions that belong to the exam. When given, only
+                these are loaded and answers to other questions are ignored.
+            answer_fields: Fields to keep in each graded answer
+        
+        Returns:
+            dict with 'score', 'subject_scores' and 'answers'
+        """
+        if question_ids is None:
+            question_ids = [a.get("question_id") for a in answers]
+        answer_key, subject_names = await GradingService.load_answer_key(question_ids)
+        
+        total_score = 0
+        subject_scores = {}
+        answers_data = []
+        
+        for answer in answers:
+            question = answer_key.get(answer.get("question_id"))
+            if not question:
+                continue
+            
+            # Handle case where selected_option might be None/invalid
+            selected_option = answer.get("selected_option")
+            if not isinstance(selected_option, int) or selected_option < 0 or selected_option > 3:
+                is_correct = False
+            else:
+                is_correct = question["correct_answer"] == selected_option
+            if is_correct:
+                total_score += 1
+            
+            subject_name = subject_names.get(question["subject_id"], "Unknown")
+            if subject_name not in subject_scores:
+                subject_scores[subject_name] = {"correct": 0, "total": 0}
+            subject_scores[subject_name]["total"] += 1
+            if is_correct:
+                subject_scores[subject_name]["correct"] += 1
+            
+            graded = {
+                "question_id": question["question_id"],
+                "selected_option": selected_option,
+                "correct_answer": question["correct_answer"],
+                "is_correct": is_correct,
+                "subject_name": subject_name,
+                "explanation": question.get("explanation"),
+                "question_text": question["text"],
+                "options": question["options"],
+                "topic": question.get("topic"),
+                "image_url": question.get("image_url"),
+                "option_images": question.get("option_images")
+            }
+            answers_data.append({field: graded[field] for field in answer_fields})
+        
+        return {
+            "score": total_score,
+            "subject_scores": subject_scores,
+            "answers": answers_data
+        }
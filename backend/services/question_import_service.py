@@ -0,0 +1,349 @@
+"""
+Bulk question import pipeline
+"""
+import codecs
+import csv
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from models import QuestionCreate, ReadingTextCreate
+from utils.database import db
+from utils.config import QUESTION_IMPORT_BATCH_SIZE, QUESTION_UPLOAD_MAX_LINE_BYTES
+from services.auth_service import AuthService
+from services.catalog import subject_catalog
+from services.question_service import QuestionService
+from services.subject_counter_service import SubjectCounterService
+
+
+def _validation_message(error: ValidationError) -> str:
+    """Compact one-line message from a pydantic ValidationError"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
+    )
+
+
+CSV_REQUIRED_COLUMNS = [
+    "subject_id", "topic", "text", "option_a", "option_b", "option_c", "option_d",
+    "correct_answer", "explanation"
+]
+
+
+def _longer_than(text: str, max_bytes: int) -> bool:
+    """Whether `text` is more than max_bytes in UTF-8 (1 to 4 bytes per character, so most text skips encoding)"""
+    if len(text) > max_bytes:
+        return True
+    if len(text) * 4 <= max_bytes:
+        return False
+    return len(text.encode("utf-8")) > max_bytes
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = QUESTION_UPLOAD_MAX_LINE_BYTES) -> AsyncIterator[str]:
+    """
+    Split a byte stream into text lines without buffering more than one line.
+    Raises ValueError if a line is longer than max_line_bytes (UTF-8 encoded).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if _longer_than(line, max_line_bytes):
+                raise ValueError(f"Line longer than {max_line_bytes} bytes")
+            yield line.rstrip("\r")
+        if _longer_than(buffer, max_line_bytes):
+            raise ValueError(f"Line longer than {max_line_bytes} bytes")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Optional[Dict], Optional[str]]]:
+    """Yield (row, error) for each non-blank NDJSON line"""
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield None, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield None, "Each line must be a JSON object"
+            continue
+        yield row, None
+
+
+def _csv_row_to_question(row: Dict[str, str]) -> Dict[str, Any]:
+    """Map a CSV record (same columns as the admin CSV template) to QuestionCreate fields"""
+    return {
+        "subject_id": row["subject_id"],
+        "topic": row["topic"],
+        "text": row["text"],
+        "options": [row["option_a"], row["option_b"], row["option_c"], row["option_d"]],
+        "correct_answer": row["correct_answer"],
+        "explanation": row["explanation"],
+        "image_url": row.get("image_url") or None,
+        "reading_text_id": row.get("reading_text_id") or None
+    }
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes], max_line_bytes: int = QUESTION_UPLOAD_MAX_LINE_BYTES) -> AsyncIterator[Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Yield (row, error) for each CSV record after the header.
+    Quoted fields may span lines: physical lines are joined until the quotes balance.
+    Raises ValueError if the header is missing required columns.
+    """
+    headers = None
+    record = ""
+    async for line in iter_lines(chunks, max_line_bytes):
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            if _longer_than(record, max_line_bytes):
+                raise ValueError(f"CSV record longer than {max_line_bytes} bytes")
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        
+        values = next(csv.reader([text]))
+        if headers is None:
+            headers = [h.strip().lower() for h in values]
+            missing = [c for c in CSV_REQUIRED_COLUMNS if c not in headers]
+            if missing:
+                raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+            continue
+        if len(values) < len(headers):
+            yield None, f"Expected {len(headers)} columns, got {len(values)}"
+            continue
+        yield _csv_row_to_question({h: v.strip() for h, v in zip(headers, values)}), None
+    
+    if record:
+        yield None, "Unterminated quoted field"
+
+
+class QuestionImporter:
+    """
+    Imports question rows in batches.
+    
+    Rows are validated one by one with QuestionCreate, buffered, and written with
+    insert_many(ordered=False) every batch_size rows, so a bad row only fails
+    itself. Subjects are resolved from the subject catalog once per import.
+    With skip_duplicates, rows whose text_hash already exists (in the database
+    or earlier in the same batch) are counted in `duplicates` and not inserted.
+    Subject counters are updated after each written batch, so a failure in a
+    later batch cannot leave earlier ones uncounted.
+    Call finish() at the end to flush and update caches.
+    
+    Usage:
+        importer = await QuestionImporter.create(user_id)
+        for row in rows:
+            await importer.add(row)
+        summary = await importer.finish()
+    """
+    
+    def __init__(self, user_id: str, subject_ids: set, reading_text_map: Optional[Dict[str, str]] = None,
+                 batch_size: int = QUESTION_IMPORT_BATCH_SIZE, skip_duplicates: bool = False):
+        self.user_id = user_id
+        self.subject_ids = subject_ids
+        self.reading_text_map = reading_text_map or {}
+        self.batch_size = batch_size
+        self.skip_duplicates = skip_duplicates
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.error_count = 0
+        self.errors: List[str] = []
+        self._pending: List[Dict] = []
+        self._pending_rows: List[int] = []
+        self._imported_ids: List[str] = []
+    
+    @classmethod
+    async def create(cls, user_id: str, reading_text_map: Optional[Dict[str, str]] = None, **kwargs) -> "QuestionImporter":
+        """Build an importer with the current set of subject ids"""
+        subject_ids = {s["subject_id"] for s in await subject_catalog.all()}
+        return cls(user_id, subject_ids, reading_text_map, **kwargs)
+    
+    def build_document(self, question: QuestionCreate) -> Dict[str, Any]:
+        """Turn a validated row into a question document"""
+        question_doc = {
+            "question_id": AuthService.generate_id("q_"),
+            "subject_id": question.subject_id,
+            "topic": question.topic,
+            "text": question.text,
+            "options": question.options,
+            "correct_answer": question.correct_answer,
+            "explanation": question.explanation,
+            "image_url": question.image_url,
+            "option_images": question.option_images or [None]*4,
+            "text_hash": QuestionService.text_hash(question.subject_id, question.text),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_by": self.user_id
+        }
+        if question.reading_text_id:
+            # Reading texts imported in the same request are referenced by title
+            question_doc["reading_text_id"] = self.reading_text_map.get(question.reading_text_id, question.reading_text_id)
+        return question_doc
+    
+    def validate(self, row: Any) -> Optional[QuestionCreate]:
+        """Validate one row, recording an error and returning None if it is invalid"""
+        self.rows += 1
+        try:
+            question = QuestionCreate.model_validate(row)
+        except ValidationError as e:
+            self._error(self.rows, _validation_message(e))
+            return None
+        if question.subject_id not in self.subject_ids:
+            self._error(self.rows, "Subject not found")
+            return None
+        return question
+    
+    def reject(self, message: str):
+        """Count a row that could not even be parsed"""
+        self.rows += 1
+        self._error(self.rows, message)
+    
+    def _error(self, row: int, message: str):
+        self.error_count += 1
+        self.errors.append(f"Question {row}: {message}")
+    
+    def drain_errors(self) -> List[str]:
+        """Return and forget the errors collected so far (keeps long uploads bounded)"""
+        errors, self.errors = self.errors, []
+        return errors
+    
+    async def add(self, row: Any) -> Optional[Dict]:
+        """Validate and buffer one row; writes a batch when the buffer is full"""
+        question = self.validate(row)
+        if question is None:
+            return None
+        return await self.add_document(self.build_document(question))
+    
+    async def add_document(self, question_doc: Dict) -> Dict:
+        """Buffer an already built question document"""
+        self._pending.append(question_doc)
+        self._pending_rows.append(self.rows)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        return question_doc
+    
+    async def flush(self):
+        """Write buffered questions with one insert_many"""
+        if not self._pending:
+            return
+        docs, rows = self._pending, self._pending_rows
+        self._pending, self._pending_rows = [], []
+        self.batches += 1
+        
+        if self.skip_duplicates:
+            seen = await QuestionService.find_existing_hashes(doc["text_hash"] for doc in docs)
+            unique_docs, unique_rows = [], []
+            for doc, row in zip(docs, rows):
+                if doc["text_hash"] in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(doc["text_hash"])
+                unique_docs.append(doc)
+                unique_rows.append(row)
+            docs, rows = unique_docs, unique_rows
+            if not docs:
+                return
+        
+        failed = set()
+        try:
+            await db.questions.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                self._error(rows[write_error["index"]], write_error.get("errmsg", "write failed"))
+        
+        counter_changes = []
+        for index, doc in enumerate(docs):
+            if index in failed:
+                continue
+            self.imported += 1
+            self._imported_ids.append(doc["question_id"])
+            counter_changes.append((doc["subject_id"], doc["topic"], 1))
+        await SubjectCounterService.apply_changes(counter_changes)
+    
+    async def finish(self) -> Dict[str, Any]:
+        """Flush, update caches, and summarise the import"""
+        await self.flush()
+        if self._imported_ids:
+            await QuestionService.invalidate_questions(self._imported_ids)
+        return {
+            "imported_questions": self.imported,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "total_questions": self.rows
+        }
+
+
+class QuestionImportService:
+    """Service for importing question banks"""
+    
+    @staticmethod
+    async def import_reading_texts(rows: Iterable[Any], user_id: str) -> Dict[str, Any]:
+        """
+        Validate and insert reading texts with one insert_many.
+        
+        Returns:
+            dict with 'imported', 'errors', 'total' and 'title_map' ({title: reading_text_id})
+        """
+        docs = []
+        errors = []
+        total = 0
+        for i, row in enumerate(rows):
+            total += 1
+            try:
+                rt = ReadingTextCreate.model_validate(row)
+            except ValidationError as e:
+                errors.append(f"Reading text {i+1}: {_validation_message(e)}")
+                continue
+            docs.append({
+                "reading_text_id": AuthService.generate_id("rt_"),
+                "title": rt.title,
+                "content": rt.content,
+                "subject_id": rt.subject_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_by": user_id
+            })
+        
+        failed = set()
+        if docs:
+            try:
+                await db.reading_texts.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    failed.add(write_error["index"])
+                    errors.append(f"Reading text {docs[write_error['index']]['title']}: {write_error.get('errmsg', 'write failed')}")
+        
+        inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+        return {
+            "imported": len(inserted),
+            "errors": errors,
+            "total": total,
+            "title_map": {doc["title"]: doc["reading_text_id"] for doc in inserted}
+        }
+    
+    @staticmethod
+    async def import_bank(questions: Iterable[Any], reading_texts: Optional[Iterable[Any]], user_id: str) -> Dict[str, Any]:
+        """Import reading texts, then questions (which may reference texts by title)"""
+        texts = await QuestionImportService.import_reading_texts(reading_texts or [], user_id)
+        
+        importer = await QuestionImporter.create(user_id, texts["title_map"])
+        for row in questions:
+            await importer.add(row)
+        summary = await importer.finish()
+        
+        return {
+            "imported_questions": summary["imported_questions"],
+            "imported_reading_texts": texts["imported"],
+            "errors": texts["errors"] + summary["errors"],
+            "total_questions": summary["total_questions"],
+            "total_reading_texts": texts["total"]
+        }
@@ -0,0 +1,80 @@
+"""
+Per-subject question id pools for random exam generation
+"""
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Set
+from utils.database import db
+from utils.config import QUESTION_POOL_TTL_SECONDS
+
+
+class QuestionPool:
+    """
+    Compact in-memory index of question ids grouped by subject_id.
+    Lets exams be sampled without loading whole question documents.
+    Marked stale on admin writes and rebuilt lazily on next use.
+    """
+    
+    def __init__(self, ttl: float = QUESTION_POOL_TTL_SECONDS):
+        self._ttl = ttl
+        self._pools: Dict[str, List[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    def invalidate(self):
+        """Mark pools stale so the next sample reloads them"""
+        self._loaded_at = None
+    
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl
+    
+    async def refresh(self):
+        """Rebuild all pools from a single projected scan of the questions collection"""
+        pools: Dict[str, List[str]] = {}
+        cursor = db.questions.find({}, {"_id": 0, "question_id": 1, "subject_id": 1})
+        async for q in cursor:
+            pools.setdefault(q["subject_id"], []).append(q["question_id"])
+        self._pools = pools
+        self._loaded_at = time.monotonic()
+    
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            if not self._is_fresh():
+                await self.refresh()
+    
+    async def get_pool(self, subject_id: str) -> List[str]:
+        """Get all question ids for a subject"""
+        await self._ensure_loaded()
+        return self._pools.get(subject_id, [])
+    
+    async def sample(self, subject_id: str, k: int, exclude: Optional[Set[str]] = None) -> List[str]:
+        """
+        Draw up to k question ids for a subject without replacement.
+        
+        Args:
+            subject_id: Subject to draw from
+            k: Number of ids wanted
+            exclude: Ids that must not be returned (e.g. already selected)
+        
+        Returns:
+            List of at most k ids, fewer if the pool runs out
+        """
+        pool = await self.get_pool(subject_id)
+        if k <= 0 or not pool:
+            return []
+        
+        if not exclude:
+            return random.sample(pool, min(k, len(pool)))
+        
+        # Oversample by the number of excluded ids, then drop them.
+        # Still O(k + len(exclude)) and uniform over the remaining ids.
+        drawn = random.sample(pool, min(len(pool), k + len(exclude)))
+        return [qid for qid in drawn if qid not in exclude][:k]
+
+
+# Global question pool instance
+question_pool = QuestionPool()
@@ -0,0 +1,179 @@
+"""
+Question hydration service
+"""
+import hashlib
+import time
+from typing import List, Dict, Iterable, Optional, Set
+from pymongo import UpdateOne, ReturnDocument
+from utils.database import db
+from utils.cache import TTLCache
+from utils.config import (
+    QUESTION_CACHE_MAX_ENTRIES,
+    QUESTION_CACHE_TTL_SECONDS,
+    QUESTION_CACHE_CHECK_INTERVAL_SECONDS
+)
+from services.question_pool import question_pool
+from services.catalog import subject_catalog
+
+# Question documents keyed by question_id. Admin writes must invalidate it.
+question_cache = TTLCache(QUESTION_CACHE_MAX_ENTRIES, QUESTION_CACHE_TTL_SECONDS)
+
+# Version of the questions collection in `catalog_versions` that this process's
+# cache reflects, and when it was last compared with the stored one
+_cache_version = {"version": None, "checked_at": None}
+
+
+class QuestionService:
+    """Service for batched question, subject and reading text lookups"""
+    
+    @staticmethod
+    async def get_questions_by_ids(question_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Fetch questions keyed by question_id.
+        Served from the question cache; misses are loaded with a single $in query.
+        Returned documents are shared with the cache and must not be mutated.
+        """
+        ids = list(dict.fromkeys(qid for qid in question_ids if qid))
+        if not ids:
+            return {}
+        
+        await QuestionService.sync_question_cache()
+        found, missing = question_cache.get_many(ids)
+        if missing:
+            questions = await db.questions.find(
+                {"question_id": {"$in": missing}},
+                {"_id": 0}
+            ).to_list(len(missing))
+            for q in questions:
+                question_cache.set(q["question_id"], q)
+                found[q["question_id"]] = q
+        return found
+    
+    @staticmethod
+    async def sync_question_cache():
+        """
+        Drop this process's cached questions and pools when another process
+        changed questions. Compares versions at most every
+        QUESTION_CACHE_CHECK_INTERVAL_SECONDS.
+        """
+        now = time.monotonic()
+        checked_at = _cache_version["checked_at"]
+        if checked_at is not None and now - checked_at < QUESTION_CACHE_CHECK_INTERVAL_SECONDS:
+            return
+        
+        doc = await db.catalog_versions.find_one({"_id": "questions"})
+        version = doc["version"] if doc else 0
+        if version != _cache_version["version"]:
+            question_cache.clear()
+            question_pool.invalidate()
+        _cache_version["version"] = version
+        _cache_version["checked_at"] = now
+    
+    @staticmethod
+    async def invalidate_questions(question_ids: Optional[Iterable[str]] = None):
+        """
+        Drop cached questions after admin edits (all of them if no ids are given).
+        Also marks the per-subject question pools stale, and bumps the questions
+        version so other processes drop their copies too.
+        """
+        question_pool.invalidate()
+        if question_ids is None:
+            question_cache.clear()
+        else:
+            for qid in question_ids:
+                question_cache.invalidate(qid)
+        
+        doc = await db.catalog_versions.find_one_and_update(
+            {"_id": "questions"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # Skip the next check only if no other process changed questions meanwhile
+        if _cache_version["version"] == doc["version"] - 1:
+            _cache_version["version"] = doc["version"]
+    
+    @staticmethod
+    def text_hash(subject_id: str, text: str) -> str:
+        """
+        Hash of a question's subject and text, stored as `text_hash`.
+        Case and whitespace are normalized so re-uploads of the same question match.
+        """
+        normalized = " ".join((text or "").split()).casefold()
+        return hashlib.sha256(f"{subject_id}\n{normalized}".encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    async def find_existing_hashes(hashes: Iterable[str]) -> Set[str]:
+        """Return which of the given text hashes already belong to stored questions"""
+        hashes = list(set(hashes))
+        if not hashes:
+            return set()
+        docs = await db.questions.find(
+            {"text_hash": {"$in": hashes}},
+            {"_id": 0, "text_hash": 1}
+        ).to_list(None)
+        return {d["text_hash"] for d in docs}
+    
+    @staticmethod
+    async def backfill_text_hashes(batch_size: int = 1000) -> int:
+        """Set `text_hash` on questions written before it existed. Returns how many were updated."""
+        updated = 0
+        while True:
+            questions = await db.questions.find(
+                {"text_hash": {"$exists": False}},
+                {"_id": 0, "question_id": 1, "subject_id": 1, "text": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not questions:
+                return updated
+            await db.questions.bulk_write([
+                UpdateOne(
+                    {"question_id": q["question_id"]},
+                    {"$set": {"text_hash": QuestionService.text_hash(q.get("subject_id"), q.get("text"))}}
+                )
+                for q in questions
+            ], ordered=False)
+            updated += len(questions)
+    
+    @staticmethod
+    async def get_subject_names(subject_ids: Iterable[str]) -> Dict[str, str]:
+        """Get subject names from the subject catalog, keyed by subject_id"""
+        return await subject_catalog.get_names(subject_ids)
+    
+    @staticmethod
+    async def get_reading_texts(reading_text_ids: Iterable[str]) -> Dict[str, str]:
+        """Fetch reading text contents with a single $in query, keyed by reading_text_id"""
+        ids = list(set(rid for rid in reading_text_ids if rid))
+        if not ids:
+            return {}
+        
+        texts = await db.reading_texts.find(
+            {"reading_text_id": {"$in": ids}},
+            {"_id": 0, "reading_text_id": 1, "content": 1}
+        ).to_list(len(ids))
+        return {rt["reading_text_id"]: rt["content"] for rt in texts}
+    
+    @staticmethod
+    async def hydrate_questions(question_ids: List[str]) -> List[Dict]:
+        """
+        Load questions for an exam in question_ids order.
+        Issues one query each for questions, subjects and reading texts,
+        regardless of how many questions the exam has.
+        Correct answers and explanations are not included.
+        """
+        questions_by_id = await QuestionService.get_questions_by_ids(question_ids)
+        questions = [questions_by_id[qid] for qid in question_ids if qid in questions_by_id]
+        
+        subject_names = await QuestionService.get_subject_names(q["subject_id"] for q in questions)
+        reading_texts = await QuestionService.get_reading_texts(q.get("reading_text_id") for q in questions)
+        
+        return [{
+            "question_id": q["question_id"],
+            "subject_id": q["subject_id"],
+            "subject_name": subject_names.get(q["subject_id"], "Unknown"),
+            "topic": q["topic"],
+            "text": q["text"],
+            "options": q["options"],
+            "image_url": q.get("image_url"),
+            "option_images": q.get("option_images"),
+            "reading_text": reading_texts.get(q["reading_text_id"]) if q.get("reading_text_id") else None
+        } for q in questions]
@@ -0,0 +1,103 @@
+"""
+Admin dashboard statistics
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict
+from utils.database import db
+from utils.datetimes import date_query, to_iso
+from utils.cache import Snapshot
+from utils.config import ADMIN_STATS_TTL_SECONDS, ADMIN_STATS_MAX_STALE_SECONDS
+from services.catalog import simulator_catalog, subject_catalog
+from services.subject_counter_service import SubjectCounterService
+
+
+class StatsService:
+    """
+    Builds admin dashboard statistics with concurrent queries.
+    Whole-collection totals use estimated_document_count (collection metadata,
+    no scan); filtered counts stay exact. Results are cached as snapshots.
+    """
+    
+    @staticmethod
+    async def compute_stats() -> Dict:
+        """Run the dashboard queries concurrently"""
+        now = datetime.now(timezone.utc)
+        (
+            total_users,
+            total_questions,
+            total_attempts,
+            completed_attempts,
+            pending_reports,
+            premium_users,
+            recent_attempts
+        ) = await asyncio.gather(
+            db.users.estimated_document_count(),
+            db.questions.estimated_document_count(),
+            db.attempts.estimated_document_count(),
+            db.attempts.count_documents({"status": "completed"}),
+            db.question_reports.count_documents({"status": "pending"}),
+            # Count premium users with active subscriptions
+            db.subscriptions.count_documents({"status": "active", **date_query("expires_at", "$gt", now)}),
+            db.attempts.find(
+                {"status": "completed"},
+                {"_id": 0, "attempt_id": 1, "user_id": 1, "score": 1, "started_at": 1}
+            ).sort("started_at", -1).limit(5).to_list(5)
+        )
+        
+        return {
+            "total_users": total_users,
+            "premium_users": premium_users,
+            "total_questions": total_questions,
+            "total_attempts": total_attempts,
+            "completed_attempts": completed_attempts,
+            "pending_reports": pending_reports,
+            "recent_attempts": [{**a, "started_at": to_iso(a.get("started_at"))} for a in recent_attempts],
+            "generated_at": now.isoformat()
+        }
+    
+    @staticmethod
+    async def count_users() -> Dict:
+        """Exact user totals by role and premium status for the admin users screen"""
+        now = datetime.now(timezone.utc)
+        total, admins, students, premium = await asyncio.gather(
+            db.users.count_documents({}),
+            db.users.count_documents({"role": "admin"}),
+            db.users.count_documents({"role": "student"}),
+            db.subscriptions.count_documents({"status": "active", **date_query("expires_at", "$gt", now)})
+        )
+        return {"total": total, "admins": admins, "students": students, "premium": premium}
+    
+    @staticmethod
+    async def compute_detailed_stats() -> Dict:
+        """Totals plus questions per subject, from counters and catalogs"""
+        total_users, completed_attempts, total_admins, counts = await asyncio.gather(
+            db.users.estimated_document_count(),
+            db.attempts.count_documents({"status": "completed"}),
+            db.users.count_documents({"role": "admin"}),
+            SubjectCounterService.get_counts()
+        )
+        
+        subjects_stats = []
+        for s in await subject_catalog.all():
+            counters = counts.get(s["subject_id"], {})
+            subjects_stats.append({
+                "subject": s["name"],
+                "count": counters.get("question_count", 0),
+                "topics": counters.get("topics", {})
+            })
+        
+        return {
+            "total_users": total_users,
+            "total_questions": sum(c["question_count"] for c in counts.values()),
+            "total_simulators": len(await simulator_catalog.all()),
+            "total_attempts": completed_attempts,
+            "total_admins": total_admins,
+            "questions_per_subject": subjects_stats,
+            "generated_at": datetime.now(timezone.utc).isoformat()
+        }
+
+
+# Cached dashboard snapshots
+admin_stats = Snapshot(StatsService.compute_stats, ADMIN_STATS_TTL_SECONDS, ADMIN_STATS_MAX_STALE_SECONDS)
+admin_stats_detailed = Snapshot(StatsService.compute_detailed_stats, ADMIN_STATS_TTL_SECONDS, ADMIN_STATS_MAX_STALE_SECONDS)
@@ -0,0 +1,150 @@
+"""
+Denormalized per-subject and per-topic question counters
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from pymongo import UpdateOne
+from utils.database import db
+
+
+def topic_key(topic: Optional[str]) -> str:
+    """Field name for a topic's counter (a digest, so distinct topics never share one)"""
+    return hashlib.sha256((topic or "").encode("utf-8")).hexdigest()[:24]
+
+
+class SubjectCounterService:
+    """
+    Maintains one `subject_counters` document per subject:
+    {subject_id, question_count, topics: {<key>: {name, count}}, rev}.
+    Question writes apply deltas and increment `rev`; reconcile() rebuilds the
+    counters from the questions collection and reports the subjects that had drifted.
+    """
+    
+    @staticmethod
+    async def apply_changes(changes: Iterable[Tuple[str, Optional[str], int]]):
+        """
+        Apply question count deltas in one bulk write.
+        
+        Args:
+            changes: (subject_id, topic, delta) tuples, e.g. +1 per inserted question
+        """
+        updates: Dict[str, Dict] = {}
+        for subject_id, topic, delta in changes:
+            if not subject_id or not delta:
+                continue
+            update = updates.setdefault(subject_id, {"$inc": {"question_count": 0, "rev": 1}, "$set": {}})
+            key = topic_key(topic)
+            update["$inc"]["question_count"] += delta
+            update["$inc"][f"topics.{key}.count"] = update["$inc"].get(f"topics.{key}.count", 0) + delta
+            update["$set"][f"topics.{key}.name"] = topic or ""
+        
+        if not updates:
+            return
+        
+        now = datetime.now(timezone.utc).isoformat()
+        await db.subject_counters.bulk_write([
+            UpdateOne(
+                {"subject_id": subject_id},
+                {"$inc": update["$inc"], "$set": {**update["$set"], "updated_at": now}},
+                upsert=True
+            )
+            for subject_id, update in updates.items()
+        ], ordered=False)
+    
+    @staticmethod
+    async def question_added(question: Dict):
+        """Count a newly inserted question"""
+        await SubjectCounterService.apply_changes([(question.get("subject_id"), question.get("topic"), 1)])
+    
+    @staticmethod
+    async def question_removed(question: Dict):
+        """Uncount a deleted question"""
+        await SubjectCounterService.apply_changes([(question.get("subject_id"), question.get("topic"), -1)])
+    
+    @staticmethod
+    async def get_counts() -> Dict[str, Dict]:
+        """
+        Get counters for all subjects.
+        
+        Returns:
+            {subject_id: {"question_count": int, "topics": {topic_name: count}}}
+        """
+        docs = await db.subject_counters.find({}, {"_id": 0}).to_list(None)
+        counts = {}
+        for d in docs:
+            # Entries are summed by name: counters written before topic_key() may
+            # hold a second entry for the same topic until the next reconcile
+            topics: Dict[str, int] = {}
+            for t in d.get("topics", {}).values():
+                topics[t["name"]] = topics.get(t["name"], 0) + t.get("count", 0)
+            counts[d["subject_id"]] = {
+                "question_count": d.get("question_count", 0),
+                "topics": {name: count for name, count in topics.items() if count > 0}
+            }
+        return counts
+    
+    @staticmethod
+    async def reconcile() -> Dict:
+        """
+        Recount questions per subject and topic and overwrite drifted counters.
+        
+        Counters are read before questions are counted and each one is only
+        replaced if its `rev` is unchanged, so deltas applied meanwhile are never
+        lost; a counter that changed is left for the next run.
+        
+        Returns:
+            dict with 'subjects' (number checked), 'corrected' (subject_ids that
+            were off and rewritten) and 'skipped' (off, but changed during the run)
+        """
+        existing = {
+            d["subject_id"]: d
+            for d in await db.subject_counters.find({}, {"_id": 0, "updated_at": 0}).to_list(None)
+        }
+        
+        rows = await db.questions.aggregate([
+            {"$group": {"_id": {"subject_id": "$subject_id", "topic": "$topic"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        
+        expected: Dict[str, Dict] = {}
+        for row in rows:
+            subject_id = row["_id"].get("subject_id")
+            if not subject_id:
+                continue
+            topic = row["_id"].get("topic") or ""
+            doc = expected.setdefault(subject_id, {"subject_id": subject_id, "question_count": 0, "topics": {}})
+            doc["question_count"] += row["count"]
+            entry = doc["topics"].setdefault(topic_key(topic), {"name": topic, "count": 0})
+            entry["count"] += row["count"]
+        
+        def live(doc: Dict) -> Tuple[int, Dict]:
+            topics = {k: (t.get("name"), t.get("count")) for k, t in doc.get("topics", {}).items() if t.get("count")}
+            return doc.get("question_count", 0), topics
+        
+        now = datetime.now(timezone.utc).isoformat()
+        corrected = []
+        skipped = []
+        for subject_id, doc in expected.items():
+            current = existing.get(subject_id)
+            if current is None:
+                # Insert only if no delta created the document meanwhile
+                result = await db.subject_counters.update_one(
+                    {"subject_id": subject_id},
+                    {"$setOnInsert": {**doc, "rev": 1, "updated_at": now}},
+                    upsert=True
+                )
+                (corrected if result.upserted_id is not None else skipped).append(subject_id)
+            elif live(current) != live(doc):
+                rev = current.get("rev")
+                result = await db.subject_counters.replace_one(
+                    {"subject_id": subject_id, "rev": rev},
+                    {**doc, "rev": (rev or 0) + 1, "updated_at": now}
+                )
+                (corrected if result.modified_count else skipped).append(subject_id)
+        for subject_id, doc in existing.items():
+            if subject_id not in expected:
+                result = await db.subject_counters.delete_one({"subject_id": subject_id, "rev": doc.get("rev")})
+                if doc.get("question_count"):
+                    (corrected if result.deleted_count else skipped).append(subject_id)
+        
+        return {"subjects": len(expected), "corrected": corrected, "skipped": skipped}
@@ -0,0 +1,73 @@
+"""
+Unit test setup: services run against an in-memory MongoDB (mongomock-motor)
+No server or database needed; run with `pytest tests/unit`
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ingresounam_test")
+os.environ.setdefault("JWT_SECRET", "unit-test-secret")
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+import utils.database  # noqa: E402
+
+# Swap the client before any service module binds `db`
+utils.database.client = AsyncMongoMockClient()
+utils.database.db = utils.database.client[os.environ["DB_NAME"]]
+
+from utils.database import db, setup_database_indexes  # noqa: E402
+from utils.user_cache import user_cache  # noqa: E402
+from services.catalog import simulator_catalog, subject_catalog  # noqa: E402
+from services.question_pool import question_pool  # noqa: E402
+from services.question_service import question_cache, _cache_version  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+async def clean_db(anyio_backend):
+    """Empty every collection and in-process cache before each test"""
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+    await setup_database_indexes()
+    user_cache._local.clear()
+    user_cache._versions.clear()
+    question_cache.clear()
+    _cache_version.update(version=None, checked_at=None)
+    question_pool.invalidate()
+    for catalog in (simulator_catalog, subject_catalog):
+        catalog._version = None
+    yield
+
+
+@pytest.fixture
+async def simulator(clean_db):
+    """One area_1 simulator with a subject and a handful of questions"""
+    await db.subjects.insert_one({"subject_id": "subj_mat", "slug": "matematicas", "name": "Matemáticas"})
+    await db.questions.insert_many([
+        {
+            "question_id": f"q_mat_{i}",
+            "subject_id": "subj_mat",
+            "topic": "Álgebra",
+            "text": f"Pregunta {i}",
+            "options": ["a", "b", "c", "d"],
+            "correct_answer": i % 4
+        }
+        for i in range(10)
+    ])
+    doc = {"simulator_id": "sim_1", "name": "Simulacro 1", "area": "area_1"}
+    await db.simulators.insert_one(dict(doc))
+    return doc
+
+
+@pytest.fixture
+def student():
+    return {"user_id": "user_student", "email": "alumno@test.com", "name": "Alumno", "role": "student"}
@@ -0,0 +1,106 @@
+"""
+Admin dashboard stats: concurrent queries served from stale-while-revalidate snapshots
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services.stats_service import StatsService
+from utils.cache import Snapshot
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable clock for Snapshot only (the event loop keeps the real one)"""
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache.time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def counting_loader(results=None):
+    calls = []
+    
+    async def load():
+        calls.append(len(calls))
+        await asyncio.sleep(0)
+        result = (results or {}).get(len(calls), len(calls))
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    return load, calls
+
+
+async def test_concurrent_callers_share_one_load(clock):
+    load, calls = counting_loader()
+    snapshot = Snapshot(load, ttl=30, max_stale=300)
+    
+    values = await asyncio.gather(*[snapshot.get() for _ in range(5)])
+    
+    assert values == [1] * 5
+    assert len(calls) == 1
+
+
+async def test_stale_value_served_while_reloading(clock):
+    load, calls = counting_loader()
+    snapshot = Snapshot(load, ttl=30, max_stale=300)
+    await snapshot.get()
+    
+    clock[0] += 10
+    assert await snapshot.get() == 1
+    clock[0] += 30
+    assert await snapshot.get() == 1
+    await asyncio.sleep(0.01)
+    assert await snapshot.get() == 2
+    
+    clock[0] += 300
+    assert await snapshot.get() == 3
+    assert len(calls) == 3
+
+
+async def test_failed_background_reload_keeps_old_value(clock):
+    load, calls = counting_loader({2: RuntimeError("database unavailable")})
+    snapshot = Snapshot(load, ttl=30, max_stale=300)
+    await snapshot.get()
+    
+    clock[0] += 60
+    assert await snapshot.get() == 1
+    await asyncio.sleep(0.01)
+    assert await snapshot.get() == 1
+    assert len(calls) == 2
+
+
+async def test_compute_stats(student):
+    now = datetime.now(timezone.utc)
+    await db.users.insert_many([dict(student), {"user_id": "user_admin", "role": "admin"}])
+    await db.attempts.insert_many([
+        {
+            "attempt_id": f"att_{i}",
+            "user_id": student["user_id"],
+            "simulator_id": f"sim_{i}",
+            "status": "completed" if i < 6 else "in_progress",
+            "score": i,
+            "started_at": now - timedelta(hours=i)
+        }
+        for i in range(8)
+    ])
+    await db.question_reports.insert_many([{"status": "pending"}, {"status": "resolved"}])
+    await db.subscriptions.insert_many([
+        {"user_id": student["user_id"], "status": "active", "expires_at": now + timedelta(days=1)},
+        {"user_id": "user_admin", "status": "active", "expires_at": now - timedelta(days=1)}
+    ])
+    
+    stats = await StatsService.compute_stats()
+    
+    assert stats["total_users"] == 2
+    assert stats["total_attempts"] == 8
+    assert stats["completed_attempts"] == 6
+    assert stats["pending_reports"] == 1
+    assert stats["premium_users"] == 1
+    assert [a["attempt_id"] for a in stats["recent_attempts"]] == [f"att_{i}" for i in range(5)]
+    assert isinstance(stats["recent_attempts"][0]["started_at"], str)
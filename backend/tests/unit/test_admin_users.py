@@ -0,0 +1,63 @@
+"""
+Admin users list: cursor pages cover every user, totals cover all pages
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import Response
+
+from routes.admin import get_all_users, get_users_summary
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"user_id": "user_admin", "role": "admin"}
+
+
+async def seed_users(count: int):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    await db.users.insert_many([
+        {
+            "user_id": f"user_{i:03d}",
+            "email": f"alumno{i}@test.com",
+            "name": f"Alumno {i}",
+            "role": "admin" if i % 10 == 0 else "student",
+            "created_at": (start + timedelta(minutes=i // 2)).isoformat()
+        }
+        for i in range(count)
+    ])
+
+
+async def test_pages_follow_cursor_through_all_users():
+    await seed_users(25)
+    seen = []
+    cursor = None
+    while True:
+        response = Response()
+        page = await get_all_users(response, limit=10, cursor=cursor, role=None, search=None, user=ADMIN)
+        seen.extend(u["user_id"] for u in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+
+
+async def test_search_runs_on_server():
+    await seed_users(25)
+    page = await get_all_users(Response(), limit=100, cursor=None, role=None, search="alumno7@", user=ADMIN)
+    assert [u["user_id"] for u in page] == ["user_007"]
+
+
+async def test_summary_counts_every_user():
+    await seed_users(25)
+    await db.subscriptions.insert_one({
+        "user_id": "user_001",
+        "status": "active",
+        "expires_at": datetime.now(timezone.utc) + timedelta(days=30)
+    })
+    
+    summary = await get_users_summary(user=ADMIN)
+    
+    assert summary == {"total": 25, "admins": 3, "students": 22, "premium": 1}
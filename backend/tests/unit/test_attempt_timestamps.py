@@ -0,0 +1,47 @@
+"""
+Attempt timestamps: stored as BSON dates, returned as ISO strings
+"""
+from datetime import datetime
+
+import pytest
+
+from models import AttemptCreate, AttemptSubmit, SaveProgressRequest
+from routes.attempts import (
+    create_attempt, submit_attempt, abandon_attempt, save_attempt_progress,
+    get_user_attempts, get_attempt_results
+)
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+def answers(question_ids):
+    return [{"question_id": qid, "selected_option": 0} for qid in question_ids]
+
+
+async def start(student) -> dict:
+    created = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+    return await db.attempts.find_one({"attempt_id": created.attempt_id}, {"_id": 0})
+
+
+async def test_submitted_and_abandoned_attempts_use_one_format(simulator, student):
+    submitted = await start(student)
+    await submit_attempt(submitted["attempt_id"], AttemptSubmit(answers=answers(submitted["question_ids"][:3])), user=student)
+    
+    abandoned = await start(student)
+    await save_attempt_progress(
+        abandoned["attempt_id"],
+        SaveProgressRequest(answers=answers(abandoned["question_ids"][:2]), current_question=2, time_remaining=600),
+        user=student
+    )
+    await abandon_attempt(abandoned["attempt_id"], user=student)
+    
+    for attempt_id in (submitted["attempt_id"], abandoned["attempt_id"]):
+        stored = await db.attempts.find_one({"attempt_id": attempt_id})
+        assert isinstance(stored["finished_at"], datetime)
+    
+    listed = {a["attempt_id"]: a["finished_at"] for a in await get_user_attempts(user=student)}
+    results = await get_attempt_results(submitted["attempt_id"], user=student)
+    for value in (*listed.values(), results["finished_at"]):
+        assert isinstance(value, str)
+        assert datetime.fromisoformat(value).utcoffset().total_seconds() == 0
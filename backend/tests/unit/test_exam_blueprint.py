@@ -0,0 +1,32 @@
+"""
+Exam blueprint: per-subject quotas for each area and question count
+"""
+import pytest
+
+from services.attempt_service import AttemptService
+from utils.config import UNAM_EXAM_CONFIG, SUBJECT_ORDER
+
+
+@pytest.mark.parametrize("area", sorted(UNAM_EXAM_CONFIG))
+@pytest.mark.parametrize("question_count", [40, 80, 120])
+def test_quotas_add_up_in_subject_order(area, question_count):
+    blueprint = AttemptService.plan_exam_blueprint(area, question_count)
+    slugs = [slug for slug, _ in blueprint]
+    
+    assert sum(count for _, count in blueprint) == question_count
+    assert all(count >= 1 for _, count in blueprint)
+    assert slugs == [s for s in SUBJECT_ORDER if s in UNAM_EXAM_CONFIG[area]["subjects"]]
+
+
+@pytest.mark.parametrize("area", sorted(UNAM_EXAM_CONFIG))
+def test_full_exam_matches_official_distribution(area):
+    assert dict(AttemptService.plan_exam_blueprint(area, 120)) == UNAM_EXAM_CONFIG[area]["subjects"]
+
+
+def test_plans_are_memoised():
+    assert AttemptService.plan_exam_blueprint("area_1", 80) is AttemptService.plan_exam_blueprint("area_1", 80)
+
+
+def test_unknown_area():
+    with pytest.raises(ValueError):
+        AttemptService.plan_exam_blueprint("area_9", 120)
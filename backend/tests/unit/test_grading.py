@@ -0,0 +1,55 @@
+"""
+Grading: one batched answer-key lookup, answers outside the exam are ignored
+"""
+import pytest
+
+from services.grading_service import GradingService, ABANDON_ANSWER_FIELDS
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_grades_and_groups_by_subject(simulator):
+    grading = await GradingService.grade_answers([
+        {"question_id": "q_mat_0", "selected_option": 0},
+        {"question_id": "q_mat_1", "selected_option": 0},
+        {"question_id": "q_mat_2", "selected_option": 2}
+    ])
+    
+    assert grading["score"] == 2
+    assert grading["subject_scores"] == {"Matemáticas": {"correct": 2, "total": 3}}
+    assert [a["is_correct"] for a in grading["answers"]] == [True, False, True]
+
+
+async def test_answers_to_questions_outside_the_exam_are_ignored(simulator):
+    await db.questions.insert_one({
+        "question_id": "q_other", "subject_id": "subj_mat", "topic": "Álgebra",
+        "text": "Otra", "options": ["a", "b", "c", "d"], "correct_answer": 1
+    })
+    
+    grading = await GradingService.grade_answers(
+        [
+            {"question_id": "q_mat_0", "selected_option": 0},
+            {"question_id": "q_other", "selected_option": 1},
+            {"question_id": "q_missing", "selected_option": 0}
+        ],
+        question_ids=["q_mat_0", "q_mat_1"]
+    )
+    
+    assert grading["score"] == 1
+    assert [a["question_id"] for a in grading["answers"]] == ["q_mat_0"]
+
+
+async def test_invalid_options_count_as_wrong(simulator):
+    grading = await GradingService.grade_answers(
+        [
+            {"question_id": "q_mat_0", "selected_option": None},
+            {"question_id": "q_mat_4", "selected_option": 7},
+            {"question_id": "q_mat_8", "selected_option": "0"}
+        ],
+        answer_fields=ABANDON_ANSWER_FIELDS
+    )
+    
+    assert grading["score"] == 0
+    assert grading["subject_scores"]["Matemáticas"]["total"] == 3
+    assert set(grading["answers"][0]) == set(ABANDON_ANSWER_FIELDS)
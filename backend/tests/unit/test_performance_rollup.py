@@ -0,0 +1,64 @@
+"""
+Performance rollups: attempts completing while a rollup is rebuilt are not lost
+"""
+import pytest
+
+import services.analytics_service as analytics_service
+from models import AttemptCreate, AttemptSubmit
+from routes.attempts import create_attempt, submit_attempt
+from services.analytics_service import AnalyticsService
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def start(student):
+    created = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+    return await db.attempts.find_one({"attempt_id": created.attempt_id})
+
+
+async def submit(attempt, student):
+    answers = AttemptSubmit(answers=[
+        {"question_id": qid, "selected_option": 0} for qid in attempt["question_ids"]
+    ])
+    await submit_attempt(attempt["attempt_id"], answers, user=student)
+
+
+async def test_attempt_completed_during_rebuild_is_counted(simulator, student, monkeypatch):
+    await submit(await start(student), student)
+    pending = await start(student)
+    read_attempts = analytics_service._completed_attempts
+    
+    async def complete_after_read(user_id, exclude=None):
+        attempts = await read_attempts(user_id, exclude)
+        if exclude is None:
+            # Completes between the rebuild's read and its write; no rollup exists yet
+            await submit(pending, student)
+        return attempts
+    
+    monkeypatch.setattr(analytics_service, "_completed_attempts", complete_after_read)
+    rollup = await AnalyticsService.get_rollup(student["user_id"])
+    
+    assert rollup["total_attempts"] == 2
+    assert len(rollup["trend"]) == 2
+
+
+async def test_rebuild_keeps_current_rollup(simulator, student):
+    await submit(await start(student), student)
+    await AnalyticsService.get_rollup(student["user_id"])
+    await submit(await start(student), student)
+    
+    rollup = await AnalyticsService.rebuild_rollup(student["user_id"])
+    
+    assert rollup["total_attempts"] == 2
+    assert rollup["subjects"]["Matemáticas"]["total"] == 20
+
+
+async def test_older_version_is_rebuilt(simulator, student):
+    await submit(await start(student), student)
+    await db.user_performance.insert_one({"user_id": student["user_id"], "version": 1, "total_attempts": 9})
+    
+    rollup = await AnalyticsService.get_rollup(student["user_id"])
+    
+    assert rollup["total_attempts"] == 1
+    assert rollup["version"] == analytics_service.ROLLUP_VERSION
@@ -0,0 +1,62 @@
+"""
+Progress summary: one aggregation over completed attempts, simulators from the catalog
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from routes.analytics import get_user_progress
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed_attempts(student):
+    await db.simulators.insert_many([
+        {"simulator_id": "sim_1", "name": "Simulacro 1", "area": "area_1"},
+        {"simulator_id": "sim_2", "name": "Simulacro 2", "area": "area_2"}
+    ])
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [("sim_1", 10), ("sim_1", 20), ("sim_2", 30), ("sim_1", 40), ("sim_2", 50), ("sim_gone", 60)]
+    await db.attempts.insert_many([
+        {
+            "attempt_id": f"att_{i}",
+            "user_id": student["user_id"],
+            "simulator_id": simulator_id,
+            "status": "completed",
+            "score": score,
+            "answers": [{"question_id": f"q_{n}"} for n in range(120)],
+            "started_at": start + timedelta(days=i)
+        }
+        for i, (simulator_id, score) in enumerate(rows)
+    ])
+    await db.attempts.insert_many([
+        {"attempt_id": "att_open", "user_id": student["user_id"], "simulator_id": "sim_1",
+         "status": "in_progress", "score": 0, "answers": [], "started_at": start + timedelta(days=30)},
+        {"attempt_id": "att_other", "user_id": "user_other", "simulator_id": "sim_1",
+         "status": "completed", "score": 100, "answers": [], "started_at": start}
+    ])
+
+
+async def test_progress_summarises_completed_attempts(student):
+    await seed_attempts(student)
+    
+    progress = await get_user_progress(user=student)
+    
+    assert progress.total_attempts == 6
+    assert progress.average_score == 35.0
+    assert progress.best_score == 60
+    assert progress.total_questions_answered == 720
+    assert progress.area_stats["area_1"]["attempts"] == 3
+    assert progress.area_stats["area_1"]["average_score"] == round(70 / 3, 1)
+    assert progress.area_stats["area_2"]["best_score"] == 50
+    assert [a["attempt_id"] for a in progress.recent_attempts] == ["att_5", "att_4", "att_3", "att_2", "att_1"]
+    assert progress.recent_attempts[0]["simulator_name"] == "Unknown"
+    assert progress.recent_attempts[1]["total"] == 120
+
+
+async def test_progress_without_attempts(student):
+    progress = await get_user_progress(user=student)
+    
+    assert progress.total_attempts == 0
+    assert progress.recent_attempts == []
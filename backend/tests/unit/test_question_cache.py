@@ -0,0 +1,42 @@
+"""
+Question cache: answer-key edits made by another process reach this one
+"""
+import pytest
+
+from services.grading_service import GradingService
+from services.question_service import QuestionService
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def grade_first_option(question_id: str) -> int:
+    grading = await GradingService.grade_answers([{"question_id": question_id, "selected_option": 0}])
+    return grading["score"]
+
+
+async def test_edit_in_another_process_clears_cache(simulator, monkeypatch):
+    monkeypatch.setattr("services.question_service.QUESTION_CACHE_CHECK_INTERVAL_SECONDS", 0)
+    assert await grade_first_option("q_mat_0") == 1
+    
+    # Another worker fixes the answer key and bumps the version
+    await db.questions.update_one({"question_id": "q_mat_0"}, {"$set": {"correct_answer": 2}})
+    await db.catalog_versions.update_one({"_id": "questions"}, {"$inc": {"version": 1}}, upsert=True)
+    
+    assert await grade_first_option("q_mat_0") == 0
+
+
+async def test_cached_within_check_interval(simulator):
+    assert await grade_first_option("q_mat_0") == 1
+    await db.questions.update_one({"question_id": "q_mat_0"}, {"$set": {"correct_answer": 2}})
+    assert await grade_first_option("q_mat_0") == 1
+
+
+async def test_local_invalidation_bumps_version(simulator):
+    assert await grade_first_option("q_mat_0") == 1
+    await db.questions.update_one({"question_id": "q_mat_0"}, {"$set": {"correct_answer": 2}})
+    
+    await QuestionService.invalidate_questions(["q_mat_0"])
+    
+    assert await grade_first_option("q_mat_0") == 0
+    assert (await db.catalog_versions.find_one({"_id": "questions"}))["version"] == 1
@@ -0,0 +1,69 @@
+"""
+Question importer: batches, duplicates and subject counters
+"""
+import pytest
+
+from services.question_import_service import QuestionImporter
+from services.subject_counter_service import SubjectCounterService
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+def row(i: int, **overrides):
+    return {
+        "subject_id": "subj_mat",
+        "topic": "Álgebra",
+        "text": f"¿Cuánto es {i} + {i}?",
+        "options": [str(2 * i), "1", "2", "3"],
+        "correct_answer": 0,
+        "explanation": "Suma directa",
+        **overrides
+    }
+
+
+async def test_imports_in_batches_and_reports_bad_rows(simulator):
+    importer = await QuestionImporter.create("user_admin", batch_size=2)
+    for i in range(5):
+        await importer.add(row(100 + i))
+    await importer.add(row(200, subject_id="subj_missing"))
+    
+    summary = await importer.finish()
+    
+    assert summary["imported_questions"] == 5
+    assert summary["errors"] == ["Question 6: Subject not found"]
+    assert importer.batches == 3
+    assert (await SubjectCounterService.get_counts())["subj_mat"]["question_count"] == 5
+
+
+async def test_skip_duplicates(simulator):
+    importer = await QuestionImporter.create("user_admin", skip_duplicates=True)
+    await importer.add(row(100))
+    await importer.add(row(100, text="  ¿CUÁNTO es 100 +   100?"))
+    await importer.add(row(101))
+    
+    summary = await importer.finish()
+    
+    assert summary["imported_questions"] == 2
+    assert summary["duplicates"] == 1
+
+
+async def test_batches_written_before_a_failure_are_counted(simulator, monkeypatch):
+    importer = await QuestionImporter.create("user_admin", batch_size=2)
+    collection_class = type(db.questions)
+    insert_many = collection_class.insert_many
+    calls = []
+    
+    async def fail_second_batch(self, docs, *args, **kwargs):
+        calls.append(len(docs))
+        if len(calls) == 2:
+            raise RuntimeError("connection reset")
+        return await insert_many(self, docs, *args, **kwargs)
+    
+    monkeypatch.setattr(collection_class, "insert_many", fail_second_batch)
+    with pytest.raises(RuntimeError):
+        for i in range(4):
+            await importer.add(row(100 + i))
+    
+    counts = await SubjectCounterService.get_counts()
+    assert counts["subj_mat"]["question_count"] == 2
@@ -0,0 +1,115 @@
+"""
+Streaming question upload: progress lines per batch, caches refreshed on every exit
+"""
+import json
+
+import pytest
+from pymongo.errors import PyMongoError
+from starlette.requests import Request
+
+from routes.admin import upload_questions
+from services.question_import_service import QuestionImporter, iter_lines
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"user_id": "user_admin", "role": "admin"}
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    create = QuestionImporter.create.__func__
+    monkeypatch.setattr(
+        QuestionImporter, "create",
+        classmethod(lambda cls, user_id, **kwargs: create(cls, user_id, batch_size=2, **kwargs))
+    )
+
+
+def ndjson(count: int) -> bytes:
+    return "".join(
+        json.dumps({
+            "subject_id": "subj_mat",
+            "topic": "Álgebra",
+            "text": f"¿Cuánto es {i} + {i}?",
+            "options": [str(2 * i), "1", "2", "3"],
+            "correct_answer": 0,
+            "explanation": "Suma directa"
+        }) + "\n"
+        for i in range(100, 100 + count)
+    ).encode()
+
+
+def upload_request(*chunks: bytes) -> Request:
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+    
+    async def receive():
+        return messages.pop(0)
+    
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/admin/questions/upload", "query_string": b"",
+        "headers": [(b"content-type", b"application/x-ndjson")]
+    }
+    return Request(scope, receive)
+
+
+async def upload(*chunks: bytes):
+    response = await upload_questions(upload_request(*chunks), format=None, user=ADMIN)
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+async def questions_version():
+    return ((await db.catalog_versions.find_one({"_id": "questions"})) or {}).get("version", 0)
+
+
+async def test_progress_per_batch_then_done(simulator, small_batches):
+    events = await upload(ndjson(3), b"{not json}\n", ndjson(2))
+    
+    assert [e["type"] for e in events] == ["progress", "progress", "done"]
+    assert events[-1]["rows"] == 6
+    assert events[-1]["imported"] == 3
+    assert events[-1]["duplicates"] == 2
+    assert events[-1]["error_count"] == 1
+    assert await questions_version() == 1
+
+
+async def test_failed_write_reports_error_and_refreshes_caches(simulator, small_batches, monkeypatch):
+    collection_class = type(db.questions)
+    insert_many = collection_class.insert_many
+    calls = []
+    
+    async def fail_second_batch(self, docs, *args, **kwargs):
+        calls.append(len(docs))
+        if len(calls) == 2:
+            raise PyMongoError("connection reset")
+        return await insert_many(self, docs, *args, **kwargs)
+    
+    monkeypatch.setattr(collection_class, "insert_many", fail_second_batch)
+    events = await upload(ndjson(6))
+    
+    assert [e["type"] for e in events] == ["progress", "error"]
+    assert await db.questions.count_documents({"created_by": ADMIN["user_id"]}) == 2
+    assert await questions_version() == 1
+
+
+async def test_response_teardown_still_finishes(simulator, small_batches):
+    response = await upload_questions(upload_request(ndjson(3), ndjson(3)), format=None, user=ADMIN)
+    body = response.body_iterator
+    
+    assert json.loads(await body.__anext__())["type"] == "progress"
+    await body.aclose()
+    
+    assert await db.questions.count_documents({"created_by": ADMIN["user_id"]}) == 2
+    assert await questions_version() == 1
+
+
+async def test_line_limit_counts_utf8_bytes():
+    async def chunks(*parts):
+        for part in parts:
+            yield part.encode()
+    
+    assert [line async for line in iter_lines(chunks("ñññññ\n"), max_line_bytes=10)] == ["ñññññ"]
+    with pytest.raises(ValueError):
+        [line async for line in iter_lines(chunks("ññññññ\n"), max_line_bytes=10)]
+    with pytest.raises(ValueError):
+        [line async for line in iter_lines(chunks("ñññ", "ñññ"), max_line_bytes=10)]
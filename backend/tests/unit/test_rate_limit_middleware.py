@@ -0,0 +1,55 @@
+"""
+Rate limit middleware: callers cannot get a fresh bucket per request with made-up cookies
+"""
+import uuid
+
+import pytest
+
+from utils.rate_limit_middleware import RateLimitMiddleware
+from utils.rate_limiter import RateLimiter
+from utils.user_cache import user_cache
+
+pytestmark = pytest.mark.anyio
+
+POLICIES = [{"name": "api", "path": "/api/{rest:path}", "limit": 3, "window": 60, "scope": "user"}]
+
+
+def http_scope(cookie: str = None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return {"type": "http", "method": "GET", "path": "/api/simulators", "headers": headers, "client": ("10.0.0.7", 5000)}
+
+
+async def call(middleware, scope) -> int:
+    sent = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b""}
+    
+    async def send(message):
+        sent.append(message)
+    
+    await middleware(scope, receive, send)
+    return sent[0]["status"]
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def test_unverified_session_cookie_falls_back_to_ip():
+    assert await RateLimitMiddleware._identify(http_scope("session_token=made_up")) == "ip:10.0.0.7"
+
+
+async def test_verified_session_cookie_keys_on_user():
+    await user_cache.set_session("session_real", "user_1", expires_in=3600)
+    assert await RateLimitMiddleware._identify(http_scope("session_token=session_real")) == "user:user_1"
+
+
+async def test_random_cookies_share_the_ip_bucket():
+    middleware = RateLimitMiddleware(app, policies=POLICIES, limiter=RateLimiter(redis_client=None))
+    statuses = [
+        await call(middleware, http_scope(f"session_token={uuid.uuid4().hex}"))
+        for _ in range(5)
+    ]
+    assert statuses == [200, 200, 200, 429, 429]
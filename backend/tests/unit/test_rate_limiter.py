@@ -0,0 +1,110 @@
+"""
+RateLimiter: Redis sliding-window script (via fakeredis) and the in-memory GCRA store
+"""
+import pytest
+
+from utils.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis_limiter():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RateLimiter(redis_client=fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the in-memory store"""
+    now = [1000.0]
+    monkeypatch.setattr("utils.rate_limiter.time.monotonic", lambda: now[0])
+    return now
+
+
+# ---- Redis sliding window ----
+
+async def test_redis_allows_up_to_limit(redis_limiter):
+    results = [await redis_limiter.acquire("login:ip:1", 3, 60) for _ in range(4)]
+    
+    assert [r["allowed"] for r in results] == [True, True, True, False]
+    assert [r["remaining"] for r in results[:3]] == [2, 1, 0]
+    assert results[3]["retry_after"] >= 1
+    assert 0 < results[3]["reset"] <= 60
+
+
+async def test_redis_cost_consumes_several_units(redis_limiter):
+    first = await redis_limiter.acquire("upload:user:1", 5, 60, cost=3)
+    second = await redis_limiter.acquire("upload:user:1", 5, 60, cost=3)
+    third = await redis_limiter.acquire("upload:user:1", 5, 60, cost=2)
+    
+    assert first["allowed"] and first["remaining"] == 2
+    # A denied request does not consume anything
+    assert not second["allowed"] and second["remaining"] == 2
+    assert third["allowed"] and third["remaining"] == 0
+
+
+async def test_redis_keys_are_independent_and_expire(redis_limiter):
+    await redis_limiter.acquire("api:user:1", 1, 60)
+    
+    assert not (await redis_limiter.acquire("api:user:1", 1, 60))["allowed"]
+    assert (await redis_limiter.acquire("api:user:2", 1, 60))["allowed"]
+    assert 0 < await redis_limiter._redis_client.ttl("ratelimit:api:user:1") <= 61
+
+
+async def test_redis_status_counts_requests_in_window(redis_limiter):
+    await redis_limiter.acquire("api:user:1", 10, 60, cost=4)
+    
+    status = await redis_limiter.get_status("api:user:1", 60)
+    
+    assert status["requests"] == 4
+    assert 0 < status["window_remaining"] <= 60
+
+
+# ---- In-memory GCRA ----
+
+async def test_memory_allows_burst_then_spaces_requests(clock):
+    limiter = RateLimiter(redis_client=None)
+    results = [await limiter.acquire("login:ip:1", 5, 60) for _ in range(6)]
+    
+    assert [r["allowed"] for r in results] == [True] * 5 + [False]
+    assert [r["remaining"] for r in results[:5]] == [4, 3, 2, 1, 0]
+    # One request's worth of the window (60 / 5 = 12s) frees one slot
+    assert results[5]["retry_after"] == 12
+    
+    clock[0] += 12
+    assert (await limiter.acquire("login:ip:1", 5, 60))["allowed"]
+    assert not (await limiter.acquire("login:ip:1", 5, 60))["allowed"]
+
+
+async def test_memory_cost(clock):
+    limiter = RateLimiter(redis_client=None)
+    
+    assert (await limiter.acquire("upload:user:1", 5, 60, cost=3))["remaining"] == 2
+    assert not (await limiter.acquire("upload:user:1", 5, 60, cost=3))["allowed"]
+    assert (await limiter.acquire("upload:user:1", 5, 60, cost=2))["allowed"]
+    # More than the whole limit can never be allowed
+    assert not (await limiter.acquire("upload:user:2", 5, 60, cost=6))["allowed"]
+
+
+async def test_memory_full_reset_after_window(clock):
+    limiter = RateLimiter(redis_client=None)
+    for _ in range(3):
+        await limiter.acquire("api:user:1", 3, 30)
+    
+    assert (await limiter.get_status("api:user:1", 30))["requests"] == 3
+    clock[0] += 30
+    assert (await limiter.get_status("api:user:1", 30))["requests"] == 0
+    assert limiter.cleanup_memory() == 1
+
+
+async def test_memory_store_is_bounded(clock):
+    limiter = RateLimiter(redis_client=None, max_memory_keys=2)
+    for user in ("a", "b", "c"):
+        await limiter.acquire(f"api:user:{user}", 1, 60)
+    
+    assert limiter.memory_stats()["keys"] == 2
+    # The least recently used key was evicted and starts fresh
+    assert (await limiter.acquire("api:user:a", 1, 60))["allowed"]
+    assert not (await limiter.acquire("api:user:c", 1, 60))["allowed"]
@@ -0,0 +1,154 @@
+"""
+Free-tier simulator quota: reserve on create, confirm on completion, release on abandon
+"""
+import pytest
+from fastapi import HTTPException
+
+from models import AttemptCreate, AttemptSubmit
+from routes.attempts import create_attempt, submit_attempt, abandon_attempt
+from services.entitlement_service import EntitlementService
+from services.subscription_service import SubscriptionService
+from utils.config import FREE_SIMULATORS_PER_AREA, FREE_PRACTICE_ATTEMPTS_PER_DAY, FREE_TOTAL_SIMULATORS_LIMIT
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+ADMIN = {"user_id": "user_admin", "role": "admin"}
+
+
+def answers_for(question_ids):
+    return AttemptSubmit(answers=[
+        {"question_id": qid, "selected_option": 0} for qid in question_ids
+    ])
+
+
+async def test_abandoned_attempt_cannot_be_submitted(simulator, student):
+    """Abandoning without answers gives the quota back, so the attempt must stay abandoned"""
+    for _ in range(FREE_SIMULATORS_PER_AREA + 2):
+        try:
+            created = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+        except HTTPException as e:
+            assert e.status_code == 403
+            break
+        attempt = await db.attempts.find_one({"attempt_id": created.attempt_id})
+        await abandon_attempt(created.attempt_id, user=student)
+        
+        with pytest.raises(HTTPException) as exc:
+            await submit_attempt(created.attempt_id, answers_for(attempt["question_ids"][:3]), user=student)
+        assert exc.value.status_code == 400
+    
+    assert await db.attempts.count_documents({"status": "completed"}) == 0
+    entitlements = await EntitlementService.get_entitlements(student["user_id"])
+    assert entitlements["simulators"]["total"] == 0
+
+
+async def test_rebuild_keeps_current_counters(student):
+    """A late rebuild must not overwrite reservations made on a current document"""
+    assert await EntitlementService.reserve_simulator(student, "area_1")
+    assert await EntitlementService.reserve_simulator(student, "area_1")
+    
+    rebuilt = await EntitlementService.rebuild_entitlements(student["user_id"])
+    
+    assert rebuilt["simulators"]["total"] == 2
+    assert rebuilt["simulators"]["by_area"] == {"area_1": 2}
+
+
+async def test_rebuild_upgrades_older_version(student):
+    await db.user_entitlements.insert_one({
+        "user_id": student["user_id"],
+        "version": 1,
+        "simulators": {"total": 7, "by_area": {"area_1": 7}}
+    })
+    
+    entitlements = await EntitlementService.get_entitlements(student["user_id"])
+    
+    assert entitlements["simulators"] == {"total": 0, "by_area": {}}
+    assert await db.user_entitlements.count_documents({}) == 1
+
+
+async def test_reserve_stops_at_area_limit(student):
+    for _ in range(FREE_SIMULATORS_PER_AREA):
+        assert await EntitlementService.reserve_simulator(student, "area_1")
+    
+    assert not await EntitlementService.reserve_simulator(student, "area_1")
+    assert await EntitlementService.reserve_simulator(student, "area_2")
+
+
+async def test_reserve_stops_at_total_limit(student):
+    areas = ["area_1", "area_2", "area_3", "area_4"]
+    for i in range(FREE_TOTAL_SIMULATORS_LIMIT):
+        assert await EntitlementService.reserve_simulator(student, areas[i % len(areas)])
+    
+    entitlements = await EntitlementService.get_entitlements(student["user_id"])
+    assert entitlements["simulators"]["total"] == FREE_TOTAL_SIMULATORS_LIMIT
+    assert not any([await EntitlementService.reserve_simulator(student, area) for area in areas])
+
+
+async def test_release_gives_the_slot_back(student):
+    for _ in range(FREE_SIMULATORS_PER_AREA):
+        await EntitlementService.reserve_simulator(student, "area_1")
+    
+    await EntitlementService.release_simulator(student["user_id"], "area_1")
+    
+    assert await EntitlementService.reserve_simulator(student, "area_1")
+
+
+async def test_admin_reservations_are_counted_without_limit():
+    for _ in range(FREE_SIMULATORS_PER_AREA + 2):
+        assert await EntitlementService.reserve_simulator(ADMIN, "area_1")
+    
+    entitlements = await EntitlementService.get_entitlements(ADMIN["user_id"])
+    assert entitlements["simulators"]["by_area"] == {"area_1": FREE_SIMULATORS_PER_AREA + 2}
+
+
+async def test_resume_at_limit_does_not_reserve(simulator, student):
+    """Creating again while an attempt is in progress returns it and keeps the counters"""
+    first = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+    for _ in range(FREE_SIMULATORS_PER_AREA):
+        again = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+        assert again.attempt_id == first.attempt_id
+    
+    entitlements = await EntitlementService.get_entitlements(student["user_id"])
+    assert entitlements["simulators"]["by_area"] == {"area_1": 1}
+
+
+async def test_completed_attempt_keeps_reservation(simulator, student):
+    created = await create_attempt(AttemptCreate(simulator_id="sim_1", question_count=40), user=student)
+    attempt = await db.attempts.find_one({"attempt_id": created.attempt_id})
+    
+    await submit_attempt(created.attempt_id, answers_for(attempt["question_ids"]), user=student)
+    with pytest.raises(HTTPException) as exc:
+        await submit_attempt(created.attempt_id, answers_for(attempt["question_ids"]), user=student)
+    assert exc.value.status_code == 400
+    
+    entitlements = await EntitlementService.get_entitlements(student["user_id"])
+    assert entitlements["simulators"]["by_area"] == {"area_1": 1}
+
+
+async def test_practice_sessions_per_day(student):
+    days = [
+        await EntitlementService.reserve_practice_session(student, is_premium=False)
+        for _ in range(FREE_PRACTICE_ATTEMPTS_PER_DAY)
+    ]
+    assert all(days)
+    assert await EntitlementService.reserve_practice_session(student, is_premium=False) is None
+    
+    await EntitlementService.release_practice_session(student["user_id"], days[-1])
+    
+    assert await EntitlementService.reserve_practice_session(student, is_premium=False)
+    assert await EntitlementService.reserve_practice_session(student, is_premium=True)
+    usage = await SubscriptionService.get_practice_usage_today(student["user_id"])
+    assert usage["practice_count"] == FREE_PRACTICE_ATTEMPTS_PER_DAY + 1
+
+
+async def test_practice_release_after_midnight_goes_to_reserved_day(student, monkeypatch):
+    monkeypatch.setattr("services.entitlement_service.utc_day", lambda *args: "2026-10-16")
+    day = await EntitlementService.reserve_practice_session(student, is_premium=False)
+    monkeypatch.setattr("services.entitlement_service.utc_day", lambda *args: "2026-10-17")
+    
+    await EntitlementService.release_practice_session(student["user_id"], day)
+    
+    usage = await db.practice_usage.find_one({"user_id": student["user_id"], "day": "2026-10-16"})
+    assert usage["sessions"] == 0
+    assert await db.practice_usage.count_documents({"day": "2026-10-17"}) == 0
@@ -0,0 +1,67 @@
+"""
+Subject counters: deltas, collision-free topic keys and reconcile without lost updates
+"""
+import pytest
+
+from services.subject_counter_service import SubjectCounterService
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+def question(i: int, topic: str, subject_id: str = "subj_mat"):
+    return {"question_id": f"q_{i}", "subject_id": subject_id, "topic": topic, "text": f"Pregunta {i}"}
+
+
+async def test_topics_that_escape_alike_keep_separate_counts():
+    await SubjectCounterService.apply_changes([("subj_mat", "a.b", 1), ("subj_mat", "a_b", 1), ("subj_mat", "a_b", 1)])
+    
+    counts = await SubjectCounterService.get_counts()
+    
+    assert counts["subj_mat"] == {"question_count": 3, "topics": {"a.b": 1, "a_b": 2}}
+
+
+async def test_reconcile_fixes_drift():
+    await db.questions.insert_many([question(1, "Álgebra"), question(2, "Álgebra"), question(3, "Geometría")])
+    await SubjectCounterService.apply_changes([("subj_mat", "Álgebra", 5), ("subj_old", "Álgebra", 1)])
+    
+    result = await SubjectCounterService.reconcile()
+    
+    assert sorted(result["corrected"]) == ["subj_mat", "subj_old"]
+    assert await SubjectCounterService.get_counts() == {
+        "subj_mat": {"question_count": 3, "topics": {"Álgebra": 2, "Geometría": 1}}
+    }
+
+
+async def test_reconcile_keeps_deltas_applied_while_it_runs(monkeypatch):
+    await db.questions.insert_many([question(1, "Álgebra"), question(2, "Álgebra")])
+    await SubjectCounterService.apply_changes([("subj_mat", "Álgebra", 7)])
+    
+    # A question is added (and counted) after reconcile read the counters
+    collection_class = type(db.questions)
+    aggregate = collection_class.aggregate
+    
+    def aggregate_then_insert(self, pipeline, *args, **kwargs):
+        cursor = aggregate(self, pipeline, *args, **kwargs)
+        to_list = cursor.to_list
+        
+        async def insert_then_list(length):
+            rows = await to_list(length)
+            monkeypatch.undo()
+            await db.questions.insert_one(question(3, "Álgebra"))
+            await SubjectCounterService.apply_changes([("subj_mat", "Álgebra", 1)])
+            return rows
+        
+        cursor.to_list = insert_then_list
+        return cursor
+    
+    monkeypatch.setattr(collection_class, "aggregate", aggregate_then_insert)
+    result = await SubjectCounterService.reconcile()
+    
+    assert result["skipped"] == ["subj_mat"]
+    assert (await SubjectCounterService.get_counts())["subj_mat"]["question_count"] == 8
+    
+    # The next run sees a quiet collection and corrects it
+    result = await SubjectCounterService.reconcile()
+    assert result["corrected"] == ["subj_mat"]
+    assert (await SubjectCounterService.get_counts())["subj_mat"] == {"question_count": 3, "topics": {"Álgebra": 3}}
@@ -0,0 +1,82 @@
+"""
+Subscriptions: lapsed documents are expired by the sweep, never by reads
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from routes.admin import upgrade_to_premium
+from services.subscription_service import SubscriptionService
+from utils.database import db
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"user_id": "user_admin", "role": "admin"}
+
+
+async def add_subscription(subscription_id: str, expires_in: timedelta, **fields):
+    await db.subscriptions.insert_one({
+        "subscription_id": subscription_id,
+        "user_id": "user_student",
+        "status": "active",
+        "plan_name": "Mensual",
+        "expires_at": datetime.now(timezone.utc) + expires_in,
+        **fields
+    })
+
+
+async def test_gift_after_lapse_before_sweep(student):
+    await db.users.insert_one(dict(student))
+    await add_subscription("sub_old", timedelta(days=-1))
+    
+    await upgrade_to_premium(student["user_id"], admin=ADMIN)
+    
+    assert (await SubscriptionService.get_user_subscription(student["user_id"]))["is_premium"]
+    old = await db.subscriptions.find_one({"subscription_id": "sub_old"})
+    assert old["status"] == "replaced"
+    assert await db.subscriptions.count_documents({"status": "active"}) == 1
+
+
+async def test_latest_active_subscription_counts(student):
+    await add_subscription("sub_old", timedelta(days=-1))
+    await add_subscription("sub_new", timedelta(days=30))
+    
+    status = await SubscriptionService.get_user_subscription(student["user_id"])
+    
+    assert status["is_premium"]
+
+
+async def test_sweep_expires_lapsed_subscriptions(student):
+    await add_subscription("sub_lapsed", timedelta(minutes=-1))
+    await add_subscription("sub_current", timedelta(days=1))
+    await add_subscription("sub_grace", timedelta(days=-1), is_recurring=True)
+    await add_subscription("sub_past_due", timedelta(days=-1), is_recurring=True, payment_status="past_due")
+    
+    assert await SubscriptionService.expire_subscriptions() == {"expired": 2}
+    
+    statuses = {s["subscription_id"]: s["status"] async for s in db.subscriptions.find()}
+    assert statuses == {
+        "sub_lapsed": "expired",
+        "sub_current": "active",
+        "sub_grace": "active",
+        "sub_past_due": "expired"
+    }
+    assert await SubscriptionService.expire_subscriptions() == {"expired": 0}
+
+
+async def test_reads_do_not_expire(student):
+    await add_subscription("sub_lapsed", timedelta(minutes=-1))
+    
+    assert not (await SubscriptionService.get_user_subscription(student["user_id"]))["is_premium"]
+    assert (await db.subscriptions.find_one({"subscription_id": "sub_lapsed"}))["status"] == "active"
+
+
+async def test_sweep_handles_legacy_string_dates(student):
+    """Documents not yet migrated to BSON dates are swept too"""
+    await add_subscription("sub_legacy", timedelta(0))
+    await db.subscriptions.update_one(
+        {"subscription_id": "sub_legacy"},
+        {"$set": {"expires_at": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat()}}
+    )
+    
+    assert await SubscriptionService.expire_subscriptions() == {"expired": 1}
@@ -0,0 +1,89 @@
+"""
+User cache: invalidations must reach every worker sharing the Redis backend
+"""
+import pytest
+
+from utils.user_cache import UserCache
+
+pytestmark = pytest.mark.anyio
+
+
+class SharedRedis:
+    """Minimal stand-in for the redis.asyncio calls UserCache makes"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+    
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def worker(redis_client):
+    cache = UserCache()
+    cache._redis_client = redis_client
+    return cache
+
+
+async def test_session_invalidation_reaches_other_workers():
+    shared = SharedRedis()
+    first, second = worker(shared), worker(shared)
+    
+    await first.set_session("token_1", "user_1", expires_in=3600)
+    assert await second.get_session("token_1") == {"user_id": "user_1"}
+    
+    await first.invalidate_session("token_1")
+    assert await second.get_session("token_1") is None
+
+
+async def test_user_invalidation_reaches_other_workers():
+    shared = SharedRedis()
+    first, second = worker(shared), worker(shared)
+    
+    await second.set_user({"user_id": "user_1", "role": "admin"})
+    assert (await first.get_user("user_1"))["role"] == "admin"
+    
+    await second.invalidate_user("user_1")
+    assert await first.get_user("user_1") is None
+
+
+async def test_logout_and_demotion_reach_other_processes_without_redis(monkeypatch, clean_db):
+    monkeypatch.setattr("utils.user_cache.USER_CACHE_CHECK_INTERVAL_SECONDS", 0)
+    first, second = UserCache(), UserCache()
+    for cache in (first, second):
+        await cache.set_session("token_1", "user_1", expires_in=3600)
+        await cache.set_user({"user_id": "user_1", "role": "admin"})
+    
+    await first.invalidate_session("token_1")
+    await first.invalidate_user("user_1")
+    
+    assert await second.get_session("token_1") is None
+    assert await second.get_user("user_1") is None
+
+
+async def test_local_entries_kept_within_check_interval(clean_db):
+    first, second = UserCache(), UserCache()
+    await second.set_user({"user_id": "user_1", "role": "admin"})
+    
+    await first.invalidate_user("user_1")
+    
+    assert (await second.get_user("user_1"))["role"] == "admin"
+
+
+async def test_premium_invalidation_reaches_other_processes_without_redis(monkeypatch, clean_db):
+    monkeypatch.setattr("utils.user_cache.USER_CACHE_CHECK_INTERVAL_SECONDS", 0)
+    first, second = UserCache(), UserCache()
+    status = {"is_premium": True, "plan": "monthly"}
+    
+    await first.set_premium("user_1", status, ttl=3600)
+    await second.set_premium("user_1", status, ttl=3600)
+    assert await second.get_premium("user_1") == status
+    
+    await first.invalidate_premium("user_1")
+    assert await first.get_premium("user_1") is None
+    assert await second.get_premium("user_1") is None
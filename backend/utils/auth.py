@@ -1,15 +1,20 @@
 """
-Authentication utilities and JWT handling
+Authentication utilities and JWT handling.
+This is the single home of the auth dependencies (get_current_user,
+get_current_claims, get_admin_user); routes.auth re-exports them.
 """
 import jwt
 import bcrypt
 from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException, Depends, Request
-from fastapi.security import HTTPBearer
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Dict, Optional
 from .database import db
+from .datetimes import to_datetime, date_query
+from .user_cache import user_cache
 from .config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION_HOURS
 
+# Shared bearer parser, created once instead of per request
 security = HTTPBearer(auto_error=False)
 
 
@@ -46,38 +51,114 @@ def decode_token(token: str) -> Optional[Dict]:
         return None
 
 
-async def get_current_user(request: Request, credentials=Depends(security)) -> Dict:
+async def _get_session_user_id(session_token: str) -> Optional[str]:
+    """Resolve a session cookie to a user_id, using the user cache"""
+    cached = await user_cache.get_session(session_token)
+    if cached:
+        return cached["user_id"]
+    
+    session = await db.user_sessions.find_one(
+        {"session_token": session_token, **date_query("expires_at", "$gt", datetime.now(timezone.utc))},
+        {"_id": 0}
+    )
+    if not session:
+        return None
+    
+    expires_at = to_datetime(session.get("expires_at"))
+    if not expires_at:
+        return None
+    
+    expires_in = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+    if expires_in <= 0:
+        return None
+    
+    await user_cache.set_session(session_token, session["user_id"], expires_in)
+    return session["user_id"]
+
+
+async def _get_user(user_id: str) -> Optional[Dict]:
+    """Load a user (without password), using the user cache"""
+    user = await user_cache.get_user(user_id)
+    if user:
+        return user
+    
+    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
+    if user:
+        await user_cache.set_user(user)
+    return user
+
+
+async def _get_credentials(request: Request, credentials) -> Optional[HTTPAuthorizationCredentials]:
+    """Support both dependency injection and direct get_current_user(request) calls"""
+    if isinstance(credentials, HTTPAuthorizationCredentials):
+        return credentials
+    return await security(request)
+
+
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Dict:
     """
-    Extract and validate user from JWT token or session cookie.
+    Extract and validate user from session cookie or JWT token.
     Used as a FastAPI dependency.
     """
+    # Already resolved earlier in this request
+    user = getattr(request.state, "user", None)
+    if user:
+        return user
+    
     # Check cookie first
     session_token = request.cookies.get("session_token")
     if session_token:
-        session = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
-        if session:
-            expires_at = session.get("expires_at")
-            if isinstance(expires_at, str):
-                expires_at = datetime.fromisoformat(expires_at)
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=timezone.utc)
-            if expires_at > datetime.now(timezone.utc):
-                user = await db.users.find_one({"user_id": session["user_id"]}, {"_id": 0, "password": 0})
-                if user:
-                    return user
+        user_id = await _get_session_user_id(session_token)
+        if user_id:
+            user = await _get_user(user_id)
+            if user:
+                request.state.user = user
+                return user
     
     # Check Authorization header
+    credentials = await _get_credentials(request, credentials)
     if credentials:
-        token = credentials.credentials
-        payload = decode_token(token)
+        payload = decode_token(credentials.credentials)
         if payload:
-            user = await db.users.find_one({"user_id": payload["user_id"]}, {"_id": 0, "password": 0})
+            user = await _get_user(payload["user_id"])
             if user:
+                request.state.user = user
                 return user
     
     raise HTTPException(status_code=401, detail="Authentication required")
 
 
+async def get_current_claims(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Dict:
+    """
+    Identify the caller without loading the user document when possible.
+    A valid JWT is trusted as is; cookie sessions fall back to get_current_user.
+    Returns a dict with 'user_id', 'email' and 'role'.
+    Used as a FastAPI dependency for endpoints that only need the caller's id.
+    """
+    user = getattr(request.state, "user", None)
+    if user:
+        return user
+    
+    if not request.cookies.get("session_token"):
+        credentials = await _get_credentials(request, credentials)
+        if credentials:
+            payload = decode_token(credentials.credentials)
+            if payload:
+                return {
+                    "user_id": payload["user_id"],
+                    "email": payload.get("email"),
+                    "role": payload.get("role")
+                }
+    
+    return await get_current_user(request, credentials)
+
+
 async def get_admin_user(user: Dict = Depends(get_current_user)) -> Dict:
     """Verify user is admin. Used as a FastAPI dependency."""
     if user.get("role") != "admin":
@@ -0,0 +1,44 @@
+"""
+Periodic background tasks tied to the application lifecycle.
+Started from the startup event and cancelled on shutdown.
+"""
+import asyncio
+import inspect
+from typing import Any, Callable, Dict
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def start_periodic_task(name: str, interval: float, func: Callable[[], Any]) -> asyncio.Task:
+    """
+    Run func every interval seconds until stop_background_tasks() is called.
+    func may be sync or async; errors are logged and the loop keeps going.
+    Starting a task with a name that is already running is a no-op.
+    """
+    task = _tasks.get(name)
+    if task and not task.done():
+        return task
+    
+    async def runner():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = func()
+                if inspect.isawaitable(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Background] {name} failed: {e}")
+    
+    _tasks[name] = asyncio.create_task(runner(), name=name)
+    return _tasks[name]
+
+
+async def stop_background_tasks():
+    """Cancel all periodic tasks and wait for them to finish"""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
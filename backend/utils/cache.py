@@ -0,0 +1,146 @@
+"""
+In-process caches: an LRU cache with per-entry TTL, and a single-value
+snapshot with stale-while-revalidate.
+Used to keep hot, rarely changing documents out of MongoDB round-trips.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Memory-bounded LRU cache with a time-to-live per entry.
+    Not thread-safe: intended for use from the asyncio event loop.
+    """
+    
+    def __init__(self, max_entries: int, ttl: float):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._store: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, counting a hit or a miss"""
+        entry = self._store.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._store[key]
+            self.misses += 1
+            return default
+        
+        self._store.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def get_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], list]:
+        """
+        Get several values at once.
+        
+        Returns:
+            (found, missing) - dict of cached values and list of missing keys
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries if full"""
+        expires_at = time.monotonic() + (self._ttl if ttl is None else ttl)
+        self._store[key] = (expires_at, value)
+        self._store.move_to_end(key)
+        while len(self._store) > self._max_entries:
+            self._store.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, key: Hashable):
+        """Remove a single entry"""
+        self._store.pop(key, None)
+    
+    def clear(self):
+        """Remove all entries"""
+        self._store.clear()
+    
+    def stats(self) -> dict:
+        """Get cache size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._store),
+            "max_entries": self._max_entries,
+            "ttl_seconds": self._ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+
+
+class Snapshot:
+    """
+    Cached result of an expensive async loader, with stale-while-revalidate.
+    
+    Fresher than ttl: served as is. Older than ttl but within max_stale: served
+    while a single background task reloads it. Older than max_stale (or never
+    loaded): callers wait for one shared reload.
+    """
+    
+    def __init__(self, loader: Callable[[], Awaitable[Any]], ttl: float, max_stale: float):
+        self._loader = loader
+        self._ttl = ttl
+        self._max_stale = max_stale
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+    
+    def _refresh(self) -> asyncio.Task:
+        # Single flight: concurrent callers share one reload
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._load())
+            self._refreshing.add_done_callback(self._log_failure)
+        return self._refreshing
+    
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        # Background reloads have no awaiting caller; keep serving the old value
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Snapshot] Reload failed: {task.exception()}")
+    
+    async def _load(self):
+        value = await self._loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
+    
+    async def get(self) -> Any:
+        """Get the cached value, reloading as described above"""
+        age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+        if age is not None and age < self._ttl:
+            return self._value
+        if age is not None and age < self._max_stale:
+            self._refresh()
+            return self._value
+        return await asyncio.shield(self._refresh())
+    
+    def invalidate(self):
+        """Force the next get() to wait for a reload"""
+        self._loaded_at = None
+    
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last load (None if never loaded)"""
+        return time.monotonic() - self._loaded_at if self._loaded_at is not None else None
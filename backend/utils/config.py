@@ -59,6 +59,93 @@ if CORS_ORIGINS == ['']:
 RATE_LIMIT_WINDOW = 60
 RATE_LIMIT_MAX_REQUESTS = 100
 RATE_LIMIT_MAX_LOGIN = 10
+# In-memory limiter (used without Redis): tracked keys cap and sweep period
+RATE_LIMIT_MEMORY_MAX_KEYS = 100000
+RATE_LIMIT_SWEEP_INTERVAL = 60
+
+# Per-route rate limit policies applied by RateLimitMiddleware (first match wins).
+# path: route pattern, {param} matches one segment and {param:path} the rest
+# methods: HTTP methods the policy applies to (None = all)
+# scope: "ip" or "user" (JWT user id, session, or IP for anonymous callers)
+# bucket: policies with the same bucket share one limit (defaults to name)
+# cost: units of the limit each request consumes
+RATE_LIMIT_POLICIES = [
+    {"name": "auth-register", "path": "/api/auth/register", "methods": ["POST"],
+     "scope": "ip", "limit": RATE_LIMIT_MAX_REQUESTS},
+    {"name": "auth-login", "path": "/api/auth/login", "methods": ["POST"],
+     "scope": "ip", "limit": RATE_LIMIT_MAX_LOGIN},
+    # Creating exams samples and hydrates up to 120 questions
+    {"name": "exam-start", "path": "/api/attempts", "methods": ["POST"],
+     "scope": "user", "limit": 20},
+    {"name": "practice-start", "path": "/api/practice/start", "methods": ["POST"],
+     "scope": "user", "bucket": "exam-start", "limit": 20},
+    # Grading loads the answer key for the whole exam
+    {"name": "exam-submit", "path": "/api/attempts/{attempt_id}/submit", "methods": ["POST"],
+     "scope": "user", "limit": 20},
+    {"name": "practice-submit", "path": "/api/practice/{practice_id}/submit", "methods": ["POST"],
+     "scope": "user", "bucket": "exam-submit", "limit": 20},
+    # Aggregations over a user's attempt history
+    {"name": "analytics-performance", "path": "/api/analytics/student/performance", "methods": ["GET"],
+     "scope": "user", "bucket": "analytics", "limit": 60, "cost": 5},
+    {"name": "analytics-progress", "path": "/api/analytics/progress", "methods": ["GET"],
+     "scope": "user", "bucket": "analytics", "limit": 60, "cost": 2},
+    # Collection-wide counts and bulk writes
+    {"name": "admin-stats", "path": "/api/admin/stats{rest:path}", "methods": ["GET"],
+     "scope": "user", "bucket": "admin-heavy", "limit": 120, "cost": 5},
+    {"name": "admin-bulk", "path": "/api/admin/questions/bulk", "methods": ["POST"],
+     "scope": "user", "bucket": "admin-heavy", "limit": 120, "cost": 20},
+    {"name": "admin-upload", "path": "/api/admin/questions/upload", "methods": ["POST"],
+     "scope": "user", "bucket": "admin-heavy", "limit": 120, "cost": 20},
+    # Everything else under /api
+    {"name": "api", "path": "/api/{rest:path}", "methods": None,
+     "scope": "user", "limit": 600},
+]
+
+# ============== CACHING ==============
+# In-process cache of question documents (answer key, explanation, topic)
+QUESTION_CACHE_MAX_ENTRIES = 20000
+QUESTION_CACHE_TTL_SECONDS = 600
+# Admin writes in any process clear every process's question cache within this interval
+QUESTION_CACHE_CHECK_INTERVAL_SECONDS = 5
+
+# Per-subject question id pools used to sample exams.
+# Rebuilt after admin writes, and at most this old when written by another process.
+QUESTION_POOL_TTL_SECONDS = 300
+
+# Authenticated users and sessions resolved by get_current_user.
+# Shared through Redis when REDIS_URL is set.
+USER_CACHE_TTL_SECONDS = 30
+USER_CACHE_MAX_ENTRIES = 10000
+# Without Redis, each process drops its cached users, sessions and premium
+# statuses within this interval after an invalidation made by any process
+USER_CACHE_CHECK_INTERVAL_SECONDS = 5
+
+# Premium status is cached until the subscription expires, capped here;
+# users without premium are re-checked after PREMIUM_CACHE_FREE_TTL_SECONDS
+PREMIUM_CACHE_MAX_TTL_SECONDS = 86400
+PREMIUM_CACHE_FREE_TTL_SECONDS = 300
+
+# Small reference collections (simulators, subjects) kept fully in memory.
+# Other processes' admin writes are picked up within this interval.
+CATALOG_CHECK_INTERVAL_SECONDS = 30
+
+# Per-subject/per-topic question counters are rebuilt from the questions
+# collection this often to correct any drift
+SUBJECT_COUNTER_RECONCILE_INTERVAL = 3600
+
+# Active subscriptions past expires_at are marked expired this often
+SUBSCRIPTION_SWEEP_INTERVAL = 300
+
+# Admin dashboard statistics: served from a snapshot this many seconds old,
+# refreshed in the background up to the max stale age
+ADMIN_STATS_TTL_SECONDS = 30
+ADMIN_STATS_MAX_STALE_SECONDS = 300
+
+# ============== QUESTION IMPORT ==============
+# Rows validated and written per insert_many batch
+QUESTION_IMPORT_BATCH_SIZE = 500
+# Longest NDJSON line / CSV record accepted by the streaming upload
+QUESTION_UPLOAD_MAX_LINE_BYTES = 1024 * 1024
 
 # ============== VALIDATION LIMITS ==============
 MAX_NAME_LENGTH = 100
@@ -85,6 +172,9 @@ FREE_PRACTICE_QUESTIONS_PER_DAY = 10
 # Número máximo de prácticas por día (todas las materias combinadas)
 FREE_PRACTICE_ATTEMPTS_PER_DAY = 5
 
+# Días que se conservan los contadores diarios de práctica (practice_usage, índice TTL)
+PRACTICE_USAGE_RETENTION_DAYS = 3
+
 # Número máximo de simulacros totales (todas las áreas combinadas) para gratuitos
 # Este es un límite adicional de seguridad, más allá del por área
 FREE_TOTAL_SIMULATORS_LIMIT = 12
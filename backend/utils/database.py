@@ -20,6 +20,7 @@ async def setup_database_indexes():
     )
     
     # TTL index for user_sessions - auto-delete expired sessions
+    # (only applies to BSON dates; run utils/migrate_datetimes.py for older string values)
     await db.user_sessions.create_index(
         [("expires_at", 1)],
         expireAfterSeconds=0
@@ -41,3 +42,57 @@ async def setup_database_indexes():
     await db.attempts.create_index(
         [("user_id", 1), ("started_at", -1)]
     )
+    
+    # One performance rollup per user
+    await db.user_performance.create_index(
+        [("user_id", 1)],
+        unique=True
+    )
+    
+    # Completed-attempt counts and recent attempts on the admin dashboard
+    await db.attempts.create_index(
+        [("status", 1), ("started_at", -1)]
+    )
+    
+    # Admin user listing: newest first, keyset pagination
+    await db.users.create_index(
+        [("created_at", -1), ("user_id", -1)]
+    )
+    
+    # Admin reports listing, filtered by status or question, newest first
+    await db.question_reports.create_index(
+        [("status", 1), ("created_at", -1), ("report_id", -1)]
+    )
+    await db.question_reports.create_index(
+        [("question_id", 1), ("created_at", -1)]
+    )
+    
+    # Duplicate detection for question uploads
+    await db.questions.create_index([("text_hash", 1)])
+    
+    # Subscription expiry sweep
+    await db.subscriptions.create_index(
+        [("status", 1), ("expires_at", 1)]
+    )
+    
+    # Daily practice counters: one per user and day, dropped a few days later
+    await db.practice_usage.create_index(
+        [("user_id", 1), ("day", 1)],
+        unique=True
+    )
+    await db.practice_usage.create_index(
+        [("expires_at", 1)],
+        expireAfterSeconds=0
+    )
+    
+    # One entitlements document per user
+    await db.user_entitlements.create_index(
+        [("user_id", 1)],
+        unique=True
+    )
+    
+    # One question counter document per subject
+    await db.subject_counters.create_index(
+        [("subject_id", 1)],
+        unique=True
+    )
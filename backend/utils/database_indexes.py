@@ -29,7 +29,7 @@ async def create_indexes():
     try:
         await db.user_sessions.create_index(
             [("expires_at", 1)],
-            expireAfterSeconds=0,  # Delete documents when expires_at is reached
+            expireAfterSeconds=0,  # Delete documents when expires_at is reached (BSON dates only, see utils/migrate_datetimes.py)
             name="ttl_expired_sessions"
         )
         print("✓ Created TTL index on user_sessions.expires_at")
@@ -74,6 +74,109 @@ async def create_indexes():
     except Exception as e:
         print(f"  Note: subscriptions index may already exist: {e}")
     
+    # 7. Per-user analytics rollups
+    try:
+        await db.user_performance.create_index(
+            [("user_id", 1)],
+            unique=True,
+            name="unique_user_performance"
+        )
+        print("✓ Created unique index on user_performance.user_id")
+    except Exception as e:
+        print(f"  Note: user_performance index may already exist: {e}")
+    
+    # 8. Per-subject question counters
+    try:
+        await db.subject_counters.create_index(
+            [("subject_id", 1)],
+            unique=True,
+            name="unique_subject_counter"
+        )
+        print("✓ Created unique index on subject_counters.subject_id")
+    except Exception as e:
+        print(f"  Note: subject_counters index may already exist: {e}")
+    
+    # 9. Admin dashboard: completed-attempt counts and recent attempts
+    try:
+        await db.attempts.create_index(
+            [("status", 1), ("started_at", -1)],
+            name="attempts_status_started"
+        )
+        print("✓ Created index on attempts (status, started_at)")
+    except Exception as e:
+        print(f"  Note: attempts status index may already exist: {e}")
+    
+    # 10. Admin user listing (newest first, keyset pagination)
+    try:
+        await db.users.create_index(
+            [("created_at", -1), ("user_id", -1)],
+            name="users_created_desc"
+        )
+        print("✓ Created index on users (created_at, user_id)")
+    except Exception as e:
+        print(f"  Note: users created_at index may already exist: {e}")
+    
+    # 11. Admin reports listing (by status or question, newest first)
+    try:
+        await db.question_reports.create_index(
+            [("status", 1), ("created_at", -1), ("report_id", -1)],
+            name="reports_status_created"
+        )
+        await db.question_reports.create_index(
+            [("question_id", 1), ("created_at", -1)],
+            name="reports_question_created"
+        )
+        print("✓ Created indexes on question_reports (status, created_at) and (question_id, created_at)")
+    except Exception as e:
+        print(f"  Note: question_reports indexes may already exist: {e}")
+    
+    # 12. Question text hashes (duplicate detection on upload)
+    try:
+        await db.questions.create_index(
+            [("text_hash", 1)],
+            name="questions_text_hash"
+        )
+        print("✓ Created index on questions.text_hash")
+    except Exception as e:
+        print(f"  Note: questions.text_hash index may already exist: {e}")
+    
+    # 13. Per-user entitlement counters
+    try:
+        await db.user_entitlements.create_index(
+            [("user_id", 1)],
+            unique=True,
+            name="unique_user_entitlements"
+        )
+        print("✓ Created unique index on user_entitlements.user_id")
+    except Exception as e:
+        print(f"  Note: user_entitlements index may already exist: {e}")
+    
+    # 14. Subscription expiry sweep
+    try:
+        await db.subscriptions.create_index(
+            [("status", 1), ("expires_at", 1)],
+            name="subscriptions_status_expires"
+        )
+        print("✓ Created index on subscriptions (status, expires_at)")
+    except Exception as e:
+        print(f"  Note: subscriptions expiry index may already exist: {e}")
+    
+    # 15. Daily practice counters (unique per user and day, TTL cleanup)
+    try:
+        await db.practice_usage.create_index(
+            [("user_id", 1), ("day", 1)],
+            unique=True,
+            name="unique_practice_usage_day"
+        )
+        await db.practice_usage.create_index(
+            [("expires_at", 1)],
+            expireAfterSeconds=0,
+            name="ttl_practice_usage"
+        )
+        print("✓ Created indexes on practice_usage (user_id, day) and TTL on expires_at")
+    except Exception as e:
+        print(f"  Note: practice_usage indexes may already exist: {e}")
+    
     print("\n✅ All indexes created successfully!")
     client.close()
 
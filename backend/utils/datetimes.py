@@ -0,0 +1,51 @@
+"""
+Timestamp helpers for fields moving from ISO strings to BSON dates.
+New writes store datetime objects; documents written before the migration
+(utils/migrate_datetimes.py) may still hold ISO strings, so reads accept both.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+def utcnow() -> datetime:
+    """Current time as an aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    """
+    Read a stored timestamp as an aware UTC datetime.
+    Accepts BSON dates (returned naive by the driver) and legacy ISO strings.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def to_iso(value: Any) -> Optional[str]:
+    """Render a stored timestamp (date or legacy string) as an ISO string for API responses"""
+    value = to_datetime(value)
+    return value.isoformat() if value else None
+
+
+def utc_day(value: Any = None) -> str:
+    """UTC calendar day ("YYYY-MM-DD") of a stored timestamp, or of the current time"""
+    value = utcnow() if value is None else to_datetime(value)
+    return value.date().isoformat()
+
+
+def date_query(field: str, op: str, value: datetime) -> Dict:
+    """
+    Filter for `field <op> value` that matches both BSON dates and legacy ISO strings.
+    Mongo only compares values of the same type, so each type gets its own branch.
+    """
+    return {"$or": [
+        {field: {op: value}},
+        {field: {op: value.isoformat()}}
+    ]}
@@ -0,0 +1,82 @@
+"""
+Convert timestamps stored as ISO strings into BSON dates.
+Safe to re-run, and to run while the app is serving traffic: readers accept both
+types (see utils/datetimes.py) and each document is only rewritten if the field
+still holds the string that was read.
+
+Usage (from backend/):
+    python -m utils.migrate_datetimes
+"""
+import asyncio
+from typing import Dict, List, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from utils.config import MONGO_URL, DB_NAME
+from utils.datetimes import to_datetime
+
+# (collection, field) pairs stored as BSON dates by current code
+DATETIME_FIELDS: List[Tuple[str, str]] = [
+    ("subscriptions", "expires_at"),
+    ("user_sessions", "expires_at"),
+    ("attempts", "started_at"),
+    ("attempts", "finished_at"),
+    ("practice_sessions", "finished_at"),
+]
+
+
+async def migrate_field(db, collection: str, field: str, batch_size: int = 1000) -> Dict[str, int]:
+    """Convert one field in batches. Returns converted and unparseable counts."""
+    converted = 0
+    skipped = 0
+    last_id = None
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(query, {field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        
+        updates = []
+        for doc in docs:
+            try:
+                value = to_datetime(doc[field])
+            except ValueError:
+                skipped += 1
+                continue
+            if value is None:
+                skipped += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": doc["_id"], field: doc[field]},
+                {"$set": {field: value}}
+            ))
+        if updates:
+            result = await db[collection].bulk_write(updates, ordered=False)
+            converted += result.modified_count
+    return {"converted": converted, "skipped": skipped}
+
+
+async def migrate_datetimes(db) -> Dict[str, Dict[str, int]]:
+    """Convert every field in DATETIME_FIELDS"""
+    results = {}
+    for collection, field in DATETIME_FIELDS:
+        results[f"{collection}.{field}"] = await migrate_field(db, collection, field)
+    return results
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    
+    results = await migrate_datetimes(db)
+    for name, counts in results.items():
+        print(f"✓ {name}: {counts['converted']} converted, {counts['skipped']} unparseable left as-is")
+    
+    print("\n✅ Datetime migration finished")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""
+Keyset (cursor) pagination helpers.
+Cursors are opaque url-safe strings carrying the sort key of the last item served.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last item of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[List[Any]]:
+    """Decode a cursor; returns None if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def after_cursor(sort_field: str, tie_field: str, values: List[Any]) -> Dict:
+    """
+    Filter for items after a cursor when sorting by (sort_field, tie_field) descending.
+    tie_field must be unique so pages never overlap or skip items.
+    """
+    sort_value, tie_value = values
+    return {"$or": [
+        {sort_field: {"$lt": sort_value}},
+        {sort_field: sort_value, tie_field: {"$lt": tie_value}}
+    ]}
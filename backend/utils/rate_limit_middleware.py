@@ -0,0 +1,144 @@
+"""
+ASGI middleware applying per-route rate limit policies.
+Policies live in config.RATE_LIMIT_POLICIES; counters are kept by RateLimiter
+(Redis when available, in-memory otherwise).
+"""
+import json
+import re
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from .config import RATE_LIMIT_POLICIES, RATE_LIMIT_WINDOW
+from .rate_limiter import rate_limiter as default_rate_limiter, RateLimiter
+from .auth import decode_token
+from .user_cache import user_cache
+
+_PARAM_PATTERN = re.compile(r"\{(\w+)(:path)?\}")
+
+
+def compile_path(path: str) -> re.Pattern:
+    """Turn a route pattern like /api/attempts/{attempt_id}/submit into a regex"""
+    regex = ""
+    last = 0
+    for match in _PARAM_PATTERN.finditer(path):
+        regex += re.escape(path[last:match.start()])
+        regex += ".*" if match.group(2) else "[^/]+"
+        last = match.end()
+    regex += re.escape(path[last:])
+    return re.compile(f"^{regex}$")
+
+
+class RateLimitMiddleware:
+    """
+    Rate limit requests by route policy before they reach the endpoints.
+    Adds RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset headers to
+    limited routes, and answers 429 with Retry-After once a limit is exceeded.
+    Callers are identified from the JWT or from a session cookie already verified
+    by the auth dependency (user cache), without touching the database, falling
+    back to the client IP.
+    """
+    
+    def __init__(self, app, policies: List[Dict] = None, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter or default_rate_limiter
+        self.policies = [
+            {
+                **policy,
+                "pattern": compile_path(policy["path"]),
+                "methods": {m.upper() for m in policy["methods"]} if policy.get("methods") else None,
+                "bucket": policy.get("bucket", policy["name"]),
+                "window": policy.get("window", RATE_LIMIT_WINDOW),
+                "cost": policy.get("cost", 1),
+            }
+            for policy in (RATE_LIMIT_POLICIES if policies is None else policies)
+        ]
+    
+    def match_policy(self, method: str, path: str) -> Optional[Dict]:
+        """Get the first policy matching the request, if any"""
+        for policy in self.policies:
+            if policy["methods"] is not None and method not in policy["methods"]:
+                continue
+            if policy["pattern"].match(path):
+                return policy
+        return None
+    
+    @staticmethod
+    def _client_ip(scope) -> str:
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+    
+    @staticmethod
+    async def _identify(scope) -> str:
+        """Identify the caller from request headers only"""
+        headers = dict(scope.get("headers") or [])
+        
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.lower().startswith("bearer "):
+            payload = decode_token(authorization[7:].strip())
+            if payload and payload.get("user_id"):
+                return f"user:{payload['user_id']}"
+        
+        cookie_header = headers.get(b"cookie")
+        if cookie_header:
+            cookies = SimpleCookie()
+            try:
+                cookies.load(cookie_header.decode("latin-1"))
+            except Exception:
+                cookies = {}
+            session = cookies.get("session_token")
+            if session and session.value:
+                # Only sessions the auth dependency has verified are cached; an unknown
+                # token (possibly made up per request) must not get its own bucket
+                cached = await user_cache.get_session(session.value)
+                if cached:
+                    return f"user:{cached['user_id']}"
+        
+        return f"ip:{RateLimitMiddleware._client_ip(scope)}"
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        
+        policy = self.match_policy(scope["method"], scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        
+        if policy["scope"] == "ip":
+            identity = f"ip:{self._client_ip(scope)}"
+        else:
+            identity = await self._identify(scope)
+        
+        result = await self.limiter.acquire(
+            f"{policy['bucket']}:{identity}", policy["limit"], policy["window"], policy["cost"]
+        )
+        headers = self._headers(result)
+        
+        if not result["allowed"]:
+            headers.append((b"retry-after", str(result["retry_after"]).encode()))
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+    
+    @staticmethod
+    def _headers(result: Dict) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"ratelimit-limit", str(result["limit"]).encode()),
+            (b"ratelimit-remaining", str(result["remaining"]).encode()),
+            (b"ratelimit-reset", str(result["reset"]).encode()),
+        ]
@@ -2,12 +2,13 @@
 Distributed rate limiting with Redis support.
 Falls back to in-memory storage if Redis is not available.
 """
+import math
 import time
-import threading
 import os
-from typing import Dict, List, Tuple, Optional
-from collections import defaultdict
-from .config import RATE_LIMIT_WINDOW
+import uuid
+from typing import Tuple, Optional
+from collections import OrderedDict
+from .config import RATE_LIMIT_WINDOW, RATE_LIMIT_MEMORY_MAX_KEYS
 
 # Try to import Redis, but make it optional
 try:
@@ -17,22 +18,88 @@ except ImportError:
     REDIS_AVAILABLE = False
 
 
+# Sliding window check as one atomic server-side step.
+# KEYS[1]: rate limit key
+# ARGV: now (seconds), window (seconds), max_requests, unique member id, cost
+# Returns: {allowed (0/1), requests in window, oldest timestamp in window}
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local cost = tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+local allowed = 0
+if count + cost <= limit then
+    for i = 1, cost do
+        redis.call('ZADD', key, now, ARGV[4] .. ':' .. i)
+    end
+    redis.call('EXPIRE', key, math.ceil(window) + 1)
+    count = count + cost
+    allowed = 1
+end
+
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {allowed, count, oldest[2] or tostring(now)}
+"""
+
+# Read-only status lookup in a single round-trip.
+# KEYS[1]: rate limit key
+# ARGV: now (seconds), window (seconds)
+# Returns: {requests in window, oldest timestamp in window or false}
+SLIDING_WINDOW_STATUS_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {count, oldest[2] or false}
+"""
+
+
 class RateLimiter:
     """
     Distributed rate limiter with Redis support.
     Falls back to in-memory storage if Redis is unavailable.
+    
+    The in-memory store uses GCRA (generic cell rate algorithm): each key keeps
+    only its theoretical arrival time (TAT) and emission interval, so checks are
+    O(1) and a key's state is two floats. It is only touched from the event
+    loop, so it needs no lock. Keys whose TAT has passed carry no state and are
+    dropped by cleanup_memory(); the least recently used keys are evicted
+    beyond max_memory_keys.
     """
     
-    def __init__(self):
+    def __init__(self, redis_client=None, max_memory_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        """
+        Args:
+            redis_client: Optional pre-built async Redis client (e.g. a local
+                Redis or fakeredis instance in tests). When omitted, REDIS_URL
+                is used if set.
+            max_memory_keys: Maximum number of keys tracked in memory
+        """
         self._redis_client: Optional[redis.Redis] = None
         self._redis_enabled = False
-        self._memory_store: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
-        self._memory_lock = threading.Lock()
+        # key -> (theoretical arrival time, emission interval), in LRU order
+        self._memory_store: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._max_memory_keys = max_memory_keys
         self._window = RATE_LIMIT_WINDOW
+        self._check_script = None
+        self._status_script = None
         
-        # Try to initialize Redis
-        if REDIS_AVAILABLE:
+        if redis_client is not None:
+            self._redis_client = redis_client
+            self._redis_enabled = True
+        elif REDIS_AVAILABLE:
+            # Try to initialize Redis
             self._init_redis()
+        
+        if self._redis_enabled:
+            self._register_scripts()
     
     def _init_redis(self):
         """Initialize Redis connection if REDIS_URL is configured"""
@@ -51,13 +118,21 @@ class RateLimiter:
                 max_connections=10
             )
             self._redis_enabled = True
-            print(f"[RateLimiter] Redis connected successfully")
+            print("[RateLimiter] Redis connected successfully")
         except Exception as e:
             print(f"[RateLimiter] Redis connection failed: {e}, using in-memory storage")
             self._redis_client = None
             self._redis_enabled = False
     
-    async def check_rate_limit(self, key: str, max_requests: int, window: int = None) -> bool:
+    def _register_scripts(self):
+        """
+        Register Lua scripts. redis-py runs them with EVALSHA using the cached
+        SHA and loads them transparently on NOSCRIPT.
+        """
+        self._check_script = self._redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+        self._status_script = self._redis_client.register_script(SLIDING_WINDOW_STATUS_SCRIPT)
+    
+    async def check_rate_limit(self, key: str, max_requests: int, window: int = None, cost: int = 1) -> bool:
         """
         Check if request is within rate limit.
         
@@ -65,67 +140,84 @@ class RateLimiter:
             key: Identifier for the client (e.g., IP + endpoint)
             max_requests: Maximum allowed requests in the window
             window: Time window in seconds (defaults to RATE_LIMIT_WINDOW)
+            cost: Units of the limit this request consumes
         
         Returns:
             True if request is allowed, False if rate limited
         """
+        result = await self.acquire(key, max_requests, window, cost)
+        return result["allowed"]
+    
+    async def acquire(self, key: str, max_requests: int, window: int = None, cost: int = 1) -> dict:
+        """
+        Consume cost units of the limit for key, if available.
+        
+        Returns:
+            dict with 'allowed', 'limit', 'remaining' (units left), 'reset'
+            (seconds until the window frees up) and 'retry_after' (seconds to
+            wait before retrying, 0 when allowed)
+        """
         if window is None:
             window = self._window
         
         if self._redis_enabled and self._redis_client:
-            return await self._check_redis(key, max_requests, window)
+            return await self._acquire_redis(key, max_requests, window, cost)
         else:
-            return self._check_memory(key, max_requests, window)
+            return self._acquire_memory(key, max_requests, window, cost)
     
-    async def _check_redis(self, key: str, max_requests: int, window: int) -> bool:
-        """Check rate limit using Redis with sliding window"""
+    async def _acquire_redis(self, key: str, max_requests: int, window: int, cost: int) -> dict:
+        """Check rate limit using Redis with sliding window (one atomic script call)"""
         try:
             now = time.time()
-            redis_key = f"ratelimit:{key}"
-            
-            # Remove old entries (outside the window)
-            cutoff = now - window
-            await self._redis_client.zremrangebyscore(redis_key, 0, cutoff)
-            
-            # Count current requests
-            current_count = await self._redis_client.zcard(redis_key)
-            
-            if current_count >= max_requests:
-                return False
-            
-            # Add current request
-            await self._redis_client.zadd(redis_key, {str(now): now})
-            
-            # Set expiration on the key
-            await self._redis_client.expire(redis_key, window + 1)
-            
-            return True
+            allowed, count, oldest = await self._check_script(
+                keys=[f"ratelimit:{key}"],
+                args=[now, window, max_requests, f"{now}:{uuid.uuid4().hex[:8]}", cost]
+            )
+            reset = max(0, math.ceil(float(oldest) + window - now))
+            return {
+                "allowed": bool(allowed),
+                "limit": max_requests,
+                "remaining": max(0, max_requests - int(count)),
+                "reset": reset,
+                "retry_after": 0 if allowed else max(1, reset)
+            }
             
         except Exception as e:
             # Fallback to memory if Redis fails
             print(f"[RateLimiter] Redis error, falling back to memory: {e}")
-            return self._check_memory(key, max_requests, window)
+            return self._acquire_memory(key, max_requests, window, cost)
+    
+    def _acquire_memory(self, key: str, max_requests: int, window: int, cost: int = 1) -> dict:
+        """Check rate limit using in-memory GCRA state"""
+        if max_requests <= 0 or cost > max_requests:
+            return {"allowed": False, "limit": max_requests, "remaining": 0, "reset": window, "retry_after": window}
+        
+        now = time.monotonic()
+        interval = window / max_requests
+        entry = self._memory_store.get(key)
+        tat = max(entry[0], now) if entry else now
+        
+        # Allowing this request would push the TAT more than a window ahead
+        new_tat = tat + interval * cost
+        allowed = new_tat - now <= window
+        if allowed:
+            tat = new_tat
+            self._memory_store[key] = (tat, interval)
+            self._memory_store.move_to_end(key)
+            if len(self._memory_store) > self._max_memory_keys:
+                self._memory_store.popitem(last=False)
+        
+        return {
+            "allowed": allowed,
+            "limit": max_requests,
+            "remaining": max(0, int((window - (tat - now)) / interval + 1e-9)),
+            "reset": math.ceil(tat - now),
+            "retry_after": 0 if allowed else max(1, math.ceil(new_tat - now - window))
+        }
     
     def _check_memory(self, key: str, max_requests: int, window: int) -> bool:
         """Check rate limit using in-memory storage"""
-        current_time = time.time()
-        
-        with self._memory_lock:
-            # Clean old entries for this key
-            if key in self._memory_store:
-                self._memory_store[key] = [
-                    (t, count) for t, count in self._memory_store[key]
-                    if current_time - t < window
-                ]
-            
-            # Check if limit exceeded
-            request_count = len(self._memory_store[key])
-            if request_count >= max_requests:
-                return False
-            
-            # Record this request
-            self._memory_store[key].append((current_time, request_count + 1))
-            return True
+        return self._acquire_memory(key, max_requests, window)["allowed"]
     
     async def get_status(self, key: str, window: int = None) -> dict:
         """
@@ -146,80 +238,61 @@ class RateLimiter:
         """Get status from Redis"""
         try:
             now = time.time()
-            redis_key = f"ratelimit:{key}"
-            
-            # Remove old entries and count
-            cutoff = now - window
-            await self._redis_client.zremrangebyscore(redis_key, 0, cutoff)
-            count = await self._redis_client.zcard(redis_key)
+            count, oldest = await self._status_script(
+                keys=[f"ratelimit:{key}"],
+                args=[now, window]
+            )
             
             # Get oldest entry for window remaining calculation
-            oldest = await self._redis_client.zrange(redis_key, 0, 0, withscores=True)
             if oldest:
-                window_remaining = int(window - (now - oldest[0][1]))
+                window_remaining = int(window - (now - float(oldest)))
             else:
                 window_remaining = window
             
             return {
-                "requests": count,
+                "requests": int(count),
                 "window_remaining": max(0, window_remaining),
                 "limit": None  # Will be set by caller
             }
-        except Exception as e:
+        except Exception:
             return self._get_memory_status(key, window)
     
     def _get_memory_status(self, key: str, window: int) -> dict:
         """Get status from memory"""
-        current_time = time.time()
+        entry = self._memory_store.get(key)
+        now = time.monotonic()
+        if not entry or entry[0] <= now:
+            return {"requests": 0, "window_remaining": window, "limit": None}
         
-        with self._memory_lock:
-            if key not in self._memory_store:
-                return {"requests": 0, "window_remaining": window, "limit": None}
-            
-            valid_entries = [
-                (t, count) for t, count in self._memory_store[key]
-                if current_time - t < window
-            ]
-            
-            if not valid_entries:
-                return {"requests": 0, "window_remaining": window, "limit": None}
-            
-            oldest_timestamp = min(t for t, _ in valid_entries)
-            window_remaining = int(window - (current_time - oldest_timestamp))
-            
-            return {
-                "requests": len(valid_entries),
-                "window_remaining": max(0, window_remaining),
-                "limit": None
-            }
+        tat, interval = entry
+        # Requests still counted against the key, and seconds until fully reset
+        return {
+            "requests": math.ceil((tat - now) / interval),
+            "window_remaining": min(window, math.ceil(tat - now)),
+            "limit": None
+        }
     
-    def cleanup_memory(self, max_age_seconds: int = 3600) -> int:
+    def cleanup_memory(self, max_age_seconds: int = 0) -> int:
         """
-        Cleanup old entries from in-memory store.
+        Cleanup idle entries from in-memory store.
         Only needed for memory storage; Redis auto-expires.
+        Runs periodically in the background (see server startup).
+        
+        Args:
+            max_age_seconds: Keep entries that became idle less than this many seconds ago
         
         Returns:
             Number of keys removed
         """
-        current_time = time.time()
-        keys_to_remove = []
-        
-        with self._memory_lock:
-            for key, timestamps in list(self._memory_store.items()):
-                valid_entries = [
-                    (t, count) for t, count in timestamps
-                    if current_time - t < max_age_seconds
-                ]
-                
-                if valid_entries:
-                    self._memory_store[key] = valid_entries
-                else:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self._memory_store[key]
-        
-        return len(keys_to_remove)
+        cutoff = time.monotonic() - max_age_seconds
+        expired = [key for key, (tat, _) in self._memory_store.items() if tat <= cutoff]
+        for key in expired:
+            del self._memory_store[key]
+        return len(expired)
+    
+    def memory_stats(self) -> dict:
+        """Get in-memory store size"""
+        return {"keys": len(self._memory_store), "max_keys": self._max_memory_keys}
     
     async def reset(self, key: str = None) -> bool:
         """
@@ -253,11 +326,10 @@ class RateLimiter:
                 return False
         else:
             # Memory reset
-            with self._memory_lock:
-                if key:
-                    self._memory_store.pop(key, None)
-                else:
-                    self._memory_store.clear()
+            if key:
+                self._memory_store.pop(key, None)
+            else:
+                self._memory_store.clear()
             return True
     
     @property
@@ -276,7 +348,7 @@ def check_rate_limit(key: str, max_requests: int) -> bool:
     return rate_limiter._check_memory(key, max_requests, RATE_LIMIT_WINDOW)
 
 
-def cleanup_rate_limit_store(max_age_seconds: int = 3600) -> int:
+def cleanup_rate_limit_store(max_age_seconds: int = 0) -> int:
     """Cleanup old entries from memory store"""
     return rate_limiter.cleanup_memory(max_age_seconds)
 
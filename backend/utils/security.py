@@ -35,3 +35,8 @@ def validate_url(url: str) -> bool:
 def validate_question_id(qid: str) -> bool:
     """Validate question ID format"""
     return bool(re.match(r'^q_[a-f0-9]{12}$', qid))
+
+
+def safe_field_name(name: str) -> str:
+    """Make a user-provided name (subject, topic) safe to use as a MongoDB field name"""
+    return (name or "").replace(".", "_").replace("$", "_") or "_"
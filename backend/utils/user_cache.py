@@ -0,0 +1,179 @@
+"""
+Short-lived cache of authenticated users, sessions and premium status.
+Keeps get_current_user and access checks from hitting MongoDB on every request.
+Uses Redis as a shared backend when REDIS_URL is set, in-process memory otherwise.
+"""
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+from pymongo import ReturnDocument
+from .cache import TTLCache
+from .database import db
+from .config import (
+    USER_CACHE_TTL_SECONDS,
+    USER_CACHE_MAX_ENTRIES,
+    USER_CACHE_CHECK_INTERVAL_SECONDS,
+    PREMIUM_CACHE_MAX_TTL_SECONDS
+)
+
+# Try to import Redis, but make it optional
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class UserCache:
+    """
+    Cache of user documents (by user_id) and sessions (by session token).
+    Entries live for a few seconds; role changes, user deletion and logout
+    must invalidate them explicitly.
+    With Redis, entries are kept only there so an invalidation on one worker
+    applies to all of them. Without it each process has its own copy, tagged
+    with a version in `catalog_versions` that invalidations bump, so other
+    processes drop their copies within USER_CACHE_CHECK_INTERVAL_SECONDS.
+    """
+    
+    def __init__(self, ttl: int = USER_CACHE_TTL_SECONDS):
+        self._ttl = ttl
+        self._local = TTLCache(USER_CACHE_MAX_ENTRIES, ttl)
+        self._redis_client: Optional["redis.Redis"] = None
+        # namespace -> (version, monotonic time it was read)
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        
+        if REDIS_AVAILABLE:
+            self._init_redis()
+    
+    def _init_redis(self):
+        """Initialize Redis connection if REDIS_URL is configured"""
+        redis_url = os.environ.get('REDIS_URL')
+        if not redis_url:
+            return
+        
+        try:
+            self._redis_client = redis.from_url(
+                redis_url,
+                encoding='utf-8',
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                max_connections=10
+            )
+        except Exception as e:
+            print(f"[UserCache] Redis connection failed: {e}, using in-memory storage")
+            self._redis_client = None
+    
+    async def _get(self, key: str) -> Optional[Dict]:
+        if not self._redis_client:
+            return self._local.get(key)
+        
+        try:
+            raw = await self._redis_client.get(f"usercache:{key}")
+        except Exception as e:
+            print(f"[UserCache] Redis get error: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+    
+    async def _set(self, key: str, value: Dict, ttl: Optional[int] = None, max_ttl: Optional[int] = None):
+        max_ttl = self._ttl if max_ttl is None else max_ttl
+        ttl = max_ttl if ttl is None else min(ttl, max_ttl)
+        if ttl <= 0:
+            return
+        if not self._redis_client:
+            self._local.set(key, value, ttl)
+            return
+        
+        try:
+            await self._redis_client.set(f"usercache:{key}", json.dumps(value, default=str), ex=ttl)
+        except Exception as e:
+            print(f"[UserCache] Redis set error: {e}")
+    
+    async def _delete(self, key: str):
+        self._local.invalidate(key)
+        if self._redis_client:
+            try:
+                await self._redis_client.delete(f"usercache:{key}")
+            except Exception as e:
+                print(f"[UserCache] Redis delete error: {e}")
+    
+    async def _key(self, namespace: str, key: str) -> str:
+        """
+        Key for an entry of `namespace` ("users" for users and sessions,
+        "subscriptions" for premium statuses).
+        Without Redis, local entries are tagged with the namespace's version in
+        `catalog_versions` (checked at most every USER_CACHE_CHECK_INTERVAL_SECONDS),
+        so an invalidation in any process retires every process's copies.
+        """
+        if self._redis_client:
+            return key
+        
+        now = time.monotonic()
+        version, checked_at = self._versions.get(namespace, (0, None))
+        if checked_at is None or now - checked_at >= USER_CACHE_CHECK_INTERVAL_SECONDS:
+            doc = await db.catalog_versions.find_one({"_id": namespace})
+            version = doc["version"] if doc else 0
+            self._versions[namespace] = (version, now)
+        return f"{version}:{key}"
+    
+    async def _invalidate(self, namespace: str, key: str):
+        await self._delete(await self._key(namespace, key))
+        if self._redis_client:
+            return
+        
+        # Tell the other processes
+        doc = await db.catalog_versions.find_one_and_update(
+            {"_id": namespace},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._versions[namespace] = (doc["version"], time.monotonic())
+    
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        """Get a cached user document (without password)"""
+        return await self._get(await self._key("users", f"user:{user_id}"))
+    
+    async def set_user(self, user: Dict):
+        """Cache a user document (without password)"""
+        await self._set(await self._key("users", f"user:{user['user_id']}"), user)
+    
+    async def invalidate_user(self, user_id: str):
+        """Drop a cached user after role changes, profile updates or deletion"""
+        await self._invalidate("users", f"user:{user_id}")
+    
+    async def get_session(self, session_token: str) -> Optional[Dict]:
+        """Get a cached session ({'user_id'}); only valid sessions are cached"""
+        return await self._get(await self._key("users", f"session:{session_token}"))
+    
+    async def set_session(self, session_token: str, user_id: str, expires_in: int):
+        """Cache a valid session for at most its remaining lifetime"""
+        await self._set(await self._key("users", f"session:{session_token}"), {"user_id": user_id}, ttl=expires_in)
+    
+    async def invalidate_session(self, session_token: str):
+        """Drop a cached session on logout"""
+        await self._invalidate("users", f"session:{session_token}")
+    
+    async def get_premium(self, user_id: str) -> Optional[Dict]:
+        """Get a cached premium status (SubscriptionService.get_user_subscription result)"""
+        return await self._get(await self._key("subscriptions", f"premium:{user_id}"))
+    
+    async def set_premium(self, user_id: str, status: Dict, ttl: int):
+        """Cache a premium status for ttl seconds (up to PREMIUM_CACHE_MAX_TTL_SECONDS)"""
+        await self._set(
+            await self._key("subscriptions", f"premium:{user_id}"), status,
+            ttl=int(ttl), max_ttl=PREMIUM_CACHE_MAX_TTL_SECONDS
+        )
+    
+    async def invalidate_premium(self, user_id: str):
+        """Drop a cached premium status after a purchase, gift or cancellation"""
+        await self._invalidate("subscriptions", f"premium:{user_id}")
+    
+    def stats(self) -> dict:
+        """Get local cache counters"""
+        return {**self._local.stats(), "shared_backend": "redis" if self._redis_client else None}
+
+
+# Global user cache instance
+user_cache = UserCache()
@@ -20,16 +20,23 @@ import { AuthContext, API } from "../../App";
 import { toast } from "sonner";
 import { useAdminData } from "../../contexts/AdminDataContext";
 
+// Users per request to /admin/users (the API pages with a cursor)
+const PAGE_SIZE = 100;
+
 const AdminUsers = () => {
   const navigate = useNavigate();
   const { user: currentUser } = useContext(AuthContext);
   const { getCachedData, setCachedData, isStale, invalidateCache } = useAdminData();
   
-  // Use cached data if available
+  // Use cached data if available ({ users, nextCursor, summary } for the unfiltered list)
   const cachedUsers = getCachedData('users');
-  const [users, setUsers] = useState(cachedUsers || []);
+  const [users, setUsers] = useState(cachedUsers?.users || []);
+  const [nextCursor, setNextCursor] = useState(cachedUsers?.nextCursor || null);
+  const [summary, setSummary] = useState(cachedUsers?.summary || null);
   const [loading, setLoading] = useState(!cachedUsers || isStale('users', 60000));
+  const [loadingMore, setLoadingMore] = useState(false);
   const [search, setSearch] = useState("");
+  const [searchQuery, setSearchQuery] = useState("");
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
   const [roleDialogOpen, setRoleDialogOpen] = useState(false);
   const [premiumDialogOpen, setPremiumDialogOpen] = useState(false);
@@ -68,13 +75,65 @@ const AdminUsers = () => {
     }
   };
 
+  // One page of users (search is done by the API), with subscription status
+  const fetchPage = async (cursor, query) => {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (cursor) params.set("cursor", cursor);
+    if (query) params.set("search", query);
+    
+    const response = await fetch(`${API}/admin/users?${params}`, {
+      headers,
+      credentials: "include"
+    });
+    if (!response.ok) {
+      return null;
+    }
+    
+    const data = await response.json();
+    // Fetch subscription status for each user
+    const usersWithPremium = await Promise.all(
+      data.map(async (u) => {
+        try {
+          const subRes = await fetch(`${API}/admin/users/${u.user_id}/subscription`, {
+            headers,
+            credentials: "include"
+          });
+          if (subRes.ok) {
+            const subData = await subRes.json();
+            return { ...u, subscription: subData };
+          } else {
+            // Subscription no disponible
+          }
+        } catch (e) {}
+        return { ...u, subscription: null };
+      })
+    );
+    return { users: usersWithPremium, nextCursor: response.headers.get("X-Next-Cursor") };
+  };
+
+  // Totals for all users, not just the loaded pages
+  const fetchSummary = async () => {
+    try {
+      const response = await fetch(`${API}/admin/users/summary`, {
+        headers,
+        credentials: "include"
+      });
+      if (response.ok) {
+        return await response.json();
+      }
+    } catch (e) {}
+    return null;
+  };
+
   const fetchUsers = useCallback(async (force = false) => {
     // Use cache if available and not stale (60 seconds for users)
-    if (!force && cachedUsers && !isStale('users', 60000)) {
-      setUsers(cachedUsers);
+    if (!force && !searchQuery && cachedUsers && !isStale('users', 60000)) {
+      setUsers(cachedUsers.users);
+      setNextCursor(cachedUsers.nextCursor);
+      setSummary(cachedUsers.summary);
       setLoading(false);
       // Don't use cached premium data - always fetch fresh
-      fetchPremiumStatus(cachedUsers.map(u => u.user_id));
+      fetchPremiumStatus(cachedUsers.users.map(u => u.user_id));
       return;
     }
     
@@ -84,33 +143,15 @@ const AdminUsers = () => {
     }
 
     try {
-      const response = await fetch(`${API}/admin/users`, {
-        headers,
-        credentials: "include"
-      });
+      const [page, totals] = await Promise.all([fetchPage(null, searchQuery), fetchSummary()]);
 
-      if (response.ok) {
-        const data = await response.json();
-        // Fetch subscription status for each user
-        const usersWithPremium = await Promise.all(
-          data.map(async (u) => {
-            try {
-              const subRes = await fetch(`${API}/admin/users/${u.user_id}/subscription`, {
-                headers,
-                credentials: "include"
-              });
-              if (subRes.ok) {
-                const subData = await subRes.json();
-                return { ...u, subscription: subData };
-              } else {
-                // Subscription no disponible
-              }
-            } catch (e) {}
-            return { ...u, subscription: null };
-          })
-        );
-        setCachedData('users', usersWithPremium);
-        setUsers(usersWithPremium);
+      if (page) {
+        if (!searchQuery) {
+          setCachedData('users', { ...page, summary: totals });
+        }
+        setUsers(page.users);
+        setNextCursor(page.nextCursor);
+        setSummary(totals);
       } else {
         toast.error("Error al cargar usuarios");
       }
@@ -118,16 +159,45 @@ const AdminUsers = () => {
       console.error("Error:", error);
       toast.error("Error de conexión");
       // Use cached data on error
-      if (cachedUsers) setUsers(cachedUsers);
+      if (cachedUsers && !searchQuery) setUsers(cachedUsers.users);
     } finally {
       setLoading(false);
     }
-  }, [headers, cachedUsers, isStale, setCachedData]);
+  }, [headers, cachedUsers, isStale, setCachedData, searchQuery]);
+
+  const loadMoreUsers = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    
+    try {
+      const page = await fetchPage(nextCursor, searchQuery);
+      if (page) {
+        const allUsers = [...users, ...page.users];
+        if (!searchQuery) {
+          setCachedData('users', { users: allUsers, nextCursor: page.nextCursor, summary });
+        }
+        setUsers(allUsers);
+        setNextCursor(page.nextCursor);
+      } else {
+        toast.error("Error al cargar usuarios");
+      }
+    } catch (error) {
+      toast.error("Error de conexión");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     fetchUsers();
   }, [fetchUsers]);
 
+  // Search on the server once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(search.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
   const handleLogout = async () => {
     try {
       await fetch(`${API}/auth/logout`, { method: "POST", credentials: "include" });
@@ -255,11 +325,6 @@ const AdminUsers = () => {
     return user.subscription.is_premium || user.subscription.status === "active";
   };
 
-  const filteredUsers = users.filter(u => 
-    u.name.toLowerCase().includes(search.toLowerCase()) ||
-    u.email.toLowerCase().includes(search.toLowerCase())
-  );
-
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString("es-MX", {
       day: "numeric",
@@ -276,8 +341,10 @@ const AdminUsers = () => {
     );
   }
 
-  const adminCount = users.filter(u => u.role === "admin").length;
-  const studentCount = users.filter(u => u.role === "student").length;
+  const totalCount = summary?.total ?? users.length;
+  const adminCount = summary?.admins ?? users.filter(u => u.role === "admin").length;
+  const studentCount = summary?.students ?? users.filter(u => u.role === "student").length;
+  const premiumCount = summary?.premium ?? users.filter(u => isPremium(u)).length;
 
   return (
     <div className="min-h-screen bg-[#F5F7FA] dark:bg-slate-900 transition-colors duration-300">
@@ -301,7 +368,7 @@ const AdminUsers = () => {
               Gestión de Usuarios
             </h1>
             <p className="text-[#4A5568] dark:text-slate-400 mt-1">
-              {users.length} usuarios registrados
+              {totalCount} usuarios registrados
             </p>
           </div>
           <Button 
@@ -317,7 +384,7 @@ const AdminUsers = () => {
         <div className="grid grid-cols-4 gap-4 mb-6">
           <div className="bg-white dark:bg-slate-800 rounded-xl p-4 shadow-sm">
             <p className="text-sm text-[#4A5568] dark:text-slate-400">Total Usuarios</p>
-            <p className="text-2xl font-bold text-[#0A2540] dark:text-white">{users.length}</p>
+            <p className="text-2xl font-bold text-[#0A2540] dark:text-white">{totalCount}</p>
           </div>
           <div className="bg-white dark:bg-slate-800 rounded-xl p-4 shadow-sm">
             <p className="text-sm text-[#4A5568] dark:text-slate-400">Administradores</p>
@@ -329,7 +396,7 @@ const AdminUsers = () => {
           </div>
           <div className="bg-white dark:bg-slate-800 rounded-xl p-4 shadow-sm">
             <p className="text-sm text-[#4A5568] dark:text-slate-400">Premium</p>
-            <p className="text-2xl font-bold text-purple-600">{users.filter(u => isPremium(u)).length}</p>
+            <p className="text-2xl font-bold text-purple-600">{premiumCount}</p>
           </div>
         </div>
 
@@ -349,7 +416,7 @@ const AdminUsers = () => {
 
         {/* Users List */}
         <div className="space-y-3">
-          {filteredUsers.map((user) => {
+          {users.map((user) => {
             const isCurrentUser = user.user_id === currentUser?.user_id;
             
             return (
@@ -476,7 +543,20 @@ const AdminUsers = () => {
           })}
         </div>
 
-        {filteredUsers.length === 0 && (
+        {nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button
+              variant="outline"
+              onClick={loadMoreUsers}
+              disabled={loadingMore}
+              data-testid="load-more-users"
+            >
+              {loadingMore ? "Cargando..." : "Cargar más usuarios"}
+            </Button>
+          </div>
+        )}
+
+        {users.length === 0 && (
           <div className="text-center py-16">
             <Users className="w-16 h-16 mx-auto text-[#4A5568]/30 dark:text-slate-500 mb-4" />
             <p className="text-[#4A5568] dark:text-slate-400">No se encontraron usuarios</p>